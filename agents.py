@@ -6,26 +6,73 @@ This provides the basic functionality needed to run the application.
 import asyncio
 from typing import Any, Dict, List, Optional, Callable
 from pydantic import BaseModel
-import openai
-from openai import OpenAI
-import requests
 import json
+from coalesce import SingleFlight, make_key
+from resilience import get_endpoint
+from structured import (IncrementalJSONParser, list_item_models, parse_output, response_format,
+                        schema_instructions, supports_structured_output, validate)
+
+# openai and requests are imported lazily: Streamlit reruns the app script on
+# every interaction, and most reruns never touch a provider client.
 
 # Global clients
 _openai_client = None
+_openai_key = None
 _groq_client = None
+
+# Shared across sessions so concurrent identical runs coalesce
+_completion_flight = SingleFlight("completions")
+# Cross-worker completion cache, set in multi-worker deployments
+_completion_cache = None
 _current_provider = "OpenAI"
 
+# Map OpenAI models to Groq models
+GROQ_MODEL_MAPPING = {
+    "gpt-4o-mini": "llama3-8b-8192",
+    "gpt-4o": "llama3-70b-8192",
+    "gpt-3.5-turbo": "mixtral-8x7b-32768"
+}
+
 def set_default_openai_key(api_key: str):
-    """Set the default OpenAI API key."""
-    global _openai_client
+    """Set the default OpenAI API key.
+    
+    The client is only rebuilt when the key changes, so calling this on every
+    Streamlit rerun is cheap.
+    """
+    global _openai_client, _openai_key
+    if _openai_client is not None and api_key == _openai_key:
+        return
+    from openai import OpenAI
     _openai_client = OpenAI(api_key=api_key)
+    _openai_key = api_key
+
+def set_openai_client(client, api_key: str):
+    """Use a preconfigured OpenAI-compatible client for ``api_key`` (e.g. a mock in load tests)."""
+    global _openai_client, _openai_key
+    _openai_client = client
+    _openai_key = api_key
 
 def set_groq_key(api_key: str):
     """Set the Groq API key."""
     global _groq_client
     _groq_client = api_key
 
+def get_coalescing_stats() -> Dict[str, Any]:
+    """Counters for completion calls saved by in-flight coalescing and the shared cache."""
+    stats = _completion_flight.stats()
+    if _completion_cache is not None:
+        stats["shared_cache"] = _completion_cache.stats()
+    return stats
+
+def set_shared_store(store, ttl: Optional[float] = 6 * 60 * 60):
+    """Share completed runs with other workers through ``store`` (None disables it)."""
+    global _completion_cache
+    if store is None:
+        _completion_cache = None
+    elif _completion_cache is None or _completion_cache.store is not store:
+        from shared_state import SharedCache
+        _completion_cache = SharedCache(store, "completions", ttl=ttl)
+
 def set_provider(provider: str):
     """Set the current provider."""
     global _current_provider
@@ -54,8 +101,98 @@ class Runner:
     """Mock Runner class for executing agents."""
     
     @staticmethod
-    async def run(agent: Agent, input_text: str) -> 'RunResult':
-        """Run an agent with the given input."""
+    async def run(agent: Agent, input_text: str, template: Optional[str] = None,
+                  on_item: Optional[Callable[[str, Any], None]] = None, router=None,
+                  local_queue=None) -> 'RunResult':
+        """Run an agent with the given input.
+        
+        ``router`` (a ``routing.ModelRouter``) may override the agent's model
+        for this run, using ``template``, the research template of the run.
+        ``local_queue`` (a ``local_models.LocalInferenceQueue``) serves runs on
+        the Local provider. Both are passed per call because each session has
+        its own router and may have loaded its own local model.
+        Identical runs that are already in flight (same provider, model,
+        agent configuration and input) share one call. Only the run that
+        made the call reports its ``usage``; the others, like results served
+        from the shared cache, are flagged ``shared`` with no usage.
+        
+        When the agent has an ``output_type``, ``final_output`` is an instance
+        of it, and ``on_item(field, item)`` is called for every list element
+        (e.g. a finding or citation) as soon as it has been received.
+        """
+        model = Runner._model_for(agent, input_text, template, router, local_queue)
+        settings = agent.model_settings
+        key = make_key(_current_provider, agent.name, model, agent.instructions,
+                       settings.temperature, settings.max_tokens, settings.tool_choice,
+                       agent.output_type.__name__ if agent.output_type else None, input_text)
+        called = []
+        
+        def call():
+            called.append(True)
+            return Runner._run(agent, model, input_text, on_item, local_queue)
+        
+        if _completion_cache is None:
+            result = await _completion_flight.do(key, call)
+            return result if called else result.as_shared()
+        
+        # Another worker may already have answered this exact run
+        cached = _completion_cache.get(key)
+        if cached is not None:
+            return Runner._from_cache(agent, cached, on_item)
+        result = await _completion_flight.do(key, call)
+        if not called:
+            return result.as_shared()
+        if result.error is None:
+            output = result.final_output
+            structured = isinstance(output, BaseModel)
+            _completion_cache.set(key, {
+                "structured": structured,
+                "output": output.model_dump() if structured else output
+            })
+        return result
+    
+    @staticmethod
+    def _from_cache(agent: Agent, cached: Dict[str, Any],
+                    on_item: Optional[Callable[[str, Any], None]] = None) -> 'RunResult':
+        output = cached["output"]
+        if cached["structured"] and agent.output_type:
+            output = validate(agent.output_type, output)
+            if on_item:
+                # Replay the list items the live stream would have delivered
+                for field in list_item_models(agent.output_type):
+                    for item in getattr(output, field):
+                        on_item(field, item)
+        return RunResult(output, shared=True)
+    
+    @staticmethod
+    def _model_for(agent: Agent, input_text: str, template: Optional[str] = None, router=None,
+                   local_queue=None) -> str:
+        """The model a run actually uses on the current provider."""
+        model = agent.model
+        if _current_provider == "Groq":
+            # Map OpenAI models to Groq models
+            model = GROQ_MODEL_MAPPING.get(agent.model, "llama3-8b-8192")
+        elif _current_provider == "Local":
+            # The loaded model, e.g. "Ollama:llama3", whatever the agent asks for
+            return local_queue.name if local_queue is not None else "unloaded"
+        
+        # Let the router override the agent's model for this run
+        if router is not None:
+            decision = router.route(
+                agent.name,
+                model,
+                _current_provider,
+                agent.instructions + input_text,
+                template=template,
+                max_output_tokens=agent.model_settings.max_tokens or 1000,
+                structured_output=agent.output_type is not None
+            )
+            model = decision.model
+        return model
+    
+    @staticmethod
+    async def _run(agent: Agent, model: str, input_text: str,
+                   on_item: Optional[Callable[[str, Any], None]] = None, local_queue=None) -> 'RunResult':
         global _current_provider, _openai_client, _groq_client
         
         if _current_provider == "OpenAI":
@@ -76,14 +213,20 @@ class Runner:
                     if hasattr(tool, 'function'):
                         tools.append(tool.function)
             
-            response = _openai_client.chat.completions.create(
-                model=agent.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="auto" if tools else None,
-                temperature=getattr(agent.model_settings, 'temperature', 0.7),
-                max_tokens=getattr(agent.model_settings, 'max_tokens', 1000)
-            )
+            if agent.output_type is not None:
+                return Runner._stream_openai_structured(agent, model, messages, tools, on_item)
+            
+            endpoint = get_endpoint(f"openai:{model}")
+            with endpoint.guard() as call:
+                response = _openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    tools=tools,
+                    tool_choice="auto" if tools else None,
+                    temperature=getattr(agent.model_settings, 'temperature', 0.7),
+                    max_tokens=getattr(agent.model_settings, 'max_tokens', 1000),
+                    timeout=call.timeout
+                )
             
             # Extract the response content
             content = response.choices[0].message.content or ""
@@ -93,22 +236,23 @@ class Runner:
                 # For now, just return the tool call info
                 content += f"\n\nTool calls: {response.choices[0].message.tool_calls}"
             
-            return RunResult(final_output=content)
+            return RunResult(final_output=content, usage=usage_counts(response.usage))
         
         elif _current_provider == "Groq":
             if not _groq_client:
                 raise ValueError("Groq API key not set. Call set_groq_key() first.")
             
-            # Map OpenAI models to Groq models
-            model_mapping = {
-                "gpt-4o-mini": "llama3-8b-8192",
-                "gpt-4o": "llama3-70b-8192",
-                "gpt-3.5-turbo": "mixtral-8x7b-32768"
-            }
-            groq_model = model_mapping.get(agent.model, "llama3-8b-8192")
+            import requests
+            
+            groq_model = model
+            
+            instructions = agent.instructions
+            if agent.output_type is not None:
+                # Groq only supports plain JSON mode, so describe the schema in the prompt
+                instructions += schema_instructions(agent.output_type)
             
             messages = [
-                {"role": "system", "content": agent.instructions},
+                {"role": "system", "content": instructions},
                 {"role": "user", "content": input_text}
             ]
             
@@ -139,19 +283,22 @@ class Runner:
                 except Exception as e:
                     print(f"Warning: Could not add tools to Groq request: {e}")
             
+            # JSON mode cannot be combined with tool calls
+            if agent.output_type is not None and "tools" not in payload:
+                payload["response_format"] = {"type": "json_object"}
+            
+            endpoint = get_endpoint(f"groq:{groq_model}")
             try:
-                response = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=60
-                )
-                response.raise_for_status()
+                with endpoint.guard() as call:
+                    response = requests.post(
+                        "https://api.groq.com/openai/v1/chat/completions",
+                        headers=headers,
+                        json=payload,
+                        timeout=call.timeout
+                    )
+                    response.raise_for_status()
                 result = response.json()
                 
-                # Debug: Print the response structure
-                print(f"Groq API Response: {json.dumps(result, indent=2)}")
-                
                 # Safely extract content with proper error handling
                 if "choices" in result and len(result["choices"]) > 0:
                     choice = result["choices"][0]
@@ -167,7 +314,10 @@ class Runner:
                 else:
                     content = "No choices found in response"
                 
-                return RunResult(final_output=content)
+                usage = usage_counts(result.get("usage"))
+                if agent.output_type is not None:
+                    return RunResult(final_output=parse_output(agent.output_type, content, on_item), usage=usage)
+                return RunResult(final_output=content, usage=usage)
                 
             except requests.exceptions.RequestException as e:
                 raise ValueError(f"Groq API request failed: {str(e)}")
@@ -176,14 +326,159 @@ class Runner:
             except Exception as e:
                 raise ValueError(f"Groq API call failed: {str(e)}")
         
+        elif _current_provider == "Local":
+            if not local_queue:
+                raise ValueError("Local model not loaded. Pass local_queue= to Runner.run().")
+            
+            instructions = agent.instructions
+            if agent.output_type is not None:
+                instructions += schema_instructions(agent.output_type)
+            
+            messages = [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": input_text}
+            ]
+            
+            # Local models run without tool calling; the queue batches concurrent runs
+            content = await local_queue.submit(
+                messages,
+                max_tokens=agent.model_settings.max_tokens or 1000,
+                temperature=agent.model_settings.temperature if agent.model_settings.temperature is not None else 0.7
+            )
+            if agent.output_type is not None:
+                return RunResult(final_output=parse_output(agent.output_type, content, on_item))
+            return RunResult(final_output=content)
+        
         else:
             raise ValueError(f"Unknown provider: {_current_provider}")
+    
+    @staticmethod
+    def _stream_openai_structured(agent: Agent, model: str, messages: List[Dict[str, str]],
+                                  tools: Optional[List], on_item: Optional[Callable[[str, Any], None]]) -> 'RunResult':
+        """Stream a structured-output completion, reporting list items as they arrive."""
+        parser = IncrementalJSONParser(list_item_models(agent.output_type))
+        if supports_structured_output(model):
+            output_format = response_format(agent.output_type)
+        else:
+            # Older models reject json_schema; use JSON mode and describe the schema in the prompt
+            output_format = {"type": "json_object"}
+            messages = [{**messages[0], "content": messages[0]["content"] + schema_instructions(agent.output_type)},
+                        *messages[1:]]
+        tool_calls = {}
+        chunks = Runner._guarded_stream(get_endpoint(f"openai:{model}:stream"), lambda timeout: (
+            _openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                tools=tools,
+                tool_choice="auto" if tools else None,
+                response_format=output_format,
+                temperature=getattr(agent.model_settings, 'temperature', 0.7),
+                max_tokens=getattr(agent.model_settings, 'max_tokens', 1000),
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            )
+        ))
+        usage = None
+        try:
+            for chunk in chunks:
+                # With include_usage, the last chunk carries usage and no choices
+                if getattr(chunk, "usage", None):
+                    usage = usage_counts(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    for field, item in parser.feed(delta.content):
+                        if on_item:
+                            on_item(field, item)
+                for call in delta.tool_calls or []:
+                    entry = tool_calls.setdefault(call.index, {"name": "", "arguments": ""})
+                    if call.function and call.function.name:
+                        entry["name"] += call.function.name
+                    if call.function and call.function.arguments:
+                        entry["arguments"] += call.function.arguments
+        finally:
+            chunks.close()
+        
+        if tool_calls:
+            # For now, just return the tool call info
+            return RunResult(final_output=f"{parser.buffer}\n\nTool calls: {list(tool_calls.values())}", usage=usage)
+        return RunResult(final_output=parse_output(agent.output_type, parser.buffer), usage=usage)
+    
+    @staticmethod
+    def _guarded_stream(endpoint, create: Callable[[float], Any]):
+        """Yield the chunks of ``create(timeout)`` under the endpoint's guard.
+
+        Only the request and the reads from the stream are guarded: errors
+        raised by the caller's loop body (e.g. ``on_item`` callbacks) are not
+        thrown into this generator and never count against the endpoint.
+        """
+        with endpoint.guard() as call:
+            yield from create(call.timeout)
+    
+    @staticmethod
+    async def run_batch(agent: Agent, inputs: Dict[str, str], backend=None,
+                        poll_interval: float = 30.0, timeout: Optional[float] = None) -> Dict[str, 'RunResult']:
+        """Run many inputs for one agent through the provider's batch API.
+        
+        ``inputs`` maps a key (usually the topic) to the input text; the
+        results are returned under the same keys. Pass ``backend`` to use a
+        specific batch backend, e.g. ``batch.LocalBatchBackend`` offline.
+        """
+        from batch import BatchRunner, OpenAIBatchBackend
+        
+        model_mapping = GROQ_MODEL_MAPPING if _current_provider == "Groq" else None
+        if backend is None:
+            if _current_provider == "OpenAI":
+                if not _openai_client:
+                    raise ValueError("OpenAI API key not set. Call set_default_openai_key() first.")
+                backend = OpenAIBatchBackend(_openai_client)
+            elif _current_provider == "Groq":
+                if not _groq_client:
+                    raise ValueError("Groq API key not set. Call set_groq_key() first.")
+                backend = OpenAIBatchBackend.for_groq(_groq_client)
+            else:
+                raise ValueError(f"Batch mode is not supported for provider: {_current_provider}")
+        
+        runner = BatchRunner(backend, model_mapping=model_mapping, poll_interval=poll_interval)
+        for key, input_text in inputs.items():
+            runner.add(key, agent, input_text)
+        return await runner.run(timeout=timeout)
 
 class RunResult:
-    """Result of running an agent."""
+    """Result of running an agent.
     
-    def __init__(self, final_output: str):
+    ``usage`` holds the provider's token counts when it reports them:
+    ``prompt_tokens``, ``completion_tokens`` and ``cached_tokens`` (prompt
+    tokens served from the provider's prompt cache). ``shared`` results were
+    produced by another run's call (coalesced or cached) and carry no usage,
+    so tokens are only counted once.
+    """
+    
+    def __init__(self, final_output: str, error: Optional[str] = None,
+                 usage: Optional[Dict[str, int]] = None, shared: bool = False):
         self.final_output = final_output
+        self.error = error
+        self.usage = usage
+        self.shared = shared
+    
+    def as_shared(self) -> 'RunResult':
+        """This result as seen by a run that did not make the call."""
+        return RunResult(self.final_output, self.error, shared=True)
+
+def usage_counts(usage: Any) -> Optional[Dict[str, int]]:
+    """Token counts from an OpenAI-style usage object or dict, including cached prompt tokens."""
+    if not usage:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+    details = get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    return {
+        "prompt_tokens": get("prompt_tokens") or 0,
+        "completion_tokens": get("completion_tokens") or 0,
+        "cached_tokens": cached or 0,
+    }
 
 def trace(func: Callable) -> Callable:
     """Decorator for tracing function calls."""
@@ -0,0 +1,297 @@
+"""
+Batch mode for running many agent requests through provider batch APIs.
+
+Nightly jobs that elaborate many reports care about cost and throughput, not
+latency. ``BatchRunner`` collects requests, writes them to a JSONL file in the
+OpenAI batch format (one ``/v1/chat/completions`` request per line), submits
+the file through a backend, polls until the batch finishes and maps the
+results back to the caller's keys (usually topics).
+
+Backends:
+- ``OpenAIBatchBackend``: OpenAI Files + Batches API. Groq exposes the same
+  API, so it also works with an OpenAI client pointed at Groq's base URL.
+- ``LocalBatchBackend``: processes the JSONL file in-process, for offline use
+  and tests.
+
+Once the results are collected, the backend's files for the batch are
+deleted. For the nightly job, run::
+
+    python batch.py reports.jsonl results.jsonl [--provider openai|groq|local]
+
+with one ``{"topic": ..., "report": ..., "template": ...}`` object per input
+line; each output line holds the topic, the enhanced report and any error.
+API keys are read from ``OPENAI_API_KEY`` / ``GROQ_API_KEY``.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchError(Exception):
+    """Raised when a batch cannot be submitted or finishes unsuccessfully."""
+
+
+class OpenAIBatchBackend:
+    """Submits batch files through the OpenAI-compatible Files and Batches API."""
+
+    def __init__(self, client, completion_window: str = "24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    @classmethod
+    def for_groq(cls, api_key: str) -> "OpenAIBatchBackend":
+        from openai import OpenAI
+        return cls(OpenAI(api_key=api_key, base_url=GROQ_BASE_URL))
+
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def cleanup(self, batch_id: str) -> None:
+        """Delete the batch's input, output and error files from the provider."""
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.input_file_id, batch.output_file_id, getattr(batch, "error_file_id", None)):
+            if not file_id:
+                continue
+            try:
+                self.client.files.delete(file_id)
+            except Exception as e:
+                print(f"Warning: Could not delete batch file {file_id}: {e}")
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Result lines of the output file and, for failed requests, the error file."""
+        batch = self.client.batches.retrieve(batch_id)
+        file_ids = [file_id for file_id in (batch.output_file_id, getattr(batch, "error_file_id", None)) if file_id]
+        if not file_ids:
+            raise BatchError(f"Batch {batch_id} finished without an output or error file ({batch.status})")
+        lines = []
+        for file_id in file_ids:
+            content = self.client.files.content(file_id).text
+            lines.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchBackend:
+    """Offline stand-in that answers every request with ``complete(body)``.
+
+    Results are written in the same JSONL shape as the OpenAI batch output so
+    the mapping code is exercised end to end.
+    """
+
+    def __init__(self, complete: Optional[Callable[[Dict[str, Any]], str]] = None,
+                 output_dir: Optional[str] = None):
+        self.complete = complete or self._echo
+        self.output_dir = output_dir or tempfile.gettempdir()
+        self._outputs: Dict[str, str] = {}
+
+    @staticmethod
+    def _echo(body: Dict[str, Any]) -> str:
+        return f"[local:{body.get('model')}] {body['messages'][-1]['content']}"
+
+    def submit(self, path: str) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        output_path = os.path.join(self.output_dir, f"{batch_id}_output.jsonl")
+        with open(path, encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    content = self.complete(request["body"])
+                    response = {
+                        "status_code": 200,
+                        "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+                    }
+                    error = None
+                except Exception as e:
+                    response = None
+                    error = {"message": str(e)}
+                dst.write(json.dumps({
+                    "id": f"{batch_id}_{request['custom_id']}",
+                    "custom_id": request["custom_id"],
+                    "response": response,
+                    "error": error
+                }) + "\n")
+        self._outputs[batch_id] = output_path
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return "completed" if batch_id in self._outputs else "failed"
+
+    def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        with open(self._outputs[batch_id], encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def cleanup(self, batch_id: str) -> None:
+        path = self._outputs.pop(batch_id, None)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+
+class BatchRunner:
+    """Collects agent requests and runs them as a single provider batch."""
+
+    def __init__(self, backend, model_mapping: Optional[Dict[str, str]] = None,
+                 work_dir: Optional[str] = None, poll_interval: float = 30.0):
+        self.backend = backend
+        self.model_mapping = model_mapping or {}
+        self.work_dir = work_dir or tempfile.gettempdir()
+        self.poll_interval = poll_interval
+        self._requests: List[Dict[str, Any]] = []
+        self._keys: Dict[str, str] = {}
+
+    def add(self, key: str, agent, input_text: str) -> str:
+        """Queue a request for ``agent`` and return its custom_id."""
+        custom_id = f"req-{len(self._requests)}"
+        model = self.model_mapping.get(agent.model, agent.model)
+        self._requests.append({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": agent.instructions},
+                    {"role": "user", "content": input_text}
+                ],
+                "temperature": getattr(agent.model_settings, 'temperature', 0.7),
+                "max_tokens": getattr(agent.model_settings, 'max_tokens', 1000)
+            }
+        })
+        self._keys[custom_id] = key
+        return custom_id
+
+    def write(self, path: Optional[str] = None) -> str:
+        """Write queued requests to a JSONL batch file and return its path."""
+        path = path or os.path.join(self.work_dir, f"batch_{uuid.uuid4().hex[:12]}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for request in self._requests:
+                body = {k: v for k, v in request["body"].items() if v is not None}
+                f.write(json.dumps({**request, "body": body}) + "\n")
+        return path
+
+    async def run(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Submit the batch, wait for it and return ``{key: RunResult}``.
+
+        Every queued key is in the result. Requests that failed inside the
+        batch, or that the provider returned no line for, map to a RunResult
+        whose ``error`` attribute is set.
+        """
+        from agents import RunResult
+
+        if not self._requests:
+            return {}
+
+        path = self.write()
+        try:
+            batch_id = self.backend.submit(path)
+        finally:
+            # The provider keeps its own copy of the uploaded file
+            os.remove(path)
+        started = time.monotonic()
+
+        status = self.backend.status(batch_id)
+        while status not in TERMINAL_STATES:
+            if timeout is not None and time.monotonic() - started > timeout:
+                # Still running at the provider; its files are needed to fetch the results later
+                raise BatchError(f"Batch {batch_id} did not finish within {timeout:.0f}s")
+            await asyncio.sleep(self.poll_interval)
+            status = self.backend.status(batch_id)
+
+        try:
+            if status != "completed":
+                raise BatchError(f"Batch {batch_id} ended with status '{status}'")
+            lines = self.backend.results(batch_id)
+        finally:
+            self.backend.cleanup(batch_id)
+
+        results: Dict[str, Any] = {}
+        for line in lines:
+            key = self._keys.get(line.get("custom_id"))
+            if key is None:
+                continue
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            choices = body.get("choices") or []
+            # Failed requests carry the error on the line or, in the error file, in the response body
+            error = line.get("error") or body.get("error")
+            if error or not choices:
+                message = (error.get("message") if isinstance(error, dict) else error) or "No choices found in response"
+                results[key] = RunResult(final_output="", error=message)
+            else:
+                results[key] = RunResult(final_output=choices[0]["message"].get("content") or "")
+        
+        for key in self._keys.values():
+            if key not in results:
+                results[key] = RunResult(final_output="", error=f"Batch {batch_id} returned no result for this request")
+
+        self._requests.clear()
+        self._keys.clear()
+        return results
+
+
+async def _run_nightly(args) -> int:
+    import agents
+    from agents import Agent, Runner
+    from prompts import ELABORATION_INSTRUCTIONS, elaboration_input
+
+    backend = None
+    if args.provider == "local":
+        backend = LocalBatchBackend()
+    elif args.provider == "groq":
+        agents.set_groq_key(os.environ["GROQ_API_KEY"])
+        agents.set_provider("Groq")
+    else:
+        agents.set_default_openai_key(os.environ["OPENAI_API_KEY"])
+        agents.set_provider("OpenAI")
+
+    with open(args.input, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    inputs = {
+        entry["topic"]: elaboration_input(entry["topic"], entry.get("template", "Custom"), entry["report"],
+                                          entry.get("ranked_sources"))
+        for entry in entries
+    }
+    agent = Agent(name="elaboration_agent", instructions=ELABORATION_INSTRUCTIONS, model=args.model)
+    results = await Runner.run_batch(agent, inputs, backend=backend, poll_interval=args.poll_interval,
+                                     timeout=args.timeout)
+
+    failed = 0
+    with open(args.output, "w", encoding="utf-8") as f:
+        for topic, result in results.items():
+            failed += result.error is not None
+            f.write(json.dumps({"topic": topic, "report": result.final_output, "error": result.error}) + "\n")
+    print(f"{len(results) - failed} of {len(results)} reports elaborated, written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Elaborate many reports in one provider batch (nightly job)")
+    parser.add_argument("input", help="JSONL with one {topic, report[, template, ranked_sources]} per line")
+    parser.add_argument("output", help="JSONL file for the enhanced reports")
+    parser.add_argument("--provider", choices=["openai", "groq", "local"], default="openai")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--poll-interval", type=float, default=60.0)
+    parser.add_argument("--timeout", type=float, default=24 * 60 * 60, help="Give up after this many seconds")
+    sys.exit(asyncio.run(_run_nightly(parser.parse_args())))
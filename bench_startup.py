@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Import-time and rerun-time benchmark for the Streamlit app.
+
+Measures:
+1. Cold import time of the modules the app script loads, each in a fresh
+   interpreter so nothing is already cached in ``sys.modules``.
+2. Rerun latency of ``deep_research_openai.py`` through Streamlit's AppTest,
+   i.e. what every widget interaction costs before any research starts.
+   AppTest compiles the script again on every run, while a Streamlit server
+   compiles it once and reuses the bytecode for all reruns and sessions; the
+   benchmark shares one script cache across runs to match the server.
+
+Usage:
+    python bench_startup.py [--reruns 20]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_utils import share_script_cache
+
+APP_FILE = "deep_research_openai.py"
+# Every module the app script imports at startup, then the heavy dependencies,
+# including those the app only loads on demand (numpy, openai, requests)
+MODULES = [
+    "agents", "coalesce", "checkpoints", "resilience", "shared_state", "structured", "prompts",
+    "citations", "report_store", "progress", "dedup", "routing", "export", "tuning",
+    "scoring", "local_models", "streamlit", "pydantic", "numpy", "openai", "requests", "firecrawl",
+]
+
+# Modules that must not be loaded by a plain rerun of the app
+LAZY_MODULES = ["numpy", "openai", "requests", "scoring", "batch", "local_models", "reportlab", "docx"]
+
+# Interaction latency budget per rerun
+RERUN_BUDGET_MS = 50
+
+
+def cold_import_ms(module: str) -> float:
+    """Import ``module`` in a fresh interpreter and return the time taken."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - start) * 1000)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        return float("nan")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def rerun_latencies_ms(reruns: int) -> list:
+    """Time repeated reruns of the app script with AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    share_script_cache()
+    app = AppTest.from_file(APP_FILE, default_timeout=30)
+    # The first run pays for imports and cache_resource construction
+    start = time.perf_counter()
+    app.run()
+    first = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return [first] + timings
+
+
+def eagerly_loaded(modules: list) -> list:
+    """Which of ``modules`` a fresh interpreter has loaded after one run of the app."""
+    code = (
+        "import sys; from streamlit.testing.v1 import AppTest; "
+        f"AppTest.from_file({APP_FILE!r}, default_timeout=30).run(); "
+        f"print(','.join(m for m in {modules!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    lines = result.stdout.strip().splitlines()
+    return [m for m in lines[-1].split(",") if m] if result.returncode == 0 and lines else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=20, help="Number of warm reruns to time")
+    args = parser.parse_args()
+
+    print("=== Cold import time ===")
+    for module in MODULES:
+        elapsed = cold_import_ms(module)
+        label = "not installed" if elapsed != elapsed else f"{elapsed:8.1f} ms"
+        print(f"  {module:<12} {label}")
+
+    loaded = eagerly_loaded(LAZY_MODULES)
+    print(f"\n  Loaded by a plain rerun: {', '.join(loaded) if loaded else 'none of ' + ', '.join(LAZY_MODULES)}")
+
+    print("\n=== Rerun latency ===")
+    timings = rerun_latencies_ms(args.reruns)
+    warm = sorted(timings[1:])
+    p95 = warm[min(len(warm) - 1, int(len(warm) * 0.95))]
+    print(f"  first run      {timings[0]:8.1f} ms")
+    print(f"  warm median    {statistics.median(warm):8.1f} ms")
+    print(f"  warm p95       {p95:8.1f} ms")
+
+    if statistics.median(warm) > RERUN_BUDGET_MS:
+        print(f"\n⚠️  Median rerun exceeds the {RERUN_BUDGET_MS} ms budget")
+    else:
+        print(f"\n✅ Reruns within the {RERUN_BUDGET_MS} ms budget")
+
+
+if __name__ == "__main__":
+    main()
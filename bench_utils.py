@@ -0,0 +1,31 @@
+"""
+Helpers shared by the benchmark, load test and memory simulation scripts.
+"""
+
+import resource
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def share_script_cache() -> None:
+    """Make AppTest reuse compiled bytecode across runs and sessions, as the server does.
+
+    Each AppTest otherwise compiles the script on its own, and compiling the
+    same script in several threads at once can fail inside CPython's AST
+    validation.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared
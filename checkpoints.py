@@ -0,0 +1,115 @@
+"""
+Stage-level checkpoints for long research runs.
+
+A research run has expensive stages (the Firecrawl job, the initial report,
+the elaboration). Each completed stage is persisted under a run ID derived
+from the topic, parameters, provider and a scope (the user's workspace or
+session), so a retry with the same inputs in the same scope resumes after
+the last completed stage instead of starting over, while other users never
+pick up each other's partial runs. Checkpoints are removed once the run completes and expire
+after ``CHECKPOINT_TTL`` seconds.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from coalesce import make_key, normalize_query
+from tuning import DATA_DIR
+
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "checkpoints")
+CHECKPOINT_TTL = 24 * 60 * 60
+
+
+def run_id_for(topic: str, params: Dict[str, Any], provider: str, scope: str) -> str:
+    """Deterministic run ID so retries of the same request in ``scope`` find its checkpoint."""
+    return make_key(scope, normalize_query(topic), params, provider)[:16]
+
+
+class Checkpoint:
+    """Completed stages of a single run, persisted as one JSON file."""
+
+    def __init__(self, run_id: str, path: str):
+        self.run_id = run_id
+        self.path = path
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.resumed: List[str] = []
+        self.created_at = time.time()
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if time.time() - data.get("created_at", 0) < CHECKPOINT_TTL:
+                    self.stages = data.get("stages", {})
+                    self.created_at = data["created_at"]
+            except (OSError, ValueError):
+                # A corrupt checkpoint only costs a full rerun
+                self.stages = {}
+
+    def get(self, stage: str) -> Optional[Any]:
+        """Return the saved value of a completed stage, or None.
+
+        A stage saved with a None value (nothing to resume) is not counted
+        as resumed.
+        """
+        entry = self.stages.get(stage)
+        if entry is None or entry["value"] is None:
+            return None
+        if stage not in self.resumed:
+            self.resumed.append(stage)
+        return entry["value"]
+
+    def peek(self, stage: str) -> Optional[Any]:
+        """Return a saved stage without counting it as resumed."""
+        entry = self.stages.get(stage)
+        return entry["value"] if entry is not None else None
+
+    def save(self, stage: str, value: Any, elapsed: float) -> None:
+        """Persist a completed stage and how long it took."""
+        self.stages[stage] = {"value": value, "elapsed": elapsed, "saved_at": time.time()}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"run_id": self.run_id, "created_at": self.created_at, "stages": self.stages},
+                      f, default=str)
+        os.replace(tmp_path, self.path)
+
+    def time_saved(self) -> float:
+        """Seconds of work skipped by resuming stages from this checkpoint."""
+        return sum(self.stages[stage]["elapsed"] for stage in self.resumed)
+
+    def clear(self) -> None:
+        """Remove the checkpoint once the run has completed."""
+        self.stages = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CheckpointStore:
+    """Directory of run checkpoints."""
+
+    def __init__(self, root: str = CHECKPOINT_DIR):
+        self.root = root
+
+    def open(self, run_id: str) -> Checkpoint:
+        return Checkpoint(run_id, os.path.join(self.root, f"{run_id}.json"))
+
+    def prune(self) -> int:
+        """Delete expired checkpoints and return how many were removed."""
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        cutoff = time.time() - CHECKPOINT_TTL
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            # Also drop temporary files left behind by interrupted saves
+            if name.endswith((".json", ".tmp")):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    # Removed by another worker meanwhile
+                    continue
+        return removed
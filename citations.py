@@ -0,0 +1,209 @@
+"""
+Deterministic citation generation from an index of research sources.
+
+Instead of relying on the LLM to copy URLs correctly, ``SourceIndex`` builds
+an inverted index over the sources' titles, descriptions, URLs and domains
+(unigrams and bigrams, weighted by inverse document frequency). ``cite``
+matches each sentence of a report against the index and appends numbered
+markers, then emits the reference list in order of first citation. No model
+calls are involved and the work is linear in the report length, so it can
+run on every render.
+
+Sources carry the date they were retrieved in ``accessed`` (set when the
+research ran), which the references use instead of the render date.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+from dedup import canonical_domain, normalize_url
+
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "has", "have",
+    "had", "its", "into", "their", "they", "them", "than", "then", "also", "can", "will",
+    "would", "could", "should", "may", "more", "most", "such", "these", "those", "which",
+    "while", "about", "over", "other", "been", "being", "not", "but", "all", "any", "our",
+    "your", "you", "how", "what", "when", "where", "who", "why", "www", "http", "https", "com",
+}
+
+BIGRAM_WEIGHT = 2.0
+# Minimum match score (sum of idf weights) for a sentence to cite a source
+MIN_SCORE = 4.0
+# Citations per sentence
+MAX_CITATIONS = 2
+# Sentences shorter than this many content words are not cited
+MIN_SENTENCE_TERMS = 4
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_URL_RE = re.compile(r"https?://[^\s)\]>]+")
+_DOMAIN_RE = re.compile(r"\b[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}\b")
+# Sentence ends need trailing whitespace so "a.com" or "3.5" do not split
+_SENTENCE_RE = re.compile(r"\s*.+?(?:[.!?]+(?=\s|$)|$)")
+_EXISTING_MARKER_RE = re.compile(r"\[\d+\]")
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def _ngrams(terms: List[str]) -> Set[str]:
+    grams = set(terms)
+    grams.update(f"{a} {b}" for a, b in zip(terms, terms[1:]))
+    return grams
+
+
+def _valid_url(url: Any) -> bool:
+    if not url or not isinstance(url, str):
+        return False
+    try:
+        urlsplit(url)
+    except ValueError:
+        return False
+    return True
+
+
+@dataclass
+class CitedReport:
+    """A report with inline ``[n]`` markers and its numbered references."""
+    text: str
+    references: List[Dict[str, Any]] = field(default_factory=list)
+
+    def references_markdown(self, accessed: Optional[datetime] = None) -> str:
+        """Numbered reference list; ``accessed`` is only used for sources without a stored date."""
+        fallback = (accessed or datetime.now()).strftime('%Y-%m-%d')
+        return "\n".join(
+            f"{ref['number']}. {ref['title']}. {ref['url']}. Accessed {ref.get('accessed') or fallback}."
+            for ref in self.references
+        )
+
+
+class SourceIndex:
+    """Inverted n-gram index over research sources."""
+
+    def __init__(self, sources: List[Dict[str, Any]]):
+        self.sources = [s for s in sources if isinstance(s, dict) and _valid_url(s.get("url"))]
+        self.postings: Dict[str, List[int]] = {}
+        self.by_url: Dict[str, int] = {}
+        self.by_domain: Dict[str, List[int]] = {}
+
+        for i, source in enumerate(self.sources):
+            url = source["url"]
+            parts = urlsplit(url)
+            domain = canonical_domain(parts.netloc)
+            self.by_url[normalize_url(url)] = i
+            self.by_domain.setdefault(domain, []).append(i)
+
+            # Titles and descriptions may be missing or None
+            text = " ".join([str(source.get("title") or ""), str(source.get("description") or ""),
+                             parts.path.replace("-", " ").replace("_", " ")])
+            for gram in _ngrams(_terms(text)):
+                self.postings.setdefault(gram, []).append(i)
+
+        n = max(len(self.sources), 1)
+        self.idf = {gram: math.log(1 + n / len(ids)) for gram, ids in self.postings.items()}
+
+    def match(self, sentence: str) -> List[int]:
+        """Source ids supporting ``sentence``, best first."""
+        # Explicit URLs in the sentence are authoritative
+        explicit = [self.by_url[key] for key in (normalize_url(u) for u in _URL_RE.findall(sentence))
+                    if key in self.by_url]
+        if explicit:
+            return list(dict.fromkeys(explicit))[:MAX_CITATIONS]
+
+        text = _URL_RE.sub(" ", sentence)
+        terms = _terms(text)
+        if len(terms) < MIN_SENTENCE_TERMS:
+            return []
+
+        scores: Dict[int, float] = {}
+        # Naming a source's domain ("according to nature.com") counts as a full match
+        for domain in _DOMAIN_RE.findall(text.lower()):
+            for i in self.by_domain.get(canonical_domain(domain), ()):
+                scores[i] = scores.get(i, 0.0) + MIN_SCORE
+        for gram in _ngrams(terms):
+            ids = self.postings.get(gram)
+            if not ids:
+                continue
+            weight = self.idf[gram] * (BIGRAM_WEIGHT if " " in gram else 1.0)
+            for i in ids:
+                scores[i] = scores.get(i, 0.0) + weight
+
+        ranked = sorted((i for i, score in scores.items() if score >= MIN_SCORE),
+                        key=lambda i: (-scores[i], i))
+        return ranked[:MAX_CITATIONS]
+
+    def cite(self, report: str) -> CitedReport:
+        """Add ``[n]`` markers to the report and build its reference list."""
+        if not self.sources:
+            return CitedReport(report)
+
+        numbers: Dict[int, int] = {}
+        lines = []
+        in_code = False
+        for line in report.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                in_code = not in_code
+            if in_code or not stripped or stripped.startswith(("#", "|", "```")) \
+                    or _EXISTING_MARKER_RE.search(line):
+                lines.append(line)
+                continue
+            lines.append(_SENTENCE_RE.sub(lambda m: self._cite_sentence(m.group(0), numbers), line))
+
+        references = []
+        for source_id, number in sorted(numbers.items(), key=lambda item: item[1]):
+            source = self.sources[source_id]
+            references.append({
+                "number": number,
+                "title": str(source.get("title") or canonical_domain(urlsplit(source["url"]).netloc)),
+                "url": source["url"],
+                "accessed": source.get("accessed"),
+            })
+        return CitedReport("\n".join(lines), references)
+
+    def _cite_sentence(self, sentence: str, numbers: Dict[int, int]) -> str:
+        matches = self.match(sentence)
+        if not matches:
+            return sentence
+        markers = []
+        for source_id in matches:
+            if source_id not in numbers:
+                numbers[source_id] = len(numbers) + 1
+            markers.append(f"[{numbers[source_id]}]")
+
+        # Place the markers before the sentence's closing punctuation
+        body = sentence.rstrip()
+        trailing = sentence[len(body):]
+        stripped = body.rstrip(".!?")
+        punctuation = body[len(stripped):]
+        return f"{stripped} {''.join(markers)}{punctuation}{trailing}"
+
+
+def cite_report(report: str, sources: List[Dict[str, Any]]) -> CitedReport:
+    """Convenience wrapper: index ``sources`` and cite ``report``."""
+    return SourceIndex(sources).cite(report)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    words = [f"term{i}" for i in range(5000)]
+    sources = [{
+        "url": f"https://site{i}.org/article/{i}",
+        "title": " ".join(random.choices(words, k=8)),
+        "description": " ".join(random.choices(words, k=30)),
+    } for i in range(500)]
+    report = "\n".join(" ".join(random.choices(words, k=20)) + "." for _ in range(400))
+
+    start = time.perf_counter()
+    index = SourceIndex(sources)
+    indexed = time.perf_counter()
+    cited = index.cite(report)
+    done = time.perf_counter()
+    print(f"indexed {len(sources)} sources in {(indexed - start) * 1000:.0f} ms; "
+          f"cited 400 sentences in {(done - indexed) * 1000:.0f} ms ({len(cited.references)} references)")
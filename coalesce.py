@@ -0,0 +1,117 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When several sessions or batch workers ask for the same thing at the same
+time (e.g. research on a trending topic), only the first caller does the
+work; the others await the same result. Keys hash the exact request;
+callers normalize user-typed queries (case, whitespace) with
+``normalize_query`` before building the key, so trivially different topics
+coalesce while prompts that differ in any byte do not.
+
+Streamlit runs every session in its own thread with its own event loop
+(``asyncio.run`` per script run), so the shared result is a thread-safe
+``concurrent.futures.Future`` that each caller awaits from its own loop.
+This is not a cache: a key is forgotten as soon as its call completes.
+
+Cancelling a waiting caller only cancels that caller. If the caller doing
+the work is cancelled (e.g. its session stopped), the waiting callers retry
+and one of them takes over.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class _LeaderGone(Exception):
+    """Set on the shared future when the leader stops without a result."""
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a search topic or query."""
+    return _WHITESPACE_RE.sub(" ", text or "").strip().lower()
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hash of the exact key parts (dicts are hashed independent of their order)."""
+    payload = json.dumps(list(parts), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its result."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await ``fn()`` unless an identical call is already running."""
+        while True:
+            try:
+                return await self._do(key, fn)
+            except _LeaderGone:
+                # The call we waited for was cancelled; run it or wait for the new leader
+                continue
+
+    async def _do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Shielded: cancelling this caller must not cancel the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await fn()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # Cancellation and exits belong to this caller only
+            self._finish(key, future, error=_LeaderGone())
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: Exception = None) -> None:
+        # Forget the key first, so followers that retry start a new call
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "executions": self.executions,
+                "calls_saved": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
@@ -0,0 +1,214 @@
+"""
+Source deduplication for Firecrawl deep research results.
+
+Firecrawl regularly returns the same article under several URLs (tracking
+parameters, AMP/mobile mirrors, trailing slashes) as well as syndicated copies
+on different domains. ``deduplicate_sources`` removes both:
+
+1. Exact duplicates, by normalizing URLs and canonicalizing domains.
+2. Near duplicates, by comparing word-shingle sets of the source text.
+   Candidates are found through bottom-k MinHash signatures (the k smallest
+   shingle hashes), which near-duplicate texts share with high probability, so
+   the cost is roughly linear in the number of sources instead of quadratic.
+"""
+
+import heapq
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that never change the page content
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid",
+    "ref", "ref_src", "ref_url", "source", "cmpid", "_ga", "_hsenc", "_hsmi",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# Subdomains that serve the same content as the bare domain
+MIRROR_SUBDOMAINS = ("www.", "m.", "mobile.", "amp.")
+
+# Domains that are aliases of another domain
+DOMAIN_ALIASES = {
+    "youtu.be": "youtube.com",
+    "x.com": "twitter.com",
+    "redd.it": "reddit.com",
+    "old.reddit.com": "reddit.com",
+    "en.m.wikipedia.org": "en.wikipedia.org",
+    "export.arxiv.org": "arxiv.org",
+}
+
+# Path suffixes used by index pages; removing them may leave the root path
+PATH_SUFFIXES = ("/index.html", "/index.htm", "/index.php")
+# Path suffix of AMP copies; only removed after an article path ("/amp" alone is a page)
+AMP_SUFFIX = "/amp"
+
+SHINGLE_SIZE = 3
+# Sources with fewer shingles are only deduplicated by URL
+MIN_SHINGLES = 5
+# Bottom-k MinHash signature size used to find candidate pairs
+SIGNATURE_SIZE = 8
+# Shingle Jaccard similarity at which two sources are near duplicates
+NEAR_DUPLICATE_JACCARD = 0.7
+# Signature values shared by more sources than this are boilerplate, not evidence
+MAX_BUCKET_SIZE = 50
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def canonical_domain(netloc: str) -> str:
+    """Lowercase a host, strip ports and mirror subdomains, resolve aliases."""
+    host = netloc.lower().rsplit("@", 1)[-1].split(":", 1)[0].rstrip(".")
+    if host in DOMAIN_ALIASES:
+        return DOMAIN_ALIASES[host]
+    for prefix in MIRROR_SUBDOMAINS:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+            break
+    return DOMAIN_ALIASES.get(host, host)
+
+
+def normalize_url(url: Any) -> str:
+    """Normalize a URL so that trivially different copies compare equal."""
+    url = str(url or "").strip()
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        # Malformed, e.g. an unclosed IPv6 host; only exact copies compare equal
+        return url
+    domain = canonical_domain(parts.netloc)
+
+    path = re.sub(r"/{2,}", "/", parts.path or "/").rstrip("/") or "/"
+    if path.lower().endswith(AMP_SUFFIX) and path[:-len(AMP_SUFFIX)]:
+        path = path[:-len(AMP_SUFFIX)]
+    for suffix in PATH_SUFFIXES:
+        if path.lower().endswith(suffix):
+            path = path[:-len(suffix)] or "/"
+    path = path.rstrip("/") or "/"
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    # Treat http and https as the same resource
+    return urlunsplit(("https", domain, path, urlencode(query), ""))
+
+
+def _source_text(source: Dict[str, Any]) -> str:
+    return " ".join(
+        str(source[key]) for key in ("title", "description", "content", "markdown") if source.get(key)
+    )
+
+
+def shingle_hashes(text: str) -> Optional[frozenset]:
+    """Hashed word shingles of a text, or None if the text is too short.
+
+    The built-in string hash is salted per process, which is fine because
+    shingles are only compared within a single batch.
+    """
+    words = _WORD_RE.findall(text.lower())
+    shingles = frozenset(
+        hash(" ".join(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+    return shingles if len(shingles) >= MIN_SHINGLES else None
+
+
+def minhash_signature(shingles: frozenset) -> List[int]:
+    """Bottom-k MinHash signature: the k smallest shingle hashes."""
+    return heapq.nsmallest(SIGNATURE_SIZE, shingles)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class DedupResult:
+    """Deduplicated sources and what was removed."""
+    sources: List[Dict[str, Any]]
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    duplicates_of: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def removed(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+
+def deduplicate_sources(sources: List[Dict[str, Any]]) -> DedupResult:
+    """Remove exact and near-duplicate sources, keeping the first occurrence."""
+    result = DedupResult(sources=[])
+    seen_urls: Dict[str, str] = {}
+    buckets: Dict[int, List[int]] = {}
+    kept_shingles: List[Optional[frozenset]] = []
+
+    for source in sources:
+        if not isinstance(source, dict):
+            # Malformed entry from the provider; there is nothing to cite
+            continue
+        url = str(source.get("url") or "")
+        key = normalize_url(url)
+        if key and key in seen_urls:
+            result.exact_duplicates += 1
+            result.duplicates_of.setdefault(seen_urls[key], []).append(url)
+            continue
+
+        shingles = shingle_hashes(_source_text(source))
+        signature = minhash_signature(shingles) if shingles is not None else []
+        match = None
+        checked = set()
+        for value in signature:
+            candidates = buckets.get(value, ())
+            if len(candidates) > MAX_BUCKET_SIZE:
+                continue
+            for index in candidates:
+                if index in checked:
+                    continue
+                checked.add(index)
+                if jaccard(shingles, kept_shingles[index]) >= NEAR_DUPLICATE_JACCARD:
+                    match = index
+                    break
+            if match is not None:
+                break
+
+        if match is not None:
+            result.near_duplicates += 1
+            kept_url = str(result.sources[match].get("url") or "")
+            result.duplicates_of.setdefault(kept_url, []).append(url)
+            if key:
+                seen_urls[key] = kept_url
+            continue
+
+        index = len(result.sources)
+        result.sources.append(source)
+        kept_shingles.append(shingles)
+        if key:
+            seen_urls[key] = url
+        for value in signature:
+            buckets.setdefault(value, []).append(index)
+
+    return result
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    vocabulary = [f"word{i}" for i in range(5000)]
+    # Firecrawl sources carry a title and a short description
+    articles = [" ".join(random.choices(vocabulary, k=40)) for _ in range(2500)]
+    batch = []
+    for i, text in enumerate(articles):
+        batch.append({"url": f"https://www.site{i % 300}.com/post/{i}?utm_source=x", "description": text})
+        if i % 5 == 0:
+            # Same article under another URL and as a lightly edited syndicated copy
+            batch.append({"url": f"http://site{i % 300}.com/post/{i}/", "description": text})
+            batch.append({"url": f"https://mirror{i}.net/a", "description": "Syndicated: " + text})
+
+    start = time.perf_counter()
+    deduped = deduplicate_sources(batch)
+    elapsed = time.perf_counter() - start
+    print(f"{len(batch)} sources -> {len(deduped.sources)} "
+          f"({deduped.exact_duplicates} exact, {deduped.near_duplicates} near) in {elapsed * 1000:.0f} ms")
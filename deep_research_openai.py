@@ -1,12 +1,25 @@
 import asyncio
 import streamlit as st
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from agents import Agent, Runner, trace, set_default_openai_key, set_groq_key, set_provider
-from firecrawl import FirecrawlApp
+from agents import get_coalescing_stats, set_shared_store
+from coalesce import SingleFlight, make_key, normalize_query
+from checkpoints import CheckpointStore, run_id_for
+from resilience import HealthMonitor, endpoint_stats
+from shared_state import JobQueue, SharedHistory, describe as describe_store, open_store
+from structured import ResearchFindings
+from prompts import ELABORATION_INSTRUCTIONS, elaboration_input, research_input, research_instructions
+from citations import cite_report
+from report_store import ReportStore, prune_spilled
 from agents import function_tool
+from progress import ResearchProgress
+from dedup import deduplicate_sources
+from routing import ModelRouter
+from export import FORMATS as EXPORT_FORMATS, available_formats, export_report, prune_exports
+from tuning import ParameterTuner, RunHistory, RunRecord, SaturationMonitor
 from datetime import datetime
 import time
-import json
+import uuid
 
 # Set page configuration
 st.set_page_config(
@@ -54,6 +67,102 @@ if "research_history" not in st.session_state:
     st.session_state.research_history = []
 if "current_research" not in st.session_state:
     st.session_state.current_research = None
+# Checkpoints are scoped to the workspace (?workspace=...) or, without one, to the session
+if "checkpoint_scope" not in st.session_state:
+    st.session_state.checkpoint_scope = st.query_params.get("workspace") or f"session:{uuid.uuid4().hex}"
+# Report bodies live compressed in the session's report store; history keeps ids
+if "report_store" not in st.session_state:
+    st.session_state.report_store = ReportStore()
+report_store = st.session_state.report_store
+
+def to_history_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Move the report and sources of ``entry`` into the report store, keeping metadata."""
+    entry = dict(entry)
+    entry["report_id"] = report_store.put(entry.pop("report", ""))
+    entry["sources_id"] = report_store.put_json(entry.pop("sources", []))
+    return entry
+
+PROVIDERS = ["OpenAI", "Groq", "Local"]
+
+@st.cache_resource(show_spinner="Loading local model...")
+def get_local_queue(backend: str, model: str):
+    """Load a local model once per process and keep it warm behind a batching queue."""
+    # Imported here so ollama/transformers are only loaded when Local is used
+    from local_models import LocalInferenceQueue, create_backend
+    return LocalInferenceQueue(create_backend(backend, model))
+
+@st.cache_resource
+def get_firecrawl_app(api_key: str):
+    """Create one FirecrawlApp per API key, shared across reruns and sessions."""
+    # Imported here so reruns that never research skip the firecrawl import
+    from firecrawl import FirecrawlApp
+    return FirecrawlApp(api_key=api_key)
+
+@st.cache_resource
+def get_firecrawl_flight():
+    """Process-wide single-flight group for Firecrawl deep research jobs."""
+    return SingleFlight("firecrawl")
+
+def check_groq_health(api_key: str):
+    """Lightweight Groq check: list models instead of running a completion."""
+    import requests
+    
+    response = requests.get(
+        "https://api.groq.com/openai/v1/models",
+        headers={"Authorization": f"Bearer {api_key}"},
+        timeout=10
+    )
+    if response.status_code == 200:
+        return True, "Connection successful"
+    return False, f"API Error: {response.status_code} - {response.text}"
+
+@st.cache_resource
+def get_groq_health():
+    """Groq health per API key, refreshed by one background thread so runs never wait on a test request."""
+    return HealthMonitor("groq", check_groq_health, interval=60)
+
+@st.cache_resource
+def prune_report_spills():
+    """Remove stale spilled report bodies once per process."""
+    return prune_spilled()
+
+@st.cache_resource
+def prune_export_cache():
+    """Remove stale cached exports once per process."""
+    return prune_exports()
+
+@st.cache_resource
+def get_checkpoint_store():
+    """Checkpoint store; expired checkpoints are removed once per process."""
+    store = CheckpointStore()
+    store.prune()
+    return store
+
+@st.cache_resource
+def get_shared_store():
+    """Store shared with the other app workers (RESEARCH_STORE_URL), or None."""
+    return open_store()
+
+@st.cache_resource
+def get_firecrawl_jobs():
+    """Cross-worker Firecrawl job queue; None when running as a single process."""
+    store = get_shared_store()
+    return JobQueue(store, "firecrawl") if store is not None else None
+
+prune_report_spills()
+prune_export_cache()
+
+# Multi-worker mode: share completions and history with the other workers
+shared_store = get_shared_store()
+set_shared_store(shared_store)
+shared_history = None
+# History is only shared within an explicit workspace; without one it stays in the session
+workspace = st.query_params.get("workspace")
+if shared_store is not None and workspace:
+    shared_history = SharedHistory(shared_store, workspace)
+    if not st.session_state.get("shared_history_loaded"):
+        st.session_state.research_history = [to_history_entry(entry) for entry in shared_history.load()]
+        st.session_state.shared_history_loaded = True
 
 # Sidebar for API keys
 with st.sidebar:
@@ -62,8 +171,8 @@ with st.sidebar:
     # Provider selection
     provider = st.selectbox(
         "Choose AI Provider",
-        ["OpenAI", "Groq"],
-        index=0 if st.session_state.selected_provider == "OpenAI" else 1,
+        PROVIDERS,
+        index=PROVIDERS.index(st.session_state.selected_provider),
         help="Select your preferred AI provider"
     )
     st.session_state.selected_provider = provider
@@ -96,8 +205,30 @@ with st.sidebar:
         if groq_api_key:
             st.session_state.groq_api_key = groq_api_key
             set_groq_key(groq_api_key)
+            # Start checking in the background while the topic is being entered
+            get_groq_health().watch(groq_api_key)
     
-    # Firecrawl API key (common for both providers)
+    elif provider == "Local":
+        st.header("Local Model Configuration")
+        local_backend = st.selectbox("Backend", ["Ollama", "Hugging Face"],
+                                     help="Runs on this machine, CPU-only")
+        local_model = st.text_input(
+            "Model",
+            value="llama3" if local_backend == "Ollama" else "Qwen/Qwen2.5-0.5B-Instruct",
+            help="Ollama model tag or Hugging Face model id"
+        )
+        if st.button("Load Model") or st.session_state.get("local_model") == (local_backend, local_model):
+            try:
+                local_queue = get_local_queue(local_backend, local_model)
+                st.session_state.local_model = (local_backend, local_model)
+                stats = local_queue.stats()
+                st.caption(f"Loaded · {stats['tokens_per_sec']:.1f} tokens/sec · "
+                           f"avg batch {stats['avg_batch_size']:.1f} over {stats['requests']} requests")
+            except Exception as e:
+                st.session_state.local_model = None
+                st.error(f"Could not load local model: {e}")
+    
+    # Firecrawl API key (common for all providers)
     st.header("Firecrawl Configuration")
     firecrawl_api_key = st.text_input(
         "Firecrawl API Key (Optional)", 
@@ -108,10 +239,30 @@ with st.sidebar:
     if firecrawl_api_key:
         st.session_state.firecrawl_api_key = firecrawl_api_key
     
+    # Model routing
+    smart_routing = st.checkbox("Smart Model Routing",
+                                help="Pick a faster or larger model per template and input size")
+    if smart_routing and "model_router" not in st.session_state:
+        st.session_state.model_router = ModelRouter()
+    # Passed to every agent run of this session; other sessions have their own
+    model_router = st.session_state.model_router if smart_routing else None
+    
     # Debug mode
     debug_mode = st.checkbox("Debug Mode", help="Show detailed error messages and API responses")
     if debug_mode:
         st.session_state.debug_mode = True
+        with st.expander("Request Coalescing"):
+            stats = [get_coalescing_stats(), get_firecrawl_flight().stats()]
+            if get_firecrawl_jobs() is not None:
+                stats.append(get_firecrawl_jobs().stats())
+            st.caption(f"Shared state: {describe_store(shared_store)}")
+            st.json(stats)
+        with st.expander("Session memory"):
+            st.json(report_store.stats())
+        with st.expander("Provider endpoints"):
+            st.dataframe(endpoint_stats())
+            if provider == "Groq" and st.session_state.groq_api_key:
+                st.json(vars(get_groq_health().status(st.session_state.groq_api_key)))
     else:
         st.session_state.debug_mode = False
     
@@ -131,12 +282,36 @@ with st.sidebar:
     time_limit = st.slider("Time Limit (minutes)", 1, 10, 3, help="Maximum research time")
     max_urls = st.slider("Max Sources", 5, 20, 10, help="Maximum number of sources to analyze")
     
+    # Adaptive tuning from previous runs
+    st.subheader("Adaptive Tuning")
+    auto_tune = st.checkbox("Auto-tune parameters", help="Use the cheapest settings that historically reached the target quality")
+    target_quality = st.slider("Target Quality", 0.3, 1.0, 0.7, 0.05, help="Quality score (report length and sources) to aim for")
+    early_stop = st.checkbox("Stop early when sources saturate", value=True,
+                             help="Stop waiting for the Firecrawl job once new sources stop adding new content. "
+                                  "Firecrawl cannot cancel deep research jobs, so the job itself "
+                                  "still runs to its time limit on Firecrawl's side.")
+    
+    recommendation = ParameterTuner().recommend(template, target_quality, st.session_state.get("research_topic"))
+    if recommendation:
+        st.caption(
+            f"Recommended: depth {recommendation.max_depth}, {recommendation.time_limit // 60} min, "
+            f"{recommendation.max_urls} sources (~{recommendation.expected_time:.0f}s, "
+            f"quality {recommendation.expected_quality:.2f} over {recommendation.samples} runs)"
+        )
+        if auto_tune:
+            max_depth = recommendation.max_depth
+            time_limit = recommendation.time_limit // 60
+            max_urls = recommendation.max_urls
+    elif auto_tune:
+        st.caption("Not enough history for this template yet, using the sliders above.")
+    
     # Store parameters in session state
     st.session_state.research_params = {
         "template": template,
         "max_depth": max_depth,
         "time_limit": time_limit * 60,  # Convert to seconds
-        "max_urls": max_urls
+        "max_urls": max_urls,
+        "early_stop": early_stop
     }
 
 # Main content
@@ -147,7 +322,8 @@ st.markdown(f"This AI Agent performs deep research on any topic using {provider}
 research_topic = st.text_input(
     "Enter your research topic:", 
     placeholder="e.g., Latest developments in AI, Market analysis of electric vehicles, etc.",
-    help="Be specific for better research results"
+    help="Be specific for better research results",
+    key="research_topic"
 )
 
 # Research History
@@ -163,139 +339,196 @@ if st.session_state.research_history:
                     st.session_state.current_research = research
                     st.rerun()
 
-# Keep the original deep_research tool
-@function_tool
-async def deep_research(query: str, max_depth: int, time_limit: int, max_urls: int) -> Dict[str, Any]:
-    """
-    Perform comprehensive web research using Firecrawl's deep research endpoint.
+async def poll_deep_research(firecrawl_app, query: str, max_depth: int, time_limit: int, max_urls: int,
+                             on_activity, poll_interval: float = 2.0) -> Dict[str, Any]:
+    """Run a Firecrawl deep research job, returning early once sources saturate.
+
+    Firecrawl has no cancel endpoint for deep research jobs: an early stop
+    only ends polling here, and the job keeps running (and using credits)
+    on Firecrawl's side until it reaches its own limits.
     """
+    monitor = SaturationMonitor()
+    job = firecrawl_app.async_deep_research(
+        query=query,
+        maxDepth=max_depth,
+        timeLimit=time_limit,
+        maxUrls=max_urls
+    )
+    job_id = job.get('id')
+    if not job_id:
+        raise ValueError(f"Firecrawl did not return a job id: {job}")
+    
+    activities_seen = 0
+    while True:
+        status = firecrawl_app.check_deep_research_status(job_id)
+        data = status.get('data') or {}
+        activities = status.get('activities') or data.get('activities') or []
+        sources = status.get('sources') or data.get('sources') or []
+        
+        for activity in activities[activities_seen:]:
+            on_activity(activity)
+        activities_seen = len(activities)
+        
+        for source in sources:
+            monitor.add_source(source)
+        
+        state = status.get('status')
+        if state == 'completed':
+            return {'data': {'finalAnalysis': data.get('finalAnalysis', ''), 'sources': sources}}
+        if state == 'failed':
+            raise ValueError(f"Deep research failed: {status.get('error', 'unknown error')}")
+        
+        if monitor.saturated:
+            # Stop polling and synthesize from what has been collected so far;
+            # the job itself cannot be cancelled and finishes on its own
+            summary = "\n".join(
+                f"- {source.get('title', source.get('url', ''))}: {source.get('description', '')}"
+                for source in sources
+            )
+            final_analysis = data.get('finalAnalysis') or (
+                f"Research stopped early after {monitor.sources_seen} sources stopped adding new content.\n\n{summary}"
+            )
+            return {'data': {'finalAnalysis': final_analysis, 'sources': sources}, 'stopped_early': True}
+        
+        await asyncio.sleep(poll_interval)
+
+async def run_firecrawl_stage(query: str, max_depth: int, time_limit: int, max_urls: int,
+                              checkpoint=None) -> Dict[str, Any]:
+    """Firecrawl deep research with deduplicated, ranked sources, checkpointed in ``checkpoint``."""
     try:
+        # Reuse the Firecrawl result of a failed run with the same inputs
+        if checkpoint is not None:
+            saved = checkpoint.get("firecrawl")
+            if saved is not None:
+                return saved
+        stage_start = time.time()
+        
         # Initialize FirecrawlApp with the API key from session state
-        firecrawl_app = FirecrawlApp(api_key=st.session_state.firecrawl_api_key)
+        firecrawl_app = get_firecrawl_app(st.session_state.firecrawl_api_key)
         
         # Set up a callback for real-time updates with progress tracking
         progress_bar = st.progress(0)
         status_text = st.empty()
+        activity_log = st.empty()
+        progress = ResearchProgress(max_depth, time_limit, max_urls)
         
-        def on_activity(activity):
-            activity_type = activity.get('type', 'info')
-            message = activity.get('message', 'Processing...')
-            
-            # Update progress based on activity type
-            if 'searching' in activity_type.lower():
-                progress_bar.progress(25)
-            elif 'analyzing' in activity_type.lower():
-                progress_bar.progress(50)
-            elif 'synthesizing' in activity_type.lower():
-                progress_bar.progress(75)
-            elif 'complete' in activity_type.lower():
-                progress_bar.progress(100)
-            
-            status_text.text(f"[{activity_type.upper()}] {message}")
-            st.write(f"🔍 [{activity_type}] {message}")
+        def render_progress():
+            progress_bar.progress(int(progress.fraction() * 100))
+            status_text.text(progress.status_line())
+            activity_log.code("\n".join(progress.recent()), language=None)
         
-        # Run deep research with updated v1 API format
-        with st.spinner("Performing deep research..."):
-            results = firecrawl_app.deep_research(
+        early_stop = st.session_state.get('research_params', {}).get('early_stop', False)
+        
+        async def start_job():
+            # Run deep research with updated v1 API format
+            if early_stop:
+                return await poll_deep_research(
+                    firecrawl_app, query, max_depth, time_limit, max_urls, progress.record
+                )
+            # The SDK call blocks until the job ends, so it runs in a worker thread
+            # and only records activities; the page is updated from this thread
+            return await asyncio.to_thread(
+                firecrawl_app.deep_research,
                 query=query,
                 maxDepth=max_depth,
                 timeLimit=time_limit,
                 maxUrls=max_urls,
-                on_activity=on_activity
+                on_activity=progress.record
             )
         
+        async def run_job():
+            # Coalesce events: the page is refreshed on a timer, at a fixed rate,
+            # so activities that arrive inside the throttle window are shown too
+            job = asyncio.ensure_future(start_job())
+            while not job.done():
+                await asyncio.wait({job}, timeout=progress.refresh_interval)
+                if progress.should_render():
+                    render_progress()
+            results = job.result()
+            # Record when the sources were retrieved, for the references' "Accessed" date;
+            # results shared with other sessions or workers keep the original date
+            accessed = datetime.now().strftime('%Y-%m-%d')
+            for source in results['data']['sources']:
+                if isinstance(source, dict):
+                    source.setdefault('accessed', accessed)
+            return results
+        
+        # Identical jobs already running in another session are awaited, not repeated;
+        # only the session that started the job sees its live progress
+        with st.spinner("Performing deep research..."):
+            key = make_key(normalize_query(query), max_depth, time_limit, max_urls, early_stop)
+            run_once = lambda: get_firecrawl_flight().do(key, run_job)
+            # With several workers, the job is also claimed across processes
+            jobs = get_firecrawl_jobs()
+            results = await (jobs.run(key, run_once, lease=time_limit * 2 + 120) if jobs else run_once())
+        
         # Clear progress indicators
         progress_bar.empty()
         status_text.empty()
+        activity_log.empty()
+        
+        if results.get('stopped_early'):
+            st.info(f"Stopped waiting early: new sources stopped adding content after {progress.elapsed:.0f}s. "
+                    "The Firecrawl job itself keeps running until its time limit.")
+        
+        # Drop mirrored URLs and syndicated copies before counting or prompting
+        deduped = deduplicate_sources(results['data']['sources'])
         
-        return {
+        # Rank by relevance, credibility, recency and domain diversity. Imported
+        # here so NumPy is only loaded once a research run gets this far.
+        from scoring import format_ranked_sources, rank_and_assess
+        ranked_sources, source_quality = rank_and_assess(deduped.sources, query)
+        
+        result = {
             "success": True,
             "final_analysis": results['data']['finalAnalysis'],
-            "sources_count": len(results['data']['sources']),
-            "sources": results['data']['sources']
+            "sources_count": len(deduped.sources),
+            "sources": ranked_sources,
+            "ranked_sources": format_ranked_sources(ranked_sources),
+            "source_quality": source_quality,
+            "duplicates_removed": deduped.removed
         }
+        if checkpoint is not None:
+            checkpoint.save("firecrawl", result, time.time() - stage_start)
+        return result
     except Exception as e:
         st.error(f"Deep research error: {str(e)}")
         return {"error": str(e), "success": False}
 
-# Keep the original agents
-def get_template_instructions(template: str) -> str:
-    """Get template-specific instructions for the research agent."""
-    base_instructions = """You are a research assistant that can perform deep web research on any topic.
-
-    When given a research topic or question:
-    1. Use the deep_research tool to gather comprehensive information
-       - Always use these parameters:
-         * max_depth: {max_depth} (for appropriate depth)
-         * time_limit: {time_limit} (in seconds)
-         * max_urls: {max_urls} (sufficient sources)
-    2. The tool will search the web, analyze multiple sources, and provide a synthesis
-    3. Review the research results and organize them into a well-structured report
-    4. Include proper citations for all sources
-    5. Highlight key findings and insights
+# Keep the original deep_research tool
+@function_tool
+async def deep_research(query: str, max_depth: int, time_limit: int, max_urls: int) -> Dict[str, Any]:
     """
-    
-    template_specific = {
-        "Academic Research": """
-    6. Focus on academic rigor and scholarly sources
-    7. Include methodology, findings, and implications
-    8. Use formal academic language and structure
-    9. Provide comprehensive literature review
-        """,
-        "Market Analysis": """
-    6. Focus on market trends, competitors, and opportunities
-    7. Include market size, growth potential, and key players
-    8. Provide actionable business insights
-    9. Include SWOT analysis and recommendations
-        """,
-        "Technical Deep Dive": """
-    6. Focus on technical specifications and implementation details
-    7. Include code examples, architecture diagrams, and technical comparisons
-    8. Provide practical implementation guidance
-    9. Include performance metrics and benchmarks
-        """,
-        "News Summary": """
-    6. Focus on recent developments and breaking news
-    7. Include timeline of events and key stakeholders
-    8. Provide context and background information
-    9. Include expert opinions and public reactions
-        """,
-        "Custom": """
-    6. Adapt the research approach based on the specific topic
-    7. Use appropriate sources and methodology for the subject
-    8. Provide comprehensive analysis tailored to the query
-    9. Include relevant examples and case studies
-        """
-    }
-    
-    return base_instructions + template_specific.get(template, template_specific["Custom"])
-
-research_agent = Agent(
-    name="research_agent",
-    instructions=get_template_instructions(st.session_state.get('research_params', {}).get('template', 'Custom')),
-    tools=[deep_research]
-)
+    Perform comprehensive web research using Firecrawl's deep research endpoint.
+    """
+    # Runs already in progress have done this stage; the checkpoint returns its result
+    return await run_firecrawl_stage(query, max_depth, time_limit, max_urls,
+                                     st.session_state.get('active_checkpoint'))
 
-elaboration_agent = Agent(
-    name="elaboration_agent",
-    instructions="""You are an expert content enhancer specializing in research elaboration.
-
-    When given a research report:
-    1. Analyze the structure and content of the report
-    2. Enhance the report by:
-       - Adding more detailed explanations of complex concepts
-       - Including relevant examples, case studies, and real-world applications
-       - Expanding on key points with additional context and nuance
-       - Adding visual elements descriptions (charts, diagrams, infographics)
-       - Incorporating latest trends and future predictions
-       - Suggesting practical implications for different stakeholders
-    3. Maintain academic rigor and factual accuracy
-    4. Preserve the original structure while making it more comprehensive
-    5. Ensure all additions are relevant and valuable to the topic
+# Keep the original agents
+@st.cache_resource
+def get_research_agent(template: str):
+    """One research agent per template, built once and never modified.
+    
+    Its instructions are the template's stable prompt prefix; run parameters
+    go into the input, so sessions share agents without racing on them.
     """
-)
+    return Agent(
+        name="research_agent",
+        instructions=research_instructions(template),
+        tools=[deep_research],
+        output_type=ResearchFindings
+    )
 
-async def run_research_process(topic: str):
+@st.cache_resource
+def get_elaboration_agent():
+    """Build the elaboration agent once per process instead of on every rerun."""
+    return Agent(
+        name="elaboration_agent",
+        instructions=ELABORATION_INSTRUCTIONS
+    )
+
+async def run_research_process(topic: str, router: Optional[ModelRouter] = None, local_queue=None):
     """Run the complete research process."""
     start_time = time.time()
     
@@ -307,48 +540,106 @@ async def run_research_process(topic: str):
         'template': 'Custom'
     })
     
-    # Update research agent with current parameters
-    research_agent.instructions = get_template_instructions(params['template']).format(
-        max_depth=params['max_depth'],
-        time_limit=params['time_limit'],
-        max_urls=params['max_urls']
-    )
+    research_agent = get_research_agent(params['template'])
+    elaboration_agent = get_elaboration_agent()
+    usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "shared_results": 0}
+    
+    def add_usage(result):
+        # Coalesced and cached results were billed to the run that made the call
+        if result.shared:
+            usage["shared_results"] += 1
+        for name, count in (result.usage or {}).items():
+            usage[name] = usage.get(name, 0) + (count or 0)
     
-    # Step 1: Initial Research
-    with st.spinner("Conducting initial research..."):
-        research_result = await Runner.run(research_agent, topic)
-        initial_report = research_result.final_output
+    # Completed stages are checkpointed so a retry resumes where this run failed
+    checkpoint = get_checkpoint_store().open(run_id_for(
+        topic, params, st.session_state.selected_provider, st.session_state.checkpoint_scope
+    ))
+    st.session_state.active_checkpoint = checkpoint
+    
+    # Step 1: Web research. Run here rather than left to the agent's tool call, so the
+    # deduplicated, ranked sources always reach both agents' prompts
+    research_data = {}
+    if st.session_state.firecrawl_api_key:
+        research_data = await run_firecrawl_stage(topic, params['max_depth'], params['time_limit'],
+                                                  params['max_urls'], checkpoint)
+        if not research_data.get("success"):
+            # The error is shown; the agents research without Firecrawl sources
+            research_data = {}
+    ranked_sources = research_data.get("ranked_sources", "")
+    
+    # Step 2: Initial Research
+    initial_report = checkpoint.get("initial_report")
+    findings = checkpoint.get("findings")
+    if initial_report is None:
+        stage_start = time.time()
+        findings_placeholder = st.empty()
+        streamed_findings = []
+        
+        def on_item(field, item):
+            # Show key findings live while the structured response streams in
+            if field == "key_findings":
+                streamed_findings.append(item.statement)
+                findings_placeholder.markdown(
+                    "**Key findings so far:**\n" + "\n".join(f"- {s}" for s in streamed_findings)
+                )
+        
+        with st.spinner("Conducting initial research..."):
+            research_result = await Runner.run(research_agent,
+                                               research_input(topic, params, research_data.get("final_analysis"),
+                                                              ranked_sources),
+                                               template=params['template'], on_item=on_item, router=router,
+                                               local_queue=local_queue)
+        add_usage(research_result)
+        findings_placeholder.empty()
+        
+        if isinstance(research_result.final_output, ResearchFindings):
+            findings = research_result.final_output.model_dump()
+            initial_report = findings.pop("report")
+        else:
+            # The model did not return structured output (e.g. it made a tool call)
+            initial_report = str(research_result.final_output)
+        checkpoint.save("initial_report", initial_report, time.time() - stage_start)
+        checkpoint.save("findings", findings, 0.0)
     
     # Display initial report in an expander
     with st.expander("View Initial Research Report"):
         st.markdown(initial_report)
     
-    # Step 2: Enhance the report
+    # Step 3: Enhance the report
     with st.spinner("Enhancing the report with additional information..."):
-        elaboration_input = f"""
-        RESEARCH TOPIC: {topic}
-        TEMPLATE: {params['template']}
-        
-        INITIAL RESEARCH REPORT:
-        {initial_report}
-        
-        Please enhance this research report with additional information, examples, case studies, 
-        and deeper insights while maintaining its academic rigor and factual accuracy.
-        """
-        
-        elaboration_result = await Runner.run(elaboration_agent, elaboration_input)
+        elaboration_result = await Runner.run(
+            elaboration_agent, elaboration_input(topic, params['template'], initial_report, ranked_sources),
+            template=params['template'], router=router, local_queue=local_queue
+        )
+        add_usage(elaboration_result)
         enhanced_report = elaboration_result.final_output
     
     # Calculate research metrics
     end_time = time.time()
     research_time = end_time - start_time
     
+    resumed_stages = list(checkpoint.resumed)
+    time_saved = checkpoint.time_saved()
+    checkpoint.clear()
+    st.session_state.active_checkpoint = None
+    
+    # Sources for citation matching: Firecrawl results, else the model's own citations
+    sources = research_data.get("sources") or (findings or {}).get("citations", [])
+    accessed = datetime.fromtimestamp(start_time).strftime('%Y-%m-%d')
+    sources = [{"accessed": accessed, **source} for source in sources if isinstance(source, dict)]
+    
     return {
         "enhanced_report": enhanced_report,
         "initial_report": initial_report,
         "research_time": research_time,
         "topic": topic,
-        "params": params
+        "params": params,
+        "findings": findings,
+        "sources": sources,
+        "usage": usage,
+        "resumed_stages": resumed_stages,
+        "time_saved": time_saved
     }
 
 # Check if required API keys are available
@@ -357,67 +648,107 @@ def check_api_keys():
         return bool(st.session_state.openai_api_key)
     elif st.session_state.selected_provider == "Groq":
         return bool(st.session_state.groq_api_key)
+    elif st.session_state.selected_provider == "Local":
+        return bool(st.session_state.get("local_model"))
     return False
 
-def test_groq_connection():
-    """Test Groq API connection with a simple request."""
-    try:
-        import requests
-        
-        headers = {
-            "Authorization": f"Bearer {st.session_state.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "user", "content": "Hello! Please respond with 'Connection successful'."}
-            ],
-            "max_tokens": 50
-        }
-        
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
+def render_cited_report(report: str, sources: List[Dict[str, Any]]):
+    """Show the report with numbered citations and its reference list.
+    
+    Citations come from matching the report against an index of the sources,
+    so this is cheap enough to run on every rerun.
+    """
+    cited = cite_report(report, sources or [])
+    st.markdown(cited.text)
+    if cited.references:
+        st.subheader("📚 References")
+        st.markdown(cited.references_markdown())
+
+def export_markdown(report: str, sources: List[Dict[str, Any]]) -> str:
+    """The report with its citations and reference list, as exported."""
+    cited = cite_report(report, sources or [])
+    if not cited.references:
+        return report
+    return f"{cited.text}\n\n## References\n\n{cited.references_markdown()}\n"
+
+@st.fragment
+def render_export_options(entry: Dict[str, Any], metadata: Dict[str, Any]):
+    """Export buttons; formats other than Markdown are rendered only on request.
+    
+    Runs as a fragment so preparing an export reruns only this section. The
+    report is loaded from the report store by id and only rendered when a
+    download is requested, so the widgets do not hold another copy of it.
+    """
+    store = st.session_state.report_store
+    
+    def load_report() -> str:
+        return export_markdown(store.get(entry["report_id"]) or "", store.get_json(entry["sources_id"], []))
+    
+    st.markdown("### 📤 Export Options")
+    file_stem = f"{entry['topic'].replace(' ', '_')}_report"
+    export_col1, export_col2 = st.columns(2)
+    
+    with export_col1:
+        st.download_button(
+            "📄 Download Markdown",
+            load_report,
+            file_name=f"{file_stem}.md",
+            mime="text/markdown"
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if st.session_state.get('debug_mode', False):
-                st.json(result)
-            return True, "Connection successful"
-        else:
-            return False, f"API Error: {response.status_code} - {response.text}"
-            
-    except Exception as e:
-        return False, f"Connection failed: {str(e)}"
+    
+    with export_col2:
+        formats = available_formats()
+        fmt = st.selectbox("Other formats", formats, key=f"export_format_{entry['report_id']}")
+        if st.button(f"Prepare {fmt}", key=f"prepare_{fmt}_{entry['report_id']}"):
+            with st.spinner(f"Rendering {fmt}..."):
+                path = export_report(load_report(), fmt, metadata)
+            extension, mime = EXPORT_FORMATS[fmt]
+            with open(path, "rb") as f:
+                st.download_button(
+                    f"⬇️ Download {fmt}",
+                    f,
+                    file_name=f"{file_stem}.{extension}",
+                    mime=mime
+                )
+        missing = [name for name in EXPORT_FORMATS if name not in formats]
+        if missing:
+            st.caption(f"Install reportlab / python-docx to enable {', '.join(missing)} export.")
 
 # Main research process
-if st.button("Start Research", disabled=not (check_api_keys() and research_topic)):
+retry_requested = st.session_state.pop("retry_research", False)
+if st.button("Start Research", disabled=not (check_api_keys() and research_topic)) or retry_requested:
     if not check_api_keys():
         st.warning(f"Please enter your {st.session_state.selected_provider} API key in the sidebar.")
     elif not research_topic:
         st.warning("Please enter a research topic.")
     else:
         try:
-            # Test Groq connection if using Groq
+            # Fail fast on a known Groq outage; the check itself runs in the background
             if st.session_state.selected_provider == "Groq":
-                with st.spinner("Testing Groq API connection..."):
-                    success, message = test_groq_connection()
-                    if not success:
-                        st.error(f"Groq API test failed: {message}")
-                        st.stop()
-                    else:
-                        st.success("Groq API connection successful!")
+                health = get_groq_health().status(st.session_state.groq_api_key)
+                if health.healthy is False:
+                    st.error(f"Groq API test failed: {health.message}")
+                    st.stop()
             
             # Create placeholder for the final report
             report_placeholder = st.empty()
             
             # Run the research process
-            research_result = asyncio.run(run_research_process(research_topic))
+            local_queue = None
+            if st.session_state.selected_provider == "Local":
+                local_queue = get_local_queue(*st.session_state.local_model)
+            research_result = asyncio.run(run_research_process(research_topic, model_router, local_queue))
+            
+            if st.session_state.get('debug_mode', False) and smart_routing:
+                with st.expander("Model Routing Decisions"):
+                    st.json(st.session_state.model_router.summary())
+                    st.dataframe(st.session_state.model_router.export_decisions())
+            
+            if research_result["resumed_stages"]:
+                st.success(
+                    f"Resumed from checkpoint ({', '.join(research_result['resumed_stages'])}), "
+                    f"saving ~{research_result['time_saved']:.0f}s"
+                )
             
             # Display research metrics
             st.markdown("### 📊 Research Metrics")
@@ -431,92 +762,67 @@ if st.button("Start Research", disabled=not (check_api_keys() and research_topic
             with col4:
                 st.metric("Max Sources", research_result['params']['max_urls'])
             
+            usage = research_result["usage"]
+            if usage["prompt_tokens"]:
+                st.caption(
+                    f"Prompt cache: {usage['cached_tokens']:,} of {usage['prompt_tokens']:,} prompt tokens "
+                    f"served from the provider's cache ({usage['cached_tokens'] / usage['prompt_tokens']:.0%})"
+                )
+            if usage.get("shared_results"):
+                st.caption(
+                    f"{usage['shared_results']} result(s) reused from an identical run; "
+                    "their tokens are counted there, not here"
+                )
+            
             # Display the enhanced report
             st.markdown("## 📋 Enhanced Research Report")
-            st.markdown(research_result["enhanced_report"])
+            render_cited_report(research_result["enhanced_report"], research_result["sources"])
+            
+            findings = research_result["findings"]
+            if findings and findings["key_findings"]:
+                st.markdown("### 🔑 Key Findings")
+                for finding in findings["key_findings"]:
+                    st.markdown(f"- {finding['statement']}")
             
             # Add to research history
-            st.session_state.research_history.append({
+            history_entry = {
                 "topic": research_topic,
                 "timestamp": datetime.now(),
                 "report": research_result["enhanced_report"],
+                "sources": research_result["sources"],
                 "metrics": {
                     "research_time": research_result['research_time'],
                     "template": research_result['params']['template'],
                     "max_depth": research_result['params']['max_depth'],
                     "max_urls": research_result['params']['max_urls']
                 }
-            })
+            }
+            if shared_history is not None:
+                shared_history.append(history_entry)
+            history_entry = to_history_entry(history_entry)
+            st.session_state.research_history.append(history_entry)
             
-            # Export options
-            st.markdown("### 📤 Export Options")
-            export_col1, export_col2, export_col3 = st.columns(3)
-            
-            with export_col1:
-                st.download_button(
-                    "📄 Download Markdown",
-                    research_result["enhanced_report"],
-                    file_name=f"{research_topic.replace(' ', '_')}_report.md",
-                    mime="text/markdown"
-                )
+            # Record the run so future parameter recommendations can use it
+            RunHistory().record(RunRecord.from_result(research_result))
             
-            with export_col2:
-                # Generate HTML version
-                html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Research Report: {research_topic}</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 40px; }}
-        h1 {{ color: #667eea; }}
-        .metadata {{ background: #f0f2f6; padding: 15px; border-radius: 8px; margin: 20px 0; }}
-    </style>
-</head>
-<body>
-    <h1>Research Report: {research_topic}</h1>
-    <div class="metadata">
-        <p><strong>Generated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        <p><strong>Template:</strong> {research_result['params']['template']}</p>
-        <p><strong>Research Time:</strong> {research_result['research_time']:.1f} seconds</p>
-    </div>
-    {research_result["enhanced_report"].replace(chr(10), '<br>')}
-</body>
-</html>"""
-                st.download_button(
-                    "🌐 Download HTML",
-                    html_content,
-                    file_name=f"{research_topic.replace(' ', '_')}_report.html",
-                    mime="text/html"
-                )
-            
-            with export_col3:
-                # Generate JSON export with metadata
-                json_export = {
-                    "topic": research_topic,
-                    "timestamp": datetime.now().isoformat(),
-                    "template": research_result['params']['template'],
-                    "metrics": {
-                        "research_time": research_result['research_time'],
-                        "max_depth": research_result['params']['max_depth'],
-                        "max_urls": research_result['params']['max_urls']
-                    },
-                    "report": research_result["enhanced_report"]
-                }
-                st.download_button(
-                    "📊 Download JSON",
-                    json.dumps(json_export, indent=2),
-                    file_name=f"{research_topic.replace(' ', '_')}_report.json",
-                    mime="application/json"
-                )
+            # Export options
+            render_export_options(history_entry, {
+                "topic": research_topic,
+                "generated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "template": research_result['params']['template'],
+                "research_time": f"{research_result['research_time']:.1f} seconds",
+                "max_depth": research_result['params']['max_depth'],
+                "max_urls": research_result['params']['max_urls']
+            })
             
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
             if st.session_state.get('debug_mode', False):
                 st.exception(e)
             
-            # Add retry button
-            if st.button("🔄 Retry Research"):
-                st.rerun()
+            # Add retry button; the retry resumes from the last checkpointed stage
+            st.button("🔄 Retry Research",
+                      on_click=lambda: st.session_state.update(retry_research=True))
 
 # Display current research if available
 if st.session_state.current_research:
@@ -534,7 +840,9 @@ if st.session_state.current_research:
         with col3:
             st.metric("Search Depth", st.session_state.current_research['metrics']['max_depth'])
     
-    st.markdown(st.session_state.current_research['report'])
+    current = st.session_state.current_research
+    render_cited_report(report_store.get(current['report_id']) or "*The report body is no longer available.*",
+                        report_store.get_json(current['sources_id'], []))
     
     if st.button("Clear Current Research"):
         st.session_state.current_research = None
@@ -563,4 +871,13 @@ with st.expander("Provider Information"):
         - **Speed**: Very fast (optimized for speed)
         - **Quality**: Good
         - **Setup**: https://console.groq.com/keys
+        """)
+    elif st.session_state.selected_provider == "Local":
+        st.markdown("""
+        ### Local
+        - **Cost**: Free (runs on your own hardware)
+        - **Models**: Any Ollama model or Hugging Face causal LM
+        - **Speed**: Depends on hardware (CPU-only by default)
+        - **Quality**: Depends on the model
+        - **Setup**: https://ollama.com or `pip install transformers torch`
         """) 
\ No newline at end of file
@@ -0,0 +1,460 @@
+"""
+Report export subsystem.
+
+Reports are rendered from Markdown to HTML, PDF, DOCX or JSON only when an
+export is requested. Every renderer yields its output in chunks that are
+streamed straight to a file in an on-disk cache keyed by the hash of the
+report and its metadata, so repeated downloads of the same report are free
+and no rendered copy is kept in session memory.
+
+PDF export needs ``reportlab`` and DOCX export needs ``python-docx``; both are
+optional and the formats are reported as unavailable when missing.
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tuning import DATA_DIR
+
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
+# Cached exports not downloaded for this long are removed by ``prune_exports``
+EXPORT_TTL = 7 * 24 * 60 * 60
+# At most this many cached exports are kept, most recently used first
+MAX_EXPORTS = 500
+
+# Metadata that changes on every render without changing the report; it is
+# left out of the cache key so it does not defeat the cache
+VOLATILE_METADATA = ("generated",)
+# Bumped when rendering changes, so exports cached by an older version are not served
+RENDER_VERSION = 2
+
+FORMATS = {
+    "HTML": ("html", "text/html"),
+    "PDF": ("pdf", "application/pdf"),
+    "DOCX": ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "JSON": ("json", "application/json"),
+}
+
+HTML_STYLE = """
+        body { font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; max-width: 900px; }
+        h1 { color: #667eea; }
+        pre { background: #f6f8fa; padding: 12px; border-radius: 6px; overflow-x: auto; }
+        code { background: #f6f8fa; padding: 2px 4px; border-radius: 4px; }
+        blockquote { border-left: 4px solid #667eea; margin: 0; padding-left: 16px; color: #555; }
+        table { border-collapse: collapse; }
+        th, td { border: 1px solid #ddd; padding: 6px 10px; }
+        .metadata { background: #f0f2f6; padding: 15px; border-radius: 8px; margin: 20px 0; }
+"""
+
+
+# ---------------------------------------------------------------------------
+# Markdown parsing
+# ---------------------------------------------------------------------------
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_RE = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_HR_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEP_RE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+
+
+def parse_blocks(markdown_text: str) -> Iterator[Tuple[str, Any]]:
+    """Split Markdown into ``(kind, payload)`` blocks, one pass, line by line.
+
+    Kinds: heading (level, text), paragraph (text), list (ordered, items),
+    code (language, text), quote (text), table (rows), hr (None).
+    """
+    lines = markdown_text.splitlines()
+    i = 0
+    paragraph: List[str] = []
+
+    def flush():
+        if paragraph:
+            text = " ".join(line.strip() for line in paragraph)
+            paragraph.clear()
+            return ("paragraph", text)
+        return None
+
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        if stripped.startswith("```"):
+            block = flush()
+            if block:
+                yield block
+            language = stripped[3:].strip()
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith("```"):
+                code.append(lines[i])
+                i += 1
+            yield ("code", (language, "\n".join(code)))
+            i += 1
+            continue
+
+        if not stripped:
+            block = flush()
+            if block:
+                yield block
+            i += 1
+            continue
+
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            block = flush()
+            if block:
+                yield block
+            yield ("heading", (len(heading.group(1)), heading.group(2)))
+            i += 1
+            continue
+
+        if _HR_RE.match(stripped):
+            block = flush()
+            if block:
+                yield block
+            yield ("hr", None)
+            i += 1
+            continue
+
+        if stripped.startswith(">"):
+            block = flush()
+            if block:
+                yield block
+            quote = []
+            while i < len(lines) and lines[i].strip().startswith(">"):
+                quote.append(lines[i].strip()[1:].strip())
+                i += 1
+            yield ("quote", " ".join(quote))
+            continue
+
+        if "|" in stripped and i + 1 < len(lines) and _TABLE_SEP_RE.match(lines[i + 1]):
+            block = flush()
+            if block:
+                yield block
+            rows = [_split_row(stripped)]
+            i += 2
+            while i < len(lines) and "|" in lines[i]:
+                rows.append(_split_row(lines[i]))
+                i += 1
+            yield ("table", rows)
+            continue
+
+        item = _LIST_RE.match(line)
+        if item:
+            block = flush()
+            if block:
+                yield block
+            ordered = item.group(2)[0].isdigit()
+            items = []
+            while i < len(lines):
+                item = _LIST_RE.match(lines[i])
+                if item and not item.group(1) and item.group(2)[0].isdigit() != ordered:
+                    # A top-level item of the other list type starts a new list
+                    break
+                if item:
+                    items.append((len(item.group(1)) // 2, item.group(3)))
+                elif lines[i].strip() and items and lines[i].startswith(" "):
+                    # Continuation line of the previous item
+                    depth, text = items[-1]
+                    items[-1] = (depth, text + " " + lines[i].strip())
+                else:
+                    break
+                i += 1
+            yield ("list", (ordered, items))
+            continue
+
+        paragraph.append(line)
+        i += 1
+
+    block = flush()
+    if block:
+        yield block
+
+
+def _split_row(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+_INLINE_RULES = [
+    (re.compile(r"`([^`]+)`"), r"<code>\1</code>"),
+    (re.compile(r"\*\*(.+?)\*\*|__(.+?)__"), lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>"),
+    (re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?!\w)|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)"),
+     lambda m: f"<em>{m.group(1) or m.group(2)}</em>"),
+]
+_LINK_RE = re.compile(r"\[([^\]]+)\]\((https?://[^)\s]+)\)")
+_PLACEHOLDER_RE = re.compile(r"\x00(\d+)\x00")
+
+
+def _apply_inline_rules(text: str) -> str:
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def render_inline(text: str) -> str:
+    """Escape text and apply inline Markdown (code, bold, italic, links)."""
+    # Quotes are escaped too, so a URL cannot close the href attribute
+    text = html.escape(text.replace("\x00", ""), quote=True)
+    # Links become placeholders first, so the other rules never rewrite a URL
+    anchors: List[str] = []
+
+    def anchor(match: "re.Match") -> str:
+        anchors.append(f'<a href="{match.group(2)}">{_apply_inline_rules(match.group(1))}</a>')
+        return f"\x00{len(anchors) - 1}\x00"
+
+    text = _apply_inline_rules(_LINK_RE.sub(anchor, text))
+    return _PLACEHOLDER_RE.sub(lambda m: anchors[int(m.group(1))], text)
+
+
+def _strip_inline(text: str) -> str:
+    """Plain-text version of inline Markdown for PDF/DOCX runs."""
+    text = _LINK_RE.sub(r"\1 (\2)", text)
+    return re.sub(r"(\*\*|__|`)", "", text)
+
+
+# ---------------------------------------------------------------------------
+# Renderers (generators yielding chunks)
+# ---------------------------------------------------------------------------
+
+def render_html(report: str, metadata: Dict[str, Any]) -> Iterator[str]:
+    title = html.escape(metadata.get("topic", "Research Report"))
+    yield f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Research Report: {title}</title>
+    <style>{HTML_STYLE}    </style>
+</head>
+<body>
+    <h1>Research Report: {title}</h1>
+    <div class="metadata">
+"""
+    for key, value in metadata.items():
+        if key != "topic":
+            yield f"        <p><strong>{html.escape(key.replace('_', ' ').title())}:</strong> {html.escape(str(value))}</p>\n"
+    yield "    </div>\n"
+
+    for kind, payload in parse_blocks(report):
+        if kind == "heading":
+            level, text = payload
+            yield f"<h{level}>{render_inline(text)}</h{level}>\n"
+        elif kind == "paragraph":
+            yield f"<p>{render_inline(payload)}</p>\n"
+        elif kind == "code":
+            language, code = payload
+            css = f' class="language-{html.escape(language)}"' if language else ""
+            yield f"<pre><code{css}>{html.escape(code)}</code></pre>\n"
+        elif kind == "quote":
+            yield f"<blockquote>{render_inline(payload)}</blockquote>\n"
+        elif kind == "hr":
+            yield "<hr>\n"
+        elif kind == "table":
+            header, *rows = payload
+            yield "<table>\n<tr>" + "".join(f"<th>{render_inline(c)}</th>" for c in header) + "</tr>\n"
+            for row in rows:
+                yield "<tr>" + "".join(f"<td>{render_inline(c)}</td>" for c in row) + "</tr>\n"
+            yield "</table>\n"
+        elif kind == "list":
+            yield from _render_html_list(*payload)
+
+    yield "</body>\n</html>\n"
+
+
+def _render_html_list(ordered: bool, items: List[Tuple[int, str]]) -> Iterator[str]:
+    tag = "ol" if ordered else "ul"
+    depth = -1
+    for item_depth, text in items:
+        while depth < item_depth:
+            yield f"<{tag}>\n"
+            depth += 1
+        while depth > item_depth:
+            yield f"</{tag}>\n"
+            depth -= 1
+        yield f"<li>{render_inline(text)}</li>\n"
+    while depth >= 0:
+        yield f"</{tag}>\n"
+        depth -= 1
+
+
+def render_json(report: str, metadata: Dict[str, Any]) -> Iterator[str]:
+    # Write the report body last so the metadata is not re-serialized with it
+    header = json.dumps(metadata, indent=2, default=str)
+    yield (header[:-2] + ",\n" if metadata else "{\n") + '  "report": '
+    yield json.dumps(report)
+    yield "\n}\n"
+
+
+def render_pdf(report: str, metadata: Dict[str, Any], path: str) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, Preformatted, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    story = [Paragraph(html.escape(f"Research Report: {metadata.get('topic', '')}"), styles["Title"])]
+    for key, value in metadata.items():
+        if key != "topic":
+            story.append(Paragraph(f"<b>{html.escape(key.replace('_', ' ').title())}:</b> {html.escape(str(value))}",
+                                   styles["Normal"]))
+    story.append(Spacer(1, 12))
+
+    for kind, payload in parse_blocks(report):
+        if kind == "heading":
+            level, text = payload
+            story.append(Paragraph(html.escape(_strip_inline(text)), styles[f"Heading{min(level, 4)}"]))
+        elif kind in ("paragraph", "quote"):
+            story.append(Paragraph(render_inline(payload), styles["BodyText"]))
+        elif kind == "code":
+            story.append(Preformatted(payload[1], styles["Code"]))
+        elif kind == "list":
+            ordered, items = payload
+            for n, (depth, text) in enumerate(items, 1):
+                bullet = f"{n}." if ordered else "•"
+                story.append(Paragraph(f"{'&nbsp;' * 4 * depth}{bullet} {render_inline(text)}", styles["BodyText"]))
+        elif kind == "table":
+            for row in payload:
+                story.append(Paragraph(html.escape(" | ".join(row)), styles["BodyText"]))
+        story.append(Spacer(1, 6))
+
+    SimpleDocTemplate(path, pagesize=A4, title=metadata.get("topic", "Research Report")).build(story)
+
+
+def render_docx(report: str, metadata: Dict[str, Any], path: str) -> None:
+    from docx import Document
+
+    document = Document()
+    document.add_heading(f"Research Report: {metadata.get('topic', '')}", level=0)
+    for key, value in metadata.items():
+        if key != "topic":
+            paragraph = document.add_paragraph()
+            paragraph.add_run(f"{key.replace('_', ' ').title()}: ").bold = True
+            paragraph.add_run(str(value))
+
+    for kind, payload in parse_blocks(report):
+        if kind == "heading":
+            level, text = payload
+            document.add_heading(_strip_inline(text), level=min(level, 9))
+        elif kind == "paragraph":
+            document.add_paragraph(_strip_inline(payload))
+        elif kind == "quote":
+            document.add_paragraph(_strip_inline(payload), style="Intense Quote")
+        elif kind == "code":
+            document.add_paragraph(payload[1], style="No Spacing")
+        elif kind == "list":
+            ordered, items = payload
+            for depth, text in items:
+                style = "List Number" if ordered else "List Bullet"
+                if depth:
+                    style += f" {min(depth + 1, 3)}"
+                document.add_paragraph(_strip_inline(text), style=style)
+        elif kind == "table":
+            table = document.add_table(rows=0, cols=len(payload[0]))
+            table.style = "Table Grid"
+            for row in payload:
+                cells = table.add_row().cells
+                for cell, text in zip(cells, row):
+                    cell.text = _strip_inline(text)
+
+    document.save(path)
+
+
+# ---------------------------------------------------------------------------
+# Cached export
+# ---------------------------------------------------------------------------
+
+def available_formats() -> List[str]:
+    """Export formats whose optional dependencies are installed."""
+    import importlib.util
+
+    formats = ["HTML", "JSON"]
+    if importlib.util.find_spec("reportlab"):
+        formats.append("PDF")
+    if importlib.util.find_spec("docx"):
+        formats.append("DOCX")
+    return formats
+
+
+def report_hash(report: str, metadata: Dict[str, Any]) -> str:
+    """Cache key of an export; ignores ``VOLATILE_METADATA``."""
+    stable = {key: value for key, value in metadata.items() if key not in VOLATILE_METADATA}
+    digest = hashlib.sha256(f"v{RENDER_VERSION}:".encode("utf-8"))
+    digest.update(report.encode("utf-8"))
+    digest.update(json.dumps(stable, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+def export_report(report: str, fmt: str, metadata: Dict[str, Any],
+                  export_dir: Optional[str] = None) -> str:
+    """Render ``report`` in ``fmt`` and return the path of the cached file.
+
+    The file is written to a temporary name and renamed into place, so a
+    concurrent reader never sees a partial export. A cached file keeps the
+    ``generated`` time of its first render.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    extension, _ = FORMATS[fmt]
+    export_dir = export_dir or EXPORT_DIR
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"{report_hash(report, metadata)}.{extension}")
+    if os.path.exists(path):
+        # Mark as recently used for prune_exports
+        os.utime(path)
+        return path
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if fmt == "PDF":
+            render_pdf(report, metadata, tmp_path)
+        elif fmt == "DOCX":
+            render_docx(report, metadata, tmp_path)
+        else:
+            renderer = render_html if fmt == "HTML" else render_json
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for chunk in renderer(report, metadata):
+                    f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def prune_exports(export_dir: Optional[str] = None, max_age: float = EXPORT_TTL,
+                  max_files: int = MAX_EXPORTS) -> int:
+    """Delete cached exports unused for ``max_age`` seconds; returns how many.
+
+    Beyond that, only the ``max_files`` most recently used exports are kept.
+    """
+    export_dir = export_dir or EXPORT_DIR
+    if not os.path.isdir(export_dir):
+        return 0
+    files = []
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        try:
+            files.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            # Renamed into place or removed by another worker meanwhile
+            continue
+    files.sort(reverse=True)
+    cutoff = time.time() - max_age
+    removed = 0
+    kept = 0
+    for mtime, path in files:
+        if path.endswith(".tmp") and mtime >= cutoff:
+            # A render in progress
+            continue
+        kept += 1
+        if kept > max_files or mtime < cutoff:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
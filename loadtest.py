@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Load test for the research flow with concurrent headless Streamlit sessions.
+
+Each virtual user is an AppTest session of ``deep_research_openai.py`` in
+its own thread, like a browser tab on a real server. It enters a topic and
+clicks "Start Research", which runs the blocking
+``asyncio.run(run_research_process(...))`` against a mock OpenAI client with
+configurable latency. The number of users is ramped in stages, and each
+stage reports:
+
+- throughput (completed research runs per second),
+- p50 / p95 / p99 latency of a research run,
+- process RSS growth per live session,
+- errors.
+
+All sessions share one compiled copy of the script, as on a server, and
+run history, checkpoints and spilled reports go to a temporary data
+directory instead of the real ``.research_data``.
+
+The saturation point is the first stage where adding users no longer
+raises throughput by at least ``--min-gain``, or where p95 latency exceeds
+``--max-slowdown`` times the single-user baseline.
+
+Usage:
+    python loadtest.py [--users 1,2,4,8,16,32] [--runs 3] [--latency 0.5]
+                       [--same-topic] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import types
+from typing import Any, Dict, List
+
+from bench_utils import rss_mb, share_script_cache
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deep_research_openai.py")
+MOCK_API_KEY = "sk-loadtest"
+
+MOCK_FINDINGS = {
+    "key_findings": [{"statement": "Mock finding about the topic", "source_urls": ["https://example.org/a"]}],
+    "citations": [{"title": "Example source", "url": "https://example.org/a"}],
+    "trends": ["Mock trend"],
+    "recommendations": ["Mock recommendation"],
+    "report": "# Initial report\n\nMock findings about the research topic.",
+}
+MOCK_REPORT = "# Enhanced report\n\n" + "Mock elaborated paragraph about the research topic. " * 200
+
+
+def _ns(**kwargs: Any) -> types.SimpleNamespace:
+    return types.SimpleNamespace(**kwargs)
+
+
+class MockCompletions:
+    """Stands in for ``client.chat.completions`` with a fixed latency per call.
+
+    The latency is spent in ``time.sleep`` to block like the synchronous
+    OpenAI client does; streamed responses spread it over their chunks.
+    """
+
+    def __init__(self, latency: float, chunk_size: int = 64):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def create(self, **kwargs: Any) -> Any:
+        with self._lock:
+            self.calls += 1
+        if kwargs.get("stream"):
+            return self._stream(json.dumps(MOCK_FINDINGS))
+        time.sleep(self.latency)
+        message = _ns(content=MOCK_REPORT, tool_calls=None)
+        return _ns(choices=[_ns(message=message)], usage=None)
+
+    def _stream(self, text: str):
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield _ns(choices=[_ns(delta=_ns(content=chunk, tool_calls=None))])
+
+
+class MockOpenAIClient:
+    def __init__(self, latency: float):
+        self.chat = _ns(completions=MockCompletions(latency))
+
+
+def install_shared_runtime() -> None:
+    """Give all AppTest sessions one runtime, as a real server does.
+
+    AppTest installs a mock ``Runtime`` in a global for each run and removes
+    it afterwards, which breaks sessions that run concurrently. Replace the
+    singleton lookup with one shared mock runtime for the whole load test.
+    Each run also patches ``config.get_option`` to turn on ``global.appTest``
+    and restores it when done, which turns the option off under sessions that
+    are still running; keep it on for the whole load test instead.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    try:
+        from streamlit.components.v2.component_manager import BidiComponentManager
+        runtime.bidi_component_registry = BidiComponentManager()
+    except ImportError:
+        pass
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+def virtual_user(user: int, runs: int, same_topic: bool, timeout: float,
+                 sessions: list, latencies: List[float], errors: List[str], lock: threading.Lock) -> None:
+    """One browser session: load the app, then run research ``runs`` times."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    app.session_state["openai_api_key"] = MOCK_API_KEY
+    with lock:
+        sessions.append(app)
+    try:
+        app.run()
+        for run in range(runs):
+            topic = "load test topic" if same_topic else f"load test topic {user}-{run}"
+            start = time.perf_counter()
+            # Submitting the topic is its own rerun, as in the browser
+            app.text_input(key="research_topic").input(topic).run()
+            app.button[[b.label for b in app.button].index("Start Research")].click().run()
+            elapsed = time.perf_counter() - start
+            failures = [e.value for e in app.exception] + [e.value for e in app.error]
+            with lock:
+                if failures:
+                    errors.extend(str(f) for f in failures)
+                else:
+                    latencies.append(elapsed)
+    except Exception as e:
+        with lock:
+            errors.append(f"user {user}: {e}")
+
+
+def run_stage(users: int, runs: int, same_topic: bool, timeout: float) -> Dict[str, Any]:
+    sessions: list = []
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    rss_before = rss_mb()
+
+    threads = [
+        threading.Thread(target=virtual_user,
+                         args=(user, runs, same_topic, timeout, sessions, latencies, errors, lock))
+        for user in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    # Sessions are still referenced here, so RSS includes their state
+    rss_after = rss_mb()
+
+    return {
+        "users": users,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_s": percentile(latencies, 0.5),
+        "p95_s": percentile(latencies, 0.95),
+        "p99_s": percentile(latencies, 0.99),
+        "rss_mb": rss_after,
+        "mb_per_session": max(rss_after - rss_before, 0.0) / users,
+    }
+
+
+def find_saturation(stages: List[Dict[str, Any]], min_gain: float, max_slowdown: float) -> Dict[str, Any]:
+    """First stage where throughput stops scaling or tail latency degrades."""
+    baseline_p95 = stages[0]["p95_s"]
+    for previous, stage in zip(stages, stages[1:]):
+        if stage["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            return {"users": stage["users"], "reason": "throughput stopped increasing",
+                    "max_useful_users": previous["users"]}
+        if stage["p95_s"] > baseline_p95 * max_slowdown:
+            return {"users": stage["users"], "reason": f"p95 latency above {max_slowdown:g}x baseline",
+                    "max_useful_users": previous["users"]}
+    return {"users": None, "reason": "not reached", "max_useful_users": stages[-1]["users"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="Comma-separated virtual users per stage")
+    parser.add_argument("--runs", type=int, default=3, help="Research runs per user per stage")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock provider latency per call (s)")
+    parser.add_argument("--same-topic", action="store_true",
+                        help="All users research the same topic (exercises request coalescing)")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-run AppTest timeout (s)")
+    parser.add_argument("--min-gain", type=float, default=0.1,
+                        help="Minimum relative throughput gain for a stage to count as scaling")
+    parser.add_argument("--max-slowdown", type=float, default=3.0,
+                        help="p95 latency multiple of the baseline that counts as saturated")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    # Set before the app modules are imported, which read it at import time
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as data_dir:
+        os.environ["RESEARCH_DATA_DIR"] = data_dir
+        run_load_test(args)
+
+
+def run_load_test(args: argparse.Namespace) -> None:
+    # Route all OpenAI calls of every session to the mock
+    import agents
+    client = MockOpenAIClient(args.latency)
+    agents.set_openai_client(client, MOCK_API_KEY)
+    install_shared_runtime()
+    share_script_cache()
+
+    # Warm up imports and cached resources so they are not billed to the first stage
+    from streamlit.testing.v1 import AppTest
+    AppTest.from_file(APP_FILE, default_timeout=args.timeout).run()
+
+    print(f"Mock provider latency {args.latency:.2f}s per call, {args.runs} runs per user\n")
+    print(f"{'users':>5} {'done':>5} {'err':>4} {'runs/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+          f"{'RSS MB':>7} {'MB/sess':>8}")
+    stages = []
+    for users in (int(u) for u in args.users.split(",")):
+        stage = run_stage(users, args.runs, args.same_topic, args.timeout)
+        stages.append(stage)
+        print(f"{stage['users']:>5} {stage['completed']:>5} {stage['errors']:>4} {stage['throughput_rps']:>7.2f} "
+              f"{stage['p50_s']:>7.2f} {stage['p95_s']:>7.2f} {stage['p99_s']:>7.2f} "
+              f"{stage['rss_mb']:>7.0f} {stage['mb_per_session']:>8.2f}")
+        if stage["first_error"]:
+            print(f"      first error: {stage['first_error']}")
+
+    saturation = find_saturation(stages, args.min_gain, args.max_slowdown)
+    if saturation["users"] is None:
+        print(f"\nNo saturation up to {saturation['max_useful_users']} users")
+    else:
+        print(f"\nSaturated at {saturation['users']} users ({saturation['reason']}); "
+              f"throughput peaks around {saturation['max_useful_users']} users")
+    print(f"Provider calls: {client.chat.completions.calls}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency": args.latency, "runs": args.runs, "same_topic": args.same_topic,
+                       "stages": stages, "saturation": saturation}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
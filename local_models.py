@@ -0,0 +1,281 @@
+"""
+Local model provider for the agents Runner.
+
+Runs prompts on in-house hardware through Ollama or Hugging Face
+transformers, CPU-only by default. A ``LocalInferenceQueue`` sits in front of
+the backend: concurrent ``Runner.run`` calls are queued, and requests that
+arrive within a short window are grouped into one ``generate_batch`` call,
+which the transformers backend executes as a single padded forward pass.
+Models are loaded once at construction (preloading) and kept warm with a
+periodic keep-alive, and the queue reports generated tokens/sec.
+
+Both ``ollama`` and ``transformers``/``torch`` are optional dependencies and
+are only imported when the corresponding backend is created.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+Messages = List[Dict[str, str]]
+
+DEFAULT_OLLAMA_MODEL = "llama3"
+DEFAULT_HF_MODEL = "Qwen/Qwen2.5-0.5B-Instruct"
+
+
+class OllamaBackend:
+    """Ollama chat backend. The Ollama server schedules concurrent requests
+    itself, so batches are sent as individual requests."""
+
+    name = "Ollama"
+    max_batch_size = 1
+
+    def __init__(self, model: str = DEFAULT_OLLAMA_MODEL, host: Optional[str] = None,
+                 keep_alive: str = "30m", cpu_only: bool = True):
+        import ollama
+
+        self.model = model
+        self.model_name = model
+        self.keep_alive = keep_alive
+        self.cpu_only = cpu_only
+        self.client = ollama.Client(host=host) if host else ollama.Client()
+        self.preload()
+
+    def _options(self, **options) -> Dict:
+        if self.cpu_only:
+            # Load and run the model without offloading layers to a GPU
+            options["num_gpu"] = 0
+        return options
+
+    def preload(self) -> None:
+        """Load the model into memory (an empty prompt only loads it)."""
+        # Same options as generation, or Ollama would load the model twice
+        self.client.generate(model=self.model, prompt="", options=self._options(),
+                             keep_alive=self.keep_alive)
+
+    def keep_warm(self) -> None:
+        self.preload()
+
+    def generate_batch(self, prompts: List[Messages], max_tokens: int,
+                       temperature: float) -> List[Tuple[str, int]]:
+        options = self._options(num_predict=max_tokens, temperature=temperature)
+        results = []
+        for messages in prompts:
+            response = self.client.chat(model=self.model, messages=messages,
+                                        options=options, keep_alive=self.keep_alive)
+            results.append((response["message"]["content"], response.get("eval_count", 0)))
+        return results
+
+
+class HuggingFaceBackend:
+    """transformers causal LM backend; a batch is one padded generate() call."""
+
+    name = "Hugging Face"
+
+    def __init__(self, model: str = DEFAULT_HF_MODEL, max_batch_size: int = 8,
+                 num_threads: Optional[int] = None):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.model_name = model
+        self.max_batch_size = max_batch_size
+        self._torch = torch
+        torch.set_num_threads(num_threads or os.cpu_count() or 1)
+
+        # Preload on CPU; left padding keeps generated tokens aligned in a batch
+        self.tokenizer = AutoTokenizer.from_pretrained(model, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model, torch_dtype=torch.float32)
+        self.model.to("cpu").eval()
+
+    def keep_warm(self) -> None:
+        # Weights stay resident in process memory; nothing to refresh
+        pass
+
+    def _prompt(self, messages: Messages) -> str:
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return "\n\n".join(f"{m['role']}: {m['content']}" for m in messages) + "\n\nassistant:"
+
+    def generate_batch(self, prompts: List[Messages], max_tokens: int,
+                       temperature: float) -> List[Tuple[str, int]]:
+        texts = [self._prompt(messages) for messages in prompts]
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True)
+        sampling = {"do_sample": True, "temperature": temperature} if temperature else {"do_sample": False}
+        with self._torch.inference_mode():
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **sampling
+            )
+        generated = output[:, inputs["input_ids"].shape[1]:]
+        results = []
+        for row in generated:
+            tokens = int((row != self.tokenizer.pad_token_id).sum())
+            results.append((self.tokenizer.decode(row, skip_special_tokens=True), tokens))
+        return results
+
+
+@dataclass
+class _Request:
+    messages: Messages
+    max_tokens: int
+    temperature: float
+    future: Future
+
+
+class LocalInferenceQueue:
+    """Single worker thread that batches concurrent prompts for a backend.
+
+    Requests are grouped by (max_tokens, temperature) so one batch shares its
+    generation settings. A request whose caller was cancelled while it was
+    queued is dropped before it reaches the backend.
+    """
+
+    def __init__(self, backend, batch_window: float = 0.05, keep_alive_interval: float = 300.0):
+        self.backend = backend
+        # Backend and model, e.g. "Ollama:llama3"; part of the key runs are coalesced and cached on
+        self.name = f"{getattr(backend, 'name', 'Local')}:{getattr(backend, 'model_name', '')}"
+        self.batch_window = batch_window
+        self.keep_alive_interval = keep_alive_interval
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.generated_tokens = 0
+        self.generation_time = 0.0
+        self._last_used = time.monotonic()
+        threading.Thread(target=self._worker, name="local-inference", daemon=True).start()
+
+    async def submit(self, messages: Messages, max_tokens: int = 1000, temperature: float = 0.7) -> str:
+        """Queue a prompt and wait for its completion."""
+        future: Future = Future()
+        self._queue.put(_Request(messages, max_tokens, temperature, future))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "generated_tokens": self.generated_tokens,
+                "tokens_per_sec": self.generated_tokens / self.generation_time if self.generation_time else 0.0,
+            }
+
+    def _collect(self, first: _Request, pending: List[_Request]) -> List[_Request]:
+        """Gather requests compatible with ``first``: deferred ones, then new arrivals
+        within the window. Incompatible arrivals are added to ``pending``."""
+        settings = (first.max_tokens, first.temperature)
+        batch = [first]
+        for request in list(pending):
+            if len(batch) >= self.backend.max_batch_size:
+                return batch
+            if (request.max_tokens, request.temperature) == settings:
+                pending.remove(request)
+                batch.append(request)
+
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.backend.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if (request.max_tokens, request.temperature) == settings:
+                batch.append(request)
+            else:
+                pending.append(request)
+        return batch
+
+    def _worker(self) -> None:
+        pending: List[_Request] = []
+        while True:
+            if pending:
+                first = pending.pop(0)
+            else:
+                try:
+                    first = self._queue.get(timeout=self.keep_alive_interval)
+                except queue.Empty:
+                    self._keep_warm()
+                    continue
+
+            batch = self._collect(first, pending)
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # Never let one batch stop the worker; its callers get the error
+                for request in batch:
+                    self._complete(request, error=e)
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        # Skip requests whose callers gave up while they were queued
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            results = self.backend.generate_batch(
+                [request.messages for request in batch], batch[0].max_tokens, batch[0].temperature
+            )
+        except Exception as e:
+            for request in batch:
+                self._complete(request, error=e)
+            return
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.generated_tokens += sum(tokens for _, tokens in results)
+            self.generation_time += elapsed
+        self._last_used = time.monotonic()
+
+        for index, request in enumerate(batch):
+            try:
+                text, _ = results[index]
+            except Exception:
+                self._complete(request, error=RuntimeError(
+                    f"{getattr(self.backend, 'name', 'Local')} backend returned no result for this prompt"))
+            else:
+                self._complete(request, text)
+
+    @staticmethod
+    def _complete(request: _Request, text: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+        """Resolve one request; a request already resolved or cancelled is left alone."""
+        if request.future.done():
+            return
+        try:
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(text)
+        except Exception as e:
+            print(f"Warning: Could not complete local inference request: {e}")
+
+    def _keep_warm(self) -> None:
+        if time.monotonic() - self._last_used < self.keep_alive_interval:
+            return
+        try:
+            self.backend.keep_warm()
+        except Exception as e:
+            print(f"Warning: Could not keep local model warm: {e}")
+        self._last_used = time.monotonic()
+
+
+def create_backend(kind: str, model: Optional[str] = None, **kwargs):
+    """Create a local backend by name ("Ollama" or "Hugging Face")."""
+    if kind == "Ollama":
+        return OllamaBackend(model or DEFAULT_OLLAMA_MODEL, **kwargs)
+    if kind == "Hugging Face":
+        return HuggingFaceBackend(model or DEFAULT_HF_MODEL, **kwargs)
+    raise ValueError(f"Unknown local backend: {kind}")
@@ -0,0 +1,145 @@
+"""
+Progress estimation for Firecrawl deep research jobs.
+
+Firecrawl reports activities (search, extract, analyze, synthesis, ...) through
+the ``on_activity`` callback. Instead of mapping each activity type to a fixed
+percentage, ``ResearchProgress`` combines the depth reached, the URLs processed
+versus ``max_urls`` and the elapsed time versus ``time_limit`` into a single
+completion estimate and an ETA.
+
+Activities are kept in a bounded ring buffer and the UI is only refreshed at a
+fixed rate, so the cost of rendering stays flat no matter how many events a
+long job produces. Rendering is driven by a timer rather than by events
+(``should_render`` is polled), so the last activities of a burst are shown
+even when no further event arrives, and the elapsed time and ETA keep
+ticking through long stretches without events. ``record`` may be called from the thread
+running the Firecrawl job while another thread renders.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# Share of the work estimate contributed by depth vs. URLs processed
+DEPTH_WEIGHT = 0.5
+URL_WEIGHT = 0.5
+
+# Activity types that indicate a single URL was processed
+URL_ACTIVITY_TYPES = ("extract", "scrape", "read")
+
+# Never report 100% until Firecrawl says the job is complete
+MAX_RUNNING_FRACTION = 0.99
+
+
+class ResearchProgress:
+    """Tracks Firecrawl activities and estimates completion and ETA."""
+
+    def __init__(self, max_depth: int, time_limit: int, max_urls: int,
+                 buffer_size: int = 20, refresh_interval: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_depth = max(1, max_depth)
+        self.time_limit = max(1, time_limit)
+        self.max_urls = max(1, max_urls)
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._start = clock()
+        self._last_render = None
+        self._rendered_second = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.events: deque = deque(maxlen=buffer_size)
+        self.total_events = 0
+        self.current_depth = 0
+        self.urls_processed = 0
+        self._seen_urls = set()
+        self.complete = False
+
+    def record(self, activity: Dict[str, Any]) -> None:
+        """Update the progress model with a single Firecrawl activity."""
+        activity_type = str(activity.get('type', 'info')).lower()
+        message = activity.get('message', 'Processing...')
+
+        depth = activity.get('depth')
+        if isinstance(depth, (int, float)):
+            self.current_depth = max(self.current_depth, int(depth))
+
+        url = activity.get('url')
+        if url:
+            if url not in self._seen_urls:
+                self._seen_urls.add(url)
+                self.urls_processed += 1
+        elif any(kind in activity_type for kind in URL_ACTIVITY_TYPES):
+            self.urls_processed += 1
+
+        if 'complete' in activity_type:
+            self.complete = True
+
+        with self._lock:
+            self.total_events += 1
+            self.events.append(f"[{activity_type.upper()}] {message}")
+            self._dirty = True
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self._start
+
+    def fraction(self) -> float:
+        """Estimated completion between 0 and 1."""
+        if self.complete:
+            return 1.0
+
+        depth_fraction = min(self.current_depth / self.max_depth, 1.0)
+        url_fraction = min(self.urls_processed / self.max_urls, 1.0)
+        work_fraction = DEPTH_WEIGHT * depth_fraction + URL_WEIGHT * url_fraction
+
+        # Firecrawl stops at whichever limit is hit first
+        time_fraction = min(self.elapsed / self.time_limit, 1.0)
+        return min(max(work_fraction, time_fraction), MAX_RUNNING_FRACTION)
+
+    def eta(self) -> Optional[float]:
+        """Estimated seconds remaining, or None before any work is observed."""
+        if self.complete:
+            return 0.0
+
+        fraction = self.fraction()
+        elapsed = self.elapsed
+        remaining_time = max(self.time_limit - elapsed, 0.0)
+        if fraction <= 0 or elapsed <= 0:
+            return remaining_time
+
+        projected = elapsed / fraction * (1 - fraction)
+        return min(projected, remaining_time)
+
+    def should_render(self) -> bool:
+        """Return True if there is unrendered state, at most once per ``refresh_interval``.
+
+        Poll this on a timer: state recorded inside the throttle window is
+        reported by the first call after the window, without a new event.
+        A new elapsed second also counts as unrendered state, since the
+        status line shows elapsed time and ETA in whole seconds.
+        """
+        now = self._clock()
+        second = int(now - self._start)
+        with self._lock:
+            if not self._dirty and second == self._rendered_second:
+                return False
+            if self._last_render is not None and now - self._last_render < self.refresh_interval:
+                return False
+            self._last_render = now
+            self._rendered_second = second
+            self._dirty = False
+            return True
+
+    def status_line(self) -> str:
+        """Short human-readable summary of the current estimate."""
+        eta = self.eta()
+        eta_text = f"~{eta:.0f}s left" if eta is not None else "estimating..."
+        return (f"Depth {self.current_depth}/{self.max_depth} · "
+                f"Sources {min(self.urls_processed, self.max_urls)}/{self.max_urls} · "
+                f"{self.elapsed:.0f}s elapsed · {eta_text}")
+
+    def recent(self) -> List[str]:
+        """Most recent activity messages, oldest first."""
+        with self._lock:
+            return list(self.events)
@@ -0,0 +1,122 @@
+"""
+Prompt assembly for the research agents.
+
+Providers cache prompts by prefix, so everything that varies per run is kept
+out of the system prompt. Each template's instructions are a fixed string,
+built once and memoized, and shared by every session that uses the
+template. The run parameters (``max_depth``, ``time_limit``, ``max_urls``)
+are appended to the end of the user message by ``research_input``, after
+the cacheable prefix.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+BASE_INSTRUCTIONS = """You are a research assistant that can perform deep web research on any topic.
+
+    When given a research topic or question:
+    1. Use the deep_research tool to gather comprehensive information
+       - Always use the max_depth, time_limit and max_urls given under
+         RUN PARAMETERS at the end of the request
+    2. The tool will search the web, analyze multiple sources, and provide a synthesis
+    3. Review the research results and organize them into a well-structured report
+    4. Include proper citations for all sources
+    5. Highlight key findings and insights
+    """
+
+TEMPLATE_INSTRUCTIONS = {
+    "Academic Research": """
+    6. Focus on academic rigor and scholarly sources
+    7. Include methodology, findings, and implications
+    8. Use formal academic language and structure
+    9. Provide comprehensive literature review
+        """,
+    "Market Analysis": """
+    6. Focus on market trends, competitors, and opportunities
+    7. Include market size, growth potential, and key players
+    8. Provide actionable business insights
+    9. Include SWOT analysis and recommendations
+        """,
+    "Technical Deep Dive": """
+    6. Focus on technical specifications and implementation details
+    7. Include code examples, architecture diagrams, and technical comparisons
+    8. Provide practical implementation guidance
+    9. Include performance metrics and benchmarks
+        """,
+    "News Summary": """
+    6. Focus on recent developments and breaking news
+    7. Include timeline of events and key stakeholders
+    8. Provide context and background information
+    9. Include expert opinions and public reactions
+        """,
+    "Custom": """
+    6. Adapt the research approach based on the specific topic
+    7. Use appropriate sources and methodology for the subject
+    8. Provide comprehensive analysis tailored to the query
+    9. Include relevant examples and case studies
+        """
+}
+
+ELABORATION_INSTRUCTIONS = """You are an expert content enhancer specializing in research elaboration.
+
+    When given a research report:
+    1. Analyze the structure and content of the report
+    2. Enhance the report by:
+       - Adding more detailed explanations of complex concepts
+       - Including relevant examples, case studies, and real-world applications
+       - Expanding on key points with additional context and nuance
+       - Adding visual elements descriptions (charts, diagrams, infographics)
+       - Incorporating latest trends and future predictions
+       - Suggesting practical implications for different stakeholders
+    3. Maintain academic rigor and factual accuracy
+    4. Preserve the original structure while making it more comprehensive
+    5. Ensure all additions are relevant and valuable to the topic
+    """
+
+
+@lru_cache(maxsize=None)
+def research_instructions(template: str) -> str:
+    """Stable system prompt for ``template``; identical for every run and session."""
+    return BASE_INSTRUCTIONS + TEMPLATE_INSTRUCTIONS.get(template, TEMPLATE_INSTRUCTIONS["Custom"])
+
+
+def research_input(topic: str, params: Dict[str, Any], analysis: Optional[str] = None,
+                   ranked_sources: Optional[str] = None) -> str:
+    """User message for a research run, with the per-run parameters last.
+
+    ``analysis`` and ``ranked_sources`` are the results of the Firecrawl
+    stage, when it ran before the agent.
+    """
+    research = ""
+    if analysis or ranked_sources:
+        research = (
+            "WEB RESEARCH ALREADY GATHERED (build on it and cite these sources):\n"
+            f"{analysis or ''}\n\n"
+            "TOP SOURCES (ranked by relevance, credibility and recency):\n"
+            f"{ranked_sources or 'Not available'}\n\n"
+        )
+    return (
+        f"{topic}\n\n"
+        f"{research}"
+        "RUN PARAMETERS (use these for the deep_research tool):\n"
+        f"- max_depth: {params['max_depth']} (for appropriate depth)\n"
+        f"- time_limit: {params['time_limit']} (in seconds)\n"
+        f"- max_urls: {params['max_urls']} (sufficient sources)"
+    )
+
+
+def elaboration_input(topic: str, template: str, report: str, ranked_sources: Optional[str] = None) -> str:
+    """User message asking the elaboration agent to enhance ``report``."""
+    return f"""
+        RESEARCH TOPIC: {topic}
+        TEMPLATE: {template}
+        
+        INITIAL RESEARCH REPORT:
+        {report}
+        
+        TOP SOURCES (ranked by relevance, credibility and recency):
+        {ranked_sources or "Not available"}
+        
+        Please enhance this research report with additional information, examples, case studies, 
+        and deeper insights while maintaining its academic rigor and factual accuracy.
+        """
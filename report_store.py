@@ -0,0 +1,219 @@
+"""
+Memory-bounded storage for report bodies.
+
+Session state used to hold every report as a plain string, once in the
+history and again in the current-research view and the export widgets.
+``ReportStore`` keeps each body once, compressed (zstd when the
+``zstandard`` package is installed, zlib otherwise), and addressed by a
+content hash. History entries only keep the id next to their metadata.
+When a session's compressed bodies exceed its budget, the least recently
+used ones are spilled to disk and loaded back on access.
+
+``python report_store.py`` simulates 500 sessions and compares RSS with
+plain-string history.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from tuning import DATA_DIR
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SPILL_DIR = os.path.join(DATA_DIR, "reports")
+# Compressed bytes kept in memory per session before bodies spill to disk
+SESSION_BUDGET = int(os.environ.get("RESEARCH_SESSION_BUDGET_KB", "256")) * 1024
+# Spilled bodies older than this are removed by ``prune_spilled``
+SPILL_TTL = 7 * 24 * 60 * 60
+
+_ZSTD, _ZLIB = b"S", b"Z"
+
+
+def compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+    return _ZLIB + zlib.compress(data, 6)
+
+
+def decompress(blob: bytes) -> bytes:
+    codec, payload = blob[:1], blob[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise ValueError("Report was compressed with zstd, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+class ReportStore:
+    """Compressed, content-addressed report bodies with an LRU memory budget.
+
+    Safe to share between threads: lazily generated downloads read bodies
+    outside the script thread while a rerun may be storing new ones.
+    """
+
+    def __init__(self, budget: int = SESSION_BUDGET, spill_dir: str = SPILL_DIR):
+        self.budget = budget
+        self.spill_dir = spill_dir
+        # Report id -> compressed body, least recently used first
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.raw_bytes = 0
+        self.spills = 0
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> str:
+        """Store ``text`` and return its id; storing the same text again is free."""
+        data = text.encode("utf-8")
+        report_id = hashlib.sha256(data).hexdigest()[:20]
+        with self._lock:
+            if report_id in self._bodies:
+                self._bodies.move_to_end(report_id)
+                return report_id
+            self._remember(report_id, compress(data))
+            self.raw_bytes += len(data)
+        return report_id
+
+    def put_json(self, value: Any) -> str:
+        return self.put(json.dumps(value, default=str))
+
+    def get(self, report_id: Optional[str]) -> Optional[str]:
+        """The stored text, or None if the id is unknown (e.g. spilled and pruned)."""
+        if not report_id:
+            return None
+        with self._lock:
+            blob = self._bodies.get(report_id)
+            if blob is not None:
+                self._bodies.move_to_end(report_id)
+            else:
+                path = self._path(report_id)
+                if not os.path.exists(path):
+                    return None
+                with open(path, "rb") as f:
+                    blob = f.read()
+                self.loads += 1
+                self._remember(report_id, blob)
+        return decompress(blob).decode("utf-8")
+
+    def get_json(self, report_id: Optional[str], default: Any = None) -> Any:
+        text = self.get(report_id)
+        return json.loads(text) if text is not None else default
+
+    def _remember(self, report_id: str, blob: bytes) -> None:
+        # Called with the lock held
+        self._bodies[report_id] = blob
+        self.memory_bytes += len(blob)
+        # Spill least recently used bodies, but always keep the one just used
+        while self.memory_bytes > self.budget and len(self._bodies) > 1:
+            old_id, old_blob = self._bodies.popitem(last=False)
+            self.memory_bytes -= len(old_blob)
+            self._spill(old_id, old_blob)
+
+    def _path(self, report_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{report_id}.bin")
+
+    def _spill(self, report_id: str, blob: bytes) -> None:
+        path = self._path(report_id)
+        if os.path.exists(path):
+            # Content-addressed: another session already spilled the same body
+            os.utime(path)
+        else:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        self.spills += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_memory": len(self._bodies),
+                "memory_bytes": self.memory_bytes,
+                "raw_bytes": self.raw_bytes,
+                "budget": self.budget,
+                "spills": self.spills,
+                "loads": self.loads,
+                "codec": "zstd" if zstandard is not None else "zlib",
+            }
+
+
+def prune_spilled(spill_dir: str = SPILL_DIR, max_age: float = SPILL_TTL) -> int:
+    """Delete spilled bodies not touched for ``max_age`` seconds; returns how many."""
+    if not os.path.isdir(spill_dir):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(spill_dir):
+        path = os.path.join(spill_dir, name)
+        if name.endswith(".bin") and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _simulate(mode: str, sessions: int, reports_per_session: int) -> None:
+    """Build ``sessions`` session histories in this process and print RSS in MB."""
+    import random
+    import tempfile
+
+    from bench_utils import rss_mb
+
+    random.seed(0)
+    vocabulary = [
+        "".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(3, 10))) for _ in range(3000)
+    ]
+
+    def report() -> str:
+        paragraphs = (" ".join(random.choices(vocabulary, k=120)) + "." for _ in range(40))
+        return "# Research report\n\n" + "\n\n".join(paragraphs)
+
+    baseline = rss_mb()
+    with tempfile.TemporaryDirectory(prefix="report-store-") as spill_dir:
+        states = []
+        for _ in range(sessions):
+            store = ReportStore(spill_dir=spill_dir) if mode == "store" else None
+            history = [
+                {"topic": "topic", "report": report()} if store is None
+                else {"topic": "topic", "report_id": store.put(report())}
+                for _ in range(reports_per_session)
+            ]
+            states.append({"history": history, "current": history[-1], "store": store})
+        print(json.dumps({"mode": mode, "rss_mb": rss_mb() - baseline}))
+
+
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="Simulate session memory with and without the report store")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--reports", type=int, default=10, help="History entries per session")
+    parser.add_argument("--mode", choices=["plain", "store"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        _simulate(args.mode, args.sessions, args.reports)
+        sys.exit()
+
+    # Each mode runs in a fresh interpreter so their allocations do not mix
+    results = {}
+    for mode in ("plain", "store"):
+        out = subprocess.run([sys.executable, __file__, "--mode", mode, "--sessions", str(args.sessions),
+                              "--reports", str(args.reports)], capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])["rss_mb"]
+    print(f"{args.sessions} sessions x {args.reports} reports")
+    print(f"  plain strings  {results['plain']:8.1f} MB")
+    print(f"  report store   {results['store']:8.1f} MB "
+          f"({results['store'] / results['plain'] * 100:.0f}% of plain, "
+          f"codec {'zstd' if zstandard is not None else 'zlib'})")
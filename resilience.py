@@ -0,0 +1,303 @@
+"""
+Per-endpoint circuit breakers, adaptive timeouts and background health checks.
+
+Every provider endpoint (provider + model) gets an ``Endpoint`` that tracks
+recent call latencies. Its timeout follows the observed tail latency
+(``multiplier`` x p99, clamped to a floor and ceiling) instead of a fixed
+value, and its circuit breaker opens after consecutive failures so that
+further calls fail fast until a trial call succeeds again. Only provider
+and network errors count; a call that times out adds the timeout as a
+(censored) latency sample, so repeated timeouts back the timeout off.
+
+``HealthMonitor`` checks a provider in a background thread and caches the
+result, replacing a synchronous test request before every run.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+# Base classes of errors raised by provider clients, looked up only once their module is loaded
+_PROVIDER_ERRORS = (("openai", "APIError"), ("requests", "RequestException"), ("httpx", "HTTPError"))
+_TIMEOUT_ERRORS = (("openai", "APITimeoutError"), ("requests", "Timeout"), ("httpx", "TimeoutException"))
+
+
+def _loaded_types(names: Tuple[Tuple[str, str], ...]) -> Tuple[type, ...]:
+    modules = ((sys.modules.get(module), name) for module, name in names)
+    return tuple(getattr(module, name) for module, name in modules if hasattr(module, name))
+
+
+def is_provider_error(error: BaseException) -> bool:
+    """Whether ``error`` came from the provider or the network, not from our own code."""
+    return isinstance(error, (TimeoutError, ConnectionError) + _loaded_types(_PROVIDER_ERRORS))
+
+
+def is_timeout(error: BaseException) -> bool:
+    return isinstance(error, (TimeoutError,) + _loaded_types(_TIMEOUT_ERRORS))
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Whether a provider error says something about the endpoint's health.
+
+    Client errors (bad request, auth) are the caller's problem and do not
+    trip the breaker; timeouts, rate limits, server and network errors do.
+    """
+    code = _status_code(error)
+    return code is None or code >= 500 or code in (408, 429)
+
+
+class Endpoint:
+    """Latency tracking, adaptive timeout and circuit breaker for one endpoint."""
+
+    def __init__(self, name: str, initial_timeout: float = 60.0, min_timeout: float = 15.0,
+                 max_timeout: float = 180.0, percentile: float = 0.99, multiplier: float = 2.0,
+                 min_samples: int = 10, window: int = 200, failure_threshold: int = 5,
+                 recovery_time: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def latency_percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(int(p * len(samples)), len(samples) - 1)]
+
+    def timeout(self) -> float:
+        """Timeout for the next call, derived from the observed tail latency."""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_timeout
+        tail = self.latency_percentile(self.percentile)
+        return min(max(tail * self.multiplier, self.min_timeout), self.max_timeout)
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.recovery_time - self.clock()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"{self.name} is failing; skipping calls for another {remaining:.0f}s"
+                    )
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                # Let a single trial call through to probe recovery
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} is recovering; waiting for the trial call")
+                self._trial_in_flight = True
+            self.calls += 1
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self, latency: Optional[float] = None) -> None:
+        """Count a failed call; ``latency`` is a lower bound on its latency (e.g. a timeout)."""
+        with self._lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+    def record_ignored(self) -> None:
+        """End a call whose outcome says nothing about the endpoint (e.g. our own error)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def guard(self) -> "_Guard":
+        """Context manager around one call: checks the breaker and records the outcome."""
+        return _Guard(self)
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.latency_percentile(0.5)
+        p99 = self.latency_percentile(0.99)
+        return {
+            "endpoint": self.name,
+            "state": self.state,
+            "timeout_s": round(self.timeout(), 1),
+            "p50_s": round(p50, 2) if p50 is not None else None,
+            "p99_s": round(p99, 2) if p99 is not None else None,
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class _Guard:
+    """One guarded call; ``timeout`` is the timeout to pass to the client."""
+
+    def __init__(self, endpoint: Endpoint):
+        self.endpoint = endpoint
+        self.start = 0.0
+        self.timeout = 0.0
+
+    def __enter__(self) -> "_Guard":
+        self.endpoint.before_call()
+        self.timeout = self.endpoint.timeout()
+        self.start = self.endpoint.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        latency = self.endpoint.clock() - self.start
+        if exc is None:
+            self.endpoint.record_success(latency)
+        elif not is_provider_error(exc):
+            # Our own errors, UI callbacks and Streamlit reruns/stops say nothing about the endpoint
+            self.endpoint.record_ignored()
+        elif is_endpoint_failure(exc):
+            self.endpoint.record_failure(max(latency, self.timeout) if is_timeout(exc) else None)
+        else:
+            # The endpoint answered; only the request was bad
+            self.endpoint.record_success(latency)
+        return False
+
+
+_endpoints: Dict[str, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(name: str, **options: Any) -> Endpoint:
+    """Process-wide ``Endpoint`` for ``name``, created on first use."""
+    with _endpoints_lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            endpoint = _endpoints[name] = Endpoint(name, **options)
+        return endpoint
+
+
+def endpoint_stats() -> list:
+    with _endpoints_lock:
+        endpoints = list(_endpoints.values())
+    return [endpoint.stats() for endpoint in endpoints]
+
+
+@dataclass
+class HealthStatus:
+    """Last known health of a provider; ``healthy`` is None until the first check."""
+    healthy: Optional[bool] = None
+    message: str = "Not checked yet"
+    checked_at: float = 0.0
+    latency: float = 0.0
+
+
+class HealthMonitor:
+    """Checks a provider periodically in one daemon thread and caches the results.
+
+    ``check(key)`` is run for every watched key (e.g. each API key in use),
+    so one monitor and one thread serve all sessions of a provider. Beyond
+    ``max_keys``, the least recently watched keys are no longer checked.
+    """
+
+    def __init__(self, name: str, check: Callable[[str], Tuple[bool, str]], interval: float = 60.0,
+                 max_keys: int = 32):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._statuses: "OrderedDict[str, HealthStatus]" = OrderedDict()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "HealthMonitor":
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"health-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def watch(self, key: str) -> "HealthMonitor":
+        """Check ``key`` in the background from now on; checked right away if new."""
+        with self._lock:
+            new = key not in self._statuses
+            if new:
+                self._statuses[key] = HealthStatus()
+                while len(self._statuses) > self.max_keys:
+                    self._statuses.popitem(last=False)
+            else:
+                self._statuses.move_to_end(key)
+        if new:
+            self._wake.set()
+        return self.start()
+
+    def refresh(self, key: str) -> HealthStatus:
+        start = time.monotonic()
+        try:
+            healthy, message = self.check(key)
+        except Exception as e:
+            healthy, message = False, f"Health check failed: {e}"
+        status = HealthStatus(healthy, message, time.time(), time.monotonic() - start)
+        with self._lock:
+            # A key dropped meanwhile stays dropped
+            if key in self._statuses:
+                self._statuses[key] = status
+        return status
+
+    def status(self, key: str) -> HealthStatus:
+        with self._lock:
+            return self._statuses.get(key) or HealthStatus()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._lock:
+                due = [key for key, status in self._statuses.items()
+                       if time.time() - status.checked_at >= self.interval]
+            for key in due:
+                self.refresh(key)
+            with self._lock:
+                checked = [status.checked_at for status in self._statuses.values()]
+            wait = min(checked) + self.interval - time.time() if checked else self.interval
+            self._wake.wait(max(wait, 0.0))
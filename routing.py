@@ -0,0 +1,198 @@
+"""
+Policy-based model routing for the agents Runner.
+
+By default every agent runs on its own ``model`` (``gpt-4o-mini`` or its Groq
+mapping). ``ModelRouter`` can instead pick a model per agent, per research
+template and per estimated input size, using a cost/latency table for each
+provider. Every decision is recorded so the latency/cost tradeoff can be tuned
+per template.
+"""
+
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, List, Optional
+
+# Rough characters per token for English text
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class ModelProfile:
+    """Cost and latency figures for a single model."""
+    name: str
+    input_cost: float       # USD per 1M input tokens
+    output_cost: float      # USD per 1M output tokens
+    latency: float          # seconds per 1k output tokens
+    quality: float          # relative quality score between 0 and 1
+    context_window: int
+    supports_structured_output: bool = True     # reliable for agents with an output_type
+
+
+# Provider -> model table. Override with ModelRouter(models=...) or from_file().
+DEFAULT_MODELS: Dict[str, List[ModelProfile]] = {
+    "OpenAI": [
+        ModelProfile("gpt-4o-mini", 0.15, 0.60, 12.0, 0.75, 128000),
+        ModelProfile("gpt-4o", 2.50, 10.00, 18.0, 0.90, 128000),
+        ModelProfile("gpt-3.5-turbo", 0.50, 1.50, 10.0, 0.60, 16385, supports_structured_output=False),
+    ],
+    "Groq": [
+        ModelProfile("llama3-8b-8192", 0.05, 0.08, 1.2, 0.55, 8192),
+        ModelProfile("llama3-70b-8192", 0.59, 0.79, 3.5, 0.75, 8192),
+        ModelProfile("mixtral-8x7b-32768", 0.24, 0.24, 2.0, 0.60, 32768),
+    ],
+}
+
+
+@dataclass
+class RoutingRule:
+    """Chooses an objective for matching agent/template/input-size combinations.
+
+    ``objective`` is one of ``"cost"``, ``"latency"`` or ``"quality"``. A rule
+    matches when agent and template match (``"*"`` matches anything) and the
+    estimated input is at least ``min_input_tokens``.
+    """
+    objective: str
+    agent: str = "*"
+    template: str = "*"
+    min_input_tokens: int = 0
+    min_quality: float = 0.0
+
+    def matches(self, agent: str, template: Optional[str], input_tokens: int) -> bool:
+        return (self.agent in ("*", agent)
+                and self.template in ("*", template)
+                and input_tokens >= self.min_input_tokens)
+
+
+DEFAULT_RULES: List[RoutingRule] = [
+    # Short news digests favour speed over depth
+    RoutingRule(objective="latency", template="News Summary"),
+    # Long technical reports need the strongest model with a large context
+    RoutingRule(objective="quality", agent="elaboration_agent", template="Technical Deep Dive"),
+    RoutingRule(objective="quality", template="Technical Deep Dive", min_input_tokens=6000),
+]
+
+
+@dataclass
+class RoutingDecision:
+    """A single routing decision, kept for later tuning."""
+    agent: str
+    template: Optional[str]
+    provider: str
+    input_tokens: int
+    default_model: str
+    model: str
+    reason: str
+    estimated_cost: float
+    estimated_latency: float
+    timestamp: float = field(default_factory=time.time)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate that avoids loading a tokenizer."""
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+class ModelRouter:
+    """Routes agent runs to models from per-provider cost/latency tables."""
+
+    def __init__(self, rules: Optional[List[RoutingRule]] = None,
+                 models: Optional[Dict[str, List[ModelProfile]]] = None,
+                 max_decisions: int = 500):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.models = DEFAULT_MODELS if models is None else models
+        self.decisions: deque = deque(maxlen=max_decisions)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ModelRouter":
+        """Load rules and model tables from a JSON file.
+
+        The file has the shape ``{"rules": [RoutingRule fields...],
+        "models": {"OpenAI": [ModelProfile fields...], ...}}``; missing
+        sections fall back to the defaults.
+        """
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        rules = [RoutingRule(**rule) for rule in config["rules"]] if "rules" in config else None
+        models = None
+        if "models" in config:
+            models = {
+                provider: [ModelProfile(**profile) for profile in profiles]
+                for provider, profiles in config["models"].items()
+            }
+        return cls(rules=rules, models=models)
+
+    def route(self, agent_name: str, default_model: str, provider: str, text: str,
+              template: Optional[str] = None, max_output_tokens: int = 1000,
+              structured_output: bool = False) -> RoutingDecision:
+        """Pick a model for a run and record the decision.
+
+        With ``structured_output``, only models that support a JSON schema
+        response format are considered (when the provider has any).
+        """
+        input_tokens = estimate_tokens(text)
+        needed_context = input_tokens + max_output_tokens
+        profiles = self.models.get(provider, [])
+        if structured_output:
+            profiles = [p for p in profiles if p.supports_structured_output] or profiles
+        fitting = [p for p in profiles if p.context_window >= needed_context]
+
+        rule = next((r for r in self.rules if r.matches(agent_name, template, input_tokens)), None)
+        default = next((p for p in profiles if p.name == default_model), None)
+
+        if rule is not None and fitting:
+            candidates = [p for p in fitting if p.quality >= rule.min_quality] or fitting
+            chosen = min(candidates, key=lambda p: self._score(p, rule.objective, input_tokens, max_output_tokens))
+            reason = f"rule:{rule.objective}"
+        elif default is not None and default in fitting:
+            chosen = default
+            reason = "default"
+        elif fitting:
+            # Default model cannot hold the input, take the cheapest that can
+            chosen = min(fitting, key=lambda p: self._cost(p, input_tokens, max_output_tokens))
+            reason = "context"
+        else:
+            chosen = max(profiles, key=lambda p: p.context_window) if profiles else None
+            reason = "largest-context" if chosen else "unrouted"
+
+        decision = RoutingDecision(
+            agent=agent_name,
+            template=template,
+            provider=provider,
+            input_tokens=input_tokens,
+            default_model=default_model,
+            model=chosen.name if chosen else default_model,
+            reason=reason,
+            estimated_cost=self._cost(chosen, input_tokens, max_output_tokens) if chosen else 0.0,
+            estimated_latency=chosen.latency * max_output_tokens / 1000 if chosen else 0.0,
+        )
+        self.decisions.append(decision)
+        return decision
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregate recorded decisions per template for tuning."""
+        summary: Dict[str, Dict[str, Any]] = {}
+        for decision in self.decisions:
+            entry = summary.setdefault(decision.template or "-", {
+                "runs": 0, "models": {}, "estimated_cost": 0.0, "estimated_latency": 0.0
+            })
+            entry["runs"] += 1
+            entry["models"][decision.model] = entry["models"].get(decision.model, 0) + 1
+            entry["estimated_cost"] += decision.estimated_cost
+            entry["estimated_latency"] += decision.estimated_latency
+        return summary
+
+    def export_decisions(self) -> List[Dict[str, Any]]:
+        return [asdict(decision) for decision in self.decisions]
+
+    @staticmethod
+    def _cost(profile: ModelProfile, input_tokens: int, output_tokens: int) -> float:
+        return (profile.input_cost * input_tokens + profile.output_cost * output_tokens) / 1_000_000
+
+    def _score(self, profile: ModelProfile, objective: str, input_tokens: int, output_tokens: int) -> float:
+        if objective == "latency":
+            return profile.latency
+        if objective == "quality":
+            return -profile.quality
+        return self._cost(profile, input_tokens, output_tokens)
@@ -0,0 +1,238 @@
+"""
+Vectorized quality scoring for research sources.
+
+Sources are turned into columnar NumPy arrays once (domain ids, publication
+timestamps, hashed tokens) and every score is computed with array operations:
+
+- relevance:   overlap of each source's tokens with the topic tokens
+- credibility: prior from a local domain / TLD table
+- recency:     exponential decay with the source's age
+- diversity:   down-weights sources from over-represented domains
+
+The combined score ranks the sources that are fed into the prompts, and
+``quality_metrics`` summarizes the set (the ``assess_research_quality``
+metrics sketched in ``test.py``). ``python scoring.py`` benchmarks 10k+
+sources.
+"""
+
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from dedup import canonical_domain
+
+# Credibility priors for well-known domains (0 = unreliable, 1 = authoritative)
+DOMAIN_CREDIBILITY = {
+    "nature.com": 0.95, "science.org": 0.95, "nejm.org": 0.95, "thelancet.com": 0.95,
+    "arxiv.org": 0.8, "pubmed.ncbi.nlm.nih.gov": 0.9, "ncbi.nlm.nih.gov": 0.9,
+    "ieee.org": 0.9, "acm.org": 0.9, "springer.com": 0.85, "sciencedirect.com": 0.85,
+    "reuters.com": 0.85, "apnews.com": 0.85, "bbc.co.uk": 0.8, "bbc.com": 0.8,
+    "nytimes.com": 0.8, "ft.com": 0.8, "economist.com": 0.8, "wsj.com": 0.8, "bloomberg.com": 0.8,
+    "en.wikipedia.org": 0.7, "github.com": 0.65, "stackoverflow.com": 0.6,
+    "medium.com": 0.4, "substack.com": 0.4, "reddit.com": 0.3, "quora.com": 0.25,
+    "twitter.com": 0.25, "facebook.com": 0.2, "youtube.com": 0.35,
+}
+# Fallback priors by top-level domain suffix
+TLD_CREDIBILITY = {".gov": 0.9, ".edu": 0.85, ".int": 0.85, ".mil": 0.8, ".org": 0.6}
+DEFAULT_CREDIBILITY = 0.5
+
+# Age in days at which the recency score halves
+RECENCY_HALF_LIFE_DAYS = 365.0
+# Recency score for sources without a publication date
+UNKNOWN_RECENCY = 0.5
+
+WEIGHTS = {"relevance": 0.45, "credibility": 0.35, "recency": 0.2}
+
+DATE_KEYS = ("publishedDate", "published_date", "publishedTime", "date")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]{3,}")
+
+
+def _hash_tokens(text: str) -> List[int]:
+    return [zlib.crc32(token.encode()) for token in _TOKEN_RE.findall(text.lower())]
+
+
+def _parse_date(value: Any) -> float:
+    """Unix timestamp of an ISO date string, a date/datetime or an epoch number, or NaN."""
+    if not value or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        # Epoch seconds, or milliseconds as some sources report them
+        return float(value) / 1000 if value > 1e11 else float(value)
+    try:
+        if isinstance(value, datetime):
+            parsed = value
+        elif isinstance(value, date):
+            parsed = datetime(value.year, value.month, value.day)
+        else:
+            parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except (ValueError, OverflowError, OSError):
+        return np.nan
+
+
+def _netloc(url: Any) -> str:
+    try:
+        return urlsplit(str(url or "")).netloc
+    except ValueError:
+        # e.g. an invalid IPv6 host
+        return ""
+
+
+def domain_credibility(domain: str) -> float:
+    if domain in DOMAIN_CREDIBILITY:
+        return DOMAIN_CREDIBILITY[domain]
+    # Subdomains inherit the parent's prior, e.g. blog.nature.com
+    parts = domain.split(".")
+    for i in range(1, len(parts) - 1):
+        parent = ".".join(parts[i:])
+        if parent in DOMAIN_CREDIBILITY:
+            return DOMAIN_CREDIBILITY[parent]
+    for suffix, prior in TLD_CREDIBILITY.items():
+        if domain.endswith(suffix) or f"{suffix}." in domain:
+            return prior
+    return DEFAULT_CREDIBILITY
+
+
+@dataclass
+class SourceScores:
+    """Per-source score columns, aligned with the input list."""
+    domains: np.ndarray
+    domain_ids: np.ndarray
+    relevance: np.ndarray
+    credibility: np.ndarray
+    recency: np.ndarray
+    diversity: np.ndarray
+    score: np.ndarray
+
+    def ranking(self) -> np.ndarray:
+        """Indices of the sources from best to worst (stable for ties)."""
+        return np.argsort(-self.score, kind="stable")
+
+
+def score_sources(sources: List[Dict[str, Any]], topic: str, now: Optional[float] = None) -> SourceScores:
+    """Score all sources against ``topic`` with vectorized operations."""
+    n = len(sources)
+    now = time.time() if now is None else now
+
+    # Build the columns; this is the only per-source Python work
+    # Firecrawl fields may be missing, None or not strings
+    domain_names = [canonical_domain(_netloc(s.get("url"))) for s in sources]
+    token_lists = [_hash_tokens(f"{s.get('title') or ''} {s.get('description') or ''}") for s in sources]
+    dates = [next((s[key] for key in DATE_KEYS if s.get(key)), None) for s in sources]
+
+    domains, domain_ids = np.unique(np.array(domain_names, dtype=object), return_inverse=True)
+    domain_ids = domain_ids.reshape(-1)
+
+    # Relevance: share of topic tokens each source covers, via one isin over all tokens
+    topic_tokens = np.unique(np.array(_hash_tokens(topic), dtype=np.uint32))
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=n)
+    all_tokens = np.fromiter((t for tokens in token_lists for t in tokens), dtype=np.uint32, count=int(lengths.sum()))
+    owners = np.repeat(np.arange(n), lengths)
+    if topic_tokens.size and all_tokens.size:
+        # Count each topic token once per source
+        matched = np.isin(all_tokens, topic_tokens)
+        pairs = np.unique(np.stack([owners[matched], all_tokens[matched].astype(np.int64)]), axis=1)
+        overlap = np.bincount(pairs[0], minlength=n).astype(np.float64)
+        relevance = overlap / topic_tokens.size
+    else:
+        relevance = np.zeros(n)
+
+    # Credibility: look up each distinct domain once, then gather
+    domain_priors = np.fromiter((domain_credibility(d) for d in domains), dtype=np.float64, count=len(domains))
+    credibility = domain_priors[domain_ids] if n else np.zeros(0)
+
+    # Recency: exponential decay with age; unknown dates get a neutral score.
+    # Dates come as strings, numbers or date objects, so each distinct value is
+    # parsed once to a timestamp (NaN if unknown) before any array operation.
+    parsed: Dict[Tuple[type, str], float] = {}
+    for d in dates:
+        key = (type(d), str(d))
+        if key not in parsed:
+            parsed[key] = _parse_date(d)
+    timestamps = np.fromiter((parsed[(type(d), str(d))] for d in dates), dtype=np.float64, count=n)
+    age_days = np.clip((now - timestamps) / 86400.0, 0.0, None)
+    recency = np.where(np.isnan(timestamps), UNKNOWN_RECENCY, np.exp2(-age_days / RECENCY_HALF_LIFE_DAYS))
+
+    # Diversity: sources sharing a domain split its weight
+    domain_counts = np.bincount(domain_ids, minlength=len(domains)) if n else np.zeros(0, dtype=np.int64)
+    diversity = 1.0 / np.sqrt(domain_counts[domain_ids]) if n else np.zeros(0)
+
+    score = (WEIGHTS["relevance"] * relevance
+             + WEIGHTS["credibility"] * credibility
+             + WEIGHTS["recency"] * recency) * diversity
+
+    return SourceScores(domains[domain_ids] if n else np.zeros(0, dtype=object), domain_ids,
+                        relevance, credibility, recency, diversity, score)
+
+
+def rank_and_assess(sources: List[Dict[str, Any]], topic: str,
+                    limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Rank sources by score and summarize their quality in one scoring pass.
+
+    Returns copies of the sources, best first, each with a ``quality_score``.
+    """
+    scores = score_sources(sources, topic)
+    order = scores.ranking()[:limit]
+    ranked = [{**sources[i], "quality_score": round(float(scores.score[i]), 4)} for i in order]
+    return ranked, quality_metrics(scores)
+
+
+def rank_sources(sources: List[Dict[str, Any]], topic: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return copies of the sources sorted by score, each with a ``quality_score``."""
+    return rank_and_assess(sources, topic, limit)[0]
+
+
+def quality_metrics(scores: SourceScores) -> Dict[str, float]:
+    """Summary metrics for a set of scored sources."""
+    n = scores.score.size
+    if n == 0:
+        return {"sources": 0, "source_diversity": 0.0, "domain_entropy": 0.0,
+                "recency": 0.0, "credibility": 0.0, "relevance": 0.0}
+    counts = np.bincount(scores.domain_ids)
+    shares = counts[counts > 0] / n
+    return {
+        "sources": int(n),
+        "source_diversity": float(shares.size / n),
+        "domain_entropy": float((shares * np.log2(1 / shares)).sum()),
+        "recency": float(scores.recency.mean()),
+        "credibility": float(scores.credibility.mean()),
+        "relevance": float(scores.relevance.mean()),
+    }
+
+
+def format_ranked_sources(ranked: List[Dict[str, Any]], limit: int = 10) -> str:
+    """Numbered source list for prompts, best first."""
+    return "\n".join(
+        f"{i}. {s.get('title') or s.get('url') or ''} — {s.get('url') or ''} (quality {s.get('quality_score') or 0:.2f})"
+        for i, s in enumerate(ranked[:limit], 1)
+    )
+
+
+if __name__ == "__main__":
+    import random
+
+    words = [f"term{i}" for i in range(3000)] + ["quantum", "computing", "error", "correction"]
+    tlds = [".com", ".org", ".edu", ".gov", ".io"]
+    for n in (10_000, 50_000):
+        batch = [{
+            "url": f"https://www.site{random.randrange(n // 5)}{random.choice(tlds)}/article/{i}",
+            "title": " ".join(random.choices(words, k=8)),
+            "description": " ".join(random.choices(words, k=30)),
+            "publishedDate": f"20{random.randint(15, 25)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+        } for i in range(n)]
+
+        start = time.perf_counter()
+        result = score_sources(batch, "quantum computing error correction")
+        ranking = result.ranking()
+        elapsed = time.perf_counter() - start
+        print(f"{n:>6} sources scored and ranked in {elapsed * 1000:.0f} ms; "
+              f"metrics: {quality_metrics(result)}")
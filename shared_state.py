@@ -0,0 +1,431 @@
+"""
+Shared state for multi-worker deployments.
+
+By default every Streamlit process keeps its caches and history to itself.
+Setting ``RESEARCH_STORE_URL`` lets several app workers share:
+
+- the completion cache (identical agent runs are answered once),
+- the Firecrawl job queue (a job is claimed by one worker; the others wait
+  for its result instead of starting the same job),
+- research history.
+
+Backends:
+
+- ``sqlite:///abs/path/shared.db`` (or ``sqlite://`` for the default path):
+  single host, any number of worker processes
+- ``redis://host:6379/0`` / ``rediss://...``: any Redis-compatible server,
+  for workers on several hosts (requires the ``redis`` package)
+- ``memory://``: in-process fake with the same semantics, for tests
+
+Values are stored as JSON.
+"""
+
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tuning import DATA_DIR
+
+STORE_URL = os.environ.get("RESEARCH_STORE_URL", "")
+DEFAULT_SQLITE_PATH = os.path.join(DATA_DIR, "shared.db")
+KEY_PREFIX = "research:"
+
+# Identifies this process in job leases
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+class Store(abc.ABC):
+    """Minimal key-value and list interface the shared components rely on."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it does not exist; True if it was set."""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete_if(self, key: str, value: Any) -> bool:
+        """Delete ``key`` only if it still holds ``value``; True if it was deleted."""
+
+    @abc.abstractmethod
+    def refresh_if(self, key: str, value: Any, ttl: float) -> bool:
+        """Reset the expiry of ``key`` to ``ttl`` only if it still holds ``value``."""
+
+    @abc.abstractmethod
+    def append(self, key: str, value: Any, max_len: Optional[int] = None) -> None:
+        """Append to a list, keeping at most the last ``max_len`` items."""
+
+    @abc.abstractmethod
+    def items(self, key: str) -> List[Any]:
+        """All items of a list, oldest first."""
+
+
+class MemoryStore(Store):
+    """In-process store with expiry; a stand-in for the shared backends in tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, tuple] = {}
+        self._lists: Dict[str, List[str]] = {}
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._values[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+        return json.loads(entry[0]) if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = (_dumps(value), time.time() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._values[key] = (_dumps(value), time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+            self._lists.pop(key, None)
+
+    def delete_if(self, key, value):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or entry[0] != _dumps(value):
+                return False
+            del self._values[key]
+            return True
+
+    def refresh_if(self, key, value, ttl):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or entry[0] != _dumps(value):
+                return False
+            self._values[key] = (entry[0], time.time() + ttl)
+            return True
+
+    def append(self, key, value, max_len=None):
+        with self._lock:
+            items = self._lists.setdefault(key, [])
+            items.append(_dumps(value))
+            if max_len is not None and len(items) > max_len:
+                del items[:len(items) - max_len]
+
+    def items(self, key):
+        with self._lock:
+            return [json.loads(item) for item in self._lists.get(key, [])]
+
+
+class SQLiteStore(Store):
+    """Store in a SQLite file, shared by worker processes on one host."""
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS lists "
+                         "(id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, value TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS lists_key ON lists (key, id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; Streamlit runs each session in its own thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                         (key, _dumps(value), time.time() + ttl if ttl else None))
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO kv VALUES (?, ?, ?)",
+                                  (key, _dumps(value), now + ttl if ttl else None))
+            return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            conn.execute("DELETE FROM lists WHERE key = ?", (key,))
+
+    def delete_if(self, key, value):
+        with self._conn() as conn:
+            cursor = conn.execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, _dumps(value)))
+            return cursor.rowcount == 1
+
+    def refresh_if(self, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ? AND value = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (now + ttl, key, _dumps(value), now)
+            )
+            return cursor.rowcount == 1
+
+    def append(self, key, value, max_len=None):
+        with self._conn() as conn:
+            conn.execute("INSERT INTO lists (key, value) VALUES (?, ?)", (key, _dumps(value)))
+            if max_len is not None:
+                conn.execute("DELETE FROM lists WHERE key = ? AND id NOT IN "
+                             "(SELECT id FROM lists WHERE key = ? ORDER BY id DESC LIMIT ?)",
+                             (key, key, max_len))
+
+    def items(self, key):
+        rows = self._conn().execute("SELECT value FROM lists WHERE key = ? ORDER BY id", (key,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class RedisStore(Store):
+    """Store on a Redis-compatible server, shared by workers on several hosts."""
+
+    # Compare-and-delete / compare-and-expire, atomic on the server
+    _DELETE_IF = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+        return 0
+    """
+    _REFRESH_IF = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end
+        return 0
+    """
+
+    def __init__(self, url: str):
+        # Imported here so redis is only required for multi-host deployments
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self._delete_if = self.client.register_script(self._DELETE_IF)
+        self._refresh_if = self.client.register_script(self._REFRESH_IF)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, _dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(key, _dumps(value), nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def delete_if(self, key, value):
+        return bool(self._delete_if(keys=[key], args=[_dumps(value)]))
+
+    def refresh_if(self, key, value, ttl):
+        return bool(self._refresh_if(keys=[key], args=[_dumps(value), int(ttl * 1000)]))
+
+    def append(self, key, value, max_len=None):
+        pipe = self.client.pipeline()
+        pipe.rpush(key, _dumps(value))
+        if max_len is not None:
+            pipe.ltrim(key, -max_len, -1)
+        pipe.execute()
+
+    def items(self, key):
+        return [json.loads(item) for item in self.client.lrange(key, 0, -1)]
+
+
+def open_store(url: str = STORE_URL) -> Optional[Store]:
+    """Open the store for ``url``; None (single-process mode) when unset."""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("sqlite://"):
+        # sqlite:///abs/path.db, sqlite://relative/path.db or sqlite:// for the default
+        return SQLiteStore(url[len("sqlite://"):] or DEFAULT_SQLITE_PATH)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported RESEARCH_STORE_URL: {url}")
+
+
+def describe(store: Optional[Store]) -> str:
+    """Short backend name for the UI."""
+    return type(store).__name__ if store is not None else "process-local"
+
+
+class SharedCache:
+    """Namespaced, expiring cache on a shared store."""
+
+    def __init__(self, store: Store, namespace: str, ttl: Optional[float] = None):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"{KEY_PREFIX}{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.store.get(self._key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.store.set(self._key(key), value, ttl=self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.namespace, "hits": self.hits, "misses": self.misses}
+
+
+class JobQueue:
+    """Cross-worker job queue with at-most-one running copy per key.
+
+    A worker claims a job by taking a lease on its key; workers that ask for
+    the same job meanwhile wait for the published result. The lease holds a
+    token unique to the run and is renewed while the job runs. If it expires
+    without a result (the worker died), the next waiter takes over, and the
+    previous holder can no longer renew or release the new lease because its
+    token no longer matches. Results are kept for ``result_ttl`` seconds, so
+    later requests for the same job are answered without running it.
+    """
+
+    def __init__(self, store: Store, namespace: str = "jobs", lease: float = 900,
+                 result_ttl: Optional[float] = 6 * 60 * 60, poll_interval: float = 1.0):
+        self.store = store
+        self.namespace = namespace
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.executed = 0
+        self.waited = 0
+        self.reused = 0
+
+    def _key(self, kind: str, key: str = "") -> str:
+        return f"{KEY_PREFIX}{self.namespace}:{kind}:{key}" if key else f"{KEY_PREFIX}{self.namespace}:{kind}"
+
+    def _log(self, key: str, state: str, **fields: Any) -> None:
+        self.store.append(self._key("log"), {"key": key, "state": state, "worker": WORKER_ID,
+                                             "at": time.time(), **fields}, max_len=200)
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]], lease: Optional[float] = None) -> Any:
+        """Return the job's result, running ``fn()`` only if no worker has or is producing it."""
+        result_key, lease_key = self._key("result", key), self._key("lease", key)
+        lease = lease or self.lease
+        # Unique per run, so only this run can renew or release its lease
+        claim = {"worker": WORKER_ID, "token": uuid.uuid4().hex, "started": time.time()}
+        waiting = False
+        while True:
+            result = self.store.get(result_key)
+            if result is not None:
+                if waiting:
+                    self.waited += 1
+                else:
+                    self.reused += 1
+                return result
+
+            if self.store.add(lease_key, claim, ttl=lease):
+                break
+
+            waiting = True
+            await asyncio.sleep(self.poll_interval)
+
+        self.executed += 1
+        self._log(key, "running")
+        renewal = asyncio.ensure_future(self._renew(key, lease_key, claim, lease))
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._log(key, "failed", error=str(e))
+            raise
+        else:
+            self.store.set(result_key, result, ttl=self.result_ttl)
+            self._log(key, "done")
+            return result
+        finally:
+            renewal.cancel()
+            # Only release the lease if it is still ours
+            self.store.delete_if(lease_key, claim)
+
+    async def _renew(self, key: str, lease_key: str, claim: Dict[str, Any], lease: float) -> None:
+        """Extend the lease while the job runs, so long jobs are not taken over."""
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                renewed = self.store.refresh_if(lease_key, claim, lease)
+            except Exception as e:
+                print(f"Warning: Could not renew job lease: {e}")
+                continue
+            if not renewed:
+                # Expired and claimed by another worker; this run's result is still published
+                self._log(key, "lease lost")
+                return
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Recent job state changes across all workers, oldest first."""
+        return self.store.items(self._key("log"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.namespace, "executed": self.executed, "waited": self.waited,
+                "reused": self.reused}
+
+
+class SharedHistory:
+    """Research history on a shared store, scoped to a workspace."""
+
+    def __init__(self, store: Store, workspace: str, max_items: int = 100):
+        self.store = store
+        self.key = f"{KEY_PREFIX}history:{workspace}"
+        self.max_items = max_items
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        entry = dict(entry)
+        if isinstance(entry.get("timestamp"), datetime):
+            entry["timestamp"] = entry["timestamp"].isoformat()
+        self.store.append(self.key, entry, max_len=self.max_items)
+
+    def load(self) -> List[Dict[str, Any]]:
+        entries = self.store.items(self.key)
+        for entry in entries:
+            if isinstance(entry.get("timestamp"), str):
+                entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+        return entries
@@ -0,0 +1,211 @@
+"""
+Structured agent output.
+
+``Agent.output_type`` is honored by asking the provider for JSON (structured
+outputs / JSON mode) and validating the response into the pydantic model.
+``IncrementalJSONParser`` consumes the response while it streams and emits
+each completed element of the top-level lists (findings, citations, ...) as
+soon as its closing bracket arrives, validated into its item model, so the UI
+can show findings and citations without a separate extraction pass.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, get_args, get_origin
+
+from pydantic import BaseModel, Field, ValidationError
+
+
+class Citation(BaseModel):
+    """A source cited by the report."""
+    title: str
+    url: str
+    snippet: Optional[str] = None
+
+
+class Finding(BaseModel):
+    """A single key finding and the citations (by URL) that support it."""
+    statement: str
+    evidence: Optional[str] = None
+    source_urls: List[str] = Field(default_factory=list)
+
+
+class ResearchFindings(BaseModel):
+    """Structured research output; lists come first so they stream early."""
+    key_findings: List[Finding] = Field(default_factory=list)
+    citations: List[Citation] = Field(default_factory=list)
+    trends: List[str] = Field(default_factory=list)
+    recommendations: List[str] = Field(default_factory=list)
+    report: str = ""
+
+
+def json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    if hasattr(model, "model_json_schema"):
+        return model.model_json_schema()
+    return model.schema()
+
+
+def validate(model: Type[BaseModel], data: Any) -> BaseModel:
+    if hasattr(model, "model_validate"):
+        return model.model_validate(data)
+    return model.parse_obj(data)
+
+
+@lru_cache(maxsize=None)
+def schema_instructions(model: Type[BaseModel]) -> str:
+    """Prompt suffix for providers that only support plain JSON mode."""
+    return (
+        "\n\nRespond with a single JSON object (no Markdown fences) that matches this JSON schema:\n"
+        + json.dumps(json_schema(model))
+    )
+
+
+# OpenAI model families that accept a json_schema response_format; older
+# models (gpt-3.5-turbo, gpt-4, gpt-4-turbo) only have plain JSON mode
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+
+def supports_structured_output(model_name: str) -> bool:
+    """Whether an OpenAI model accepts the json_schema ``response_format``."""
+    return model_name.startswith(STRUCTURED_OUTPUT_MODELS)
+
+
+def response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    """OpenAI structured-outputs response_format for ``model``."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": json_schema(model), "strict": False},
+    }
+
+
+def list_item_models(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Map each ``List[X]`` field of ``model`` to its item type X."""
+    fields = model.model_fields if hasattr(model, "model_fields") else model.__fields__
+    items = {}
+    for name, field in fields.items():
+        annotation = getattr(field, "annotation", None) or getattr(field, "outer_type_", None)
+        if get_origin(annotation) in (list, List):
+            args = get_args(annotation)
+            if args:
+                items[name] = args[0]
+    return items
+
+
+class IncrementalJSONParser:
+    """Streaming parser for a JSON object whose top-level values may be lists.
+
+    ``feed`` scans only the newly received characters, tracking string and
+    nesting state, and returns ``(field, item)`` for every list element that
+    completed in that chunk. Items whose type is a pydantic model are
+    validated; invalid items are collected in ``errors`` instead of raised.
+    """
+
+    def __init__(self, item_models: Optional[Dict[str, Any]] = None):
+        self.item_models = item_models or {}
+        self.buffer = ""
+        self.errors: List[Tuple[str, str]] = []
+        self._pos = 0
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key_start = None
+        self._field: Optional[str] = None
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if not self._started:
+                # Skip anything before the top-level object (e.g. a code fence)
+                if char != "{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._expect_key:
+                        self._field = buffer[self._key_start + 1:i]
+                    elif self._in_list_item_level():
+                        completed.append(self._emit(i + 1))
+                continue
+
+            in_list = self._in_list_item_level()
+            if in_list and self._item_start is not None and char in ",]" and buffer[self._item_start] not in '{["':
+                # End of a number / true / false / null item
+                completed.append(self._emit(i))
+            if in_list and self._item_start is None and char not in " \t\r\n,]":
+                self._item_start = i
+
+            if char == '"':
+                self._in_string = True
+                if len(self._stack) == 1 and self._expect_key:
+                    self._key_start = i
+            elif char in "{[":
+                self._stack.append(char)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._in_list_item_level() and self._item_start is not None:
+                    completed.append(self._emit(i + 1))
+            elif char == ":" and len(self._stack) == 1:
+                self._expect_key = False
+            elif char == "," and len(self._stack) == 1:
+                self._expect_key = True
+
+        self._pos = len(buffer)
+        return [item for item in completed if item is not None]
+
+    def _in_list_item_level(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == "["
+
+    def _emit(self, end: int) -> Optional[Tuple[str, Any]]:
+        raw = self.buffer[self._item_start:end]
+        self._item_start = None
+        field = self._field or ""
+        try:
+            value = json.loads(raw)
+            model = self.item_models.get(field)
+            if isinstance(model, type) and issubclass(model, BaseModel):
+                value = validate(model, value)
+            return (field, value)
+        except (ValueError, ValidationError) as e:
+            self.errors.append((field, str(e)))
+            return None
+
+    def document(self) -> str:
+        """The JSON object received so far, without any leading/trailing text."""
+        start = self.buffer.find("{")
+        end = self.buffer.rfind("}")
+        return self.buffer[start:end + 1] if start != -1 and end != -1 else ""
+
+
+def parse_output(output_type: Type[BaseModel], text: str,
+                 on_item: Optional[Callable[[str, Any], None]] = None) -> Any:
+    """Validate a complete response into ``output_type``.
+
+    Used for non-streaming providers; list items are still reported through
+    ``on_item``. Returns the raw text when the response is not valid JSON for
+    the model (e.g. the model answered with a tool call instead).
+    """
+    parser = IncrementalJSONParser(list_item_models(output_type))
+    for field, item in parser.feed(text):
+        if on_item:
+            on_item(field, item)
+    try:
+        return validate(output_type, json.loads(parser.document()))
+    except (ValueError, ValidationError) as e:
+        print(f"Warning: Could not parse structured output: {e}")
+        return text
@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+import agents
+from agents import Agent, Runner
+from routing import ModelRouter, RoutingRule
+
+
+class FakeCompletions:
+    """Chat completions stub that records the requested models."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.models = []
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.models.append(kwargs["model"])
+        time.sleep(self.delay)
+        message = types.SimpleNamespace(content=f"answer from {kwargs['model']}", tool_calls=None)
+        usage = {"prompt_tokens": 10, "completion_tokens": 5}
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture
+def completions():
+    fake = FakeCompletions(delay=0.1)
+    agents.set_openai_client(types.SimpleNamespace(chat=types.SimpleNamespace(completions=fake)), "sk-test")
+    agents.set_provider("OpenAI")
+    agents.set_shared_store(None)
+    yield fake
+    agents.set_openai_client(None, None)
+
+
+def make_agent():
+    return Agent(name="elaboration_agent", instructions="Expand the report.", model="gpt-4o-mini")
+
+
+def run_in_thread(coro_factory, results, index):
+    # Streamlit runs each session's asyncio.run in its own thread
+    results[index] = asyncio.run(coro_factory())
+
+
+def test_router_is_per_call(completions):
+    agent = make_agent()
+    latency_router = ModelRouter(rules=[RoutingRule(objective="latency")])
+    result = asyncio.run(Runner.run(agent, "report", template="Custom", router=latency_router))
+    assert result.final_output == "answer from gpt-3.5-turbo"
+
+    # A run without a router is not affected by another session's router
+    result = asyncio.run(Runner.run(agent, "report", template="Custom"))
+    assert result.final_output == "answer from gpt-4o-mini"
+    assert len(latency_router.decisions) == 1
+
+
+def test_runs_routed_to_different_models_are_not_coalesced(completions):
+    agent = make_agent()
+    quality_router = ModelRouter(rules=[RoutingRule(objective="quality")])
+    results = [None, None]
+    threads = [
+        threading.Thread(target=run_in_thread,
+                         args=(lambda: Runner.run(agent, "same input", router=quality_router), results, 0)),
+        threading.Thread(target=run_in_thread, args=(lambda: Runner.run(agent, "same input"), results, 1)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(completions.models) == ["gpt-4o", "gpt-4o-mini"]
+    assert results[0].final_output == "answer from gpt-4o"
+    assert results[1].final_output == "answer from gpt-4o-mini"
+
+
+def test_identical_concurrent_runs_share_one_call(completions):
+    agent = make_agent()
+    results = [None, None, None]
+    threads = [
+        threading.Thread(target=run_in_thread, args=(lambda: Runner.run(agent, "shared input"), results, i))
+        for i in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert completions.models == ["gpt-4o-mini"]
+    assert {r.final_output for r in results} == {"answer from gpt-4o-mini"}
+    # Tokens are reported once, by the run that made the call
+    assert [r.shared for r in results].count(False) == 1
+    assert sum((r.usage or {}).get("prompt_tokens", 0) for r in results) == 10
+    assert all(r.usage is None for r in results if r.shared)
+
+
+def test_inputs_differing_only_in_case_are_separate_calls(completions):
+    agent = make_agent()
+    asyncio.run(Runner.run(agent, "Compare X and x"))
+    second = asyncio.run(Runner.run(agent, "compare x and  x"))
+    assert len(completions.models) == 2
+    assert not second.shared
+
+
+def test_shared_cache_is_keyed_on_routed_model(completions):
+    from shared_state import MemoryStore
+
+    agents.set_shared_store(MemoryStore())
+    try:
+        agent = make_agent()
+        quality_router = ModelRouter(rules=[RoutingRule(objective="quality")])
+        asyncio.run(Runner.run(agent, "cached input", router=quality_router))
+        cached = asyncio.run(Runner.run(agent, "cached input", router=quality_router))
+        plain = asyncio.run(Runner.run(agent, "cached input"))
+    finally:
+        agents.set_shared_store(None)
+
+    assert cached.final_output == "answer from gpt-4o"
+    assert cached.shared and cached.usage is None
+    assert not plain.shared and plain.usage["prompt_tokens"] == 10
+    assert plain.final_output == "answer from gpt-4o-mini"
+    assert completions.models == ["gpt-4o", "gpt-4o-mini"]
+
+
+class FakeStreamingCompletions:
+    """Streams a fixed JSON document and records the request arguments."""
+
+    def __init__(self):
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        text = '{"key_findings": [{"statement": "s"}], "report": "r"}'
+        delta = types.SimpleNamespace(content=text, tool_calls=None)
+        return iter([types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)])
+
+
+def run_structured(model, on_item=None):
+    from structured import ResearchFindings
+
+    fake = FakeStreamingCompletions()
+    agents.set_openai_client(types.SimpleNamespace(chat=types.SimpleNamespace(completions=fake)), "sk-test")
+    agents.set_provider("OpenAI")
+    agents.set_shared_store(None)
+    agent = Agent(name="research_agent", instructions="Research.", model=model, output_type=ResearchFindings)
+    try:
+        result = asyncio.run(Runner.run(agent, f"topic for {model}", on_item=on_item))
+    finally:
+        agents.set_openai_client(None, None)
+    return fake.requests[0], result
+
+
+def test_structured_output_uses_json_schema_when_supported():
+    request, result = run_structured("gpt-4o-mini")
+    assert request["response_format"]["type"] == "json_schema"
+    assert result.final_output.report == "r"
+
+
+def test_structured_output_falls_back_to_json_mode():
+    request, result = run_structured("gpt-3.5-turbo")
+    assert request["response_format"] == {"type": "json_object"}
+    assert "JSON schema" in request["messages"][0]["content"]
+    assert result.final_output.key_findings[0].statement == "s"
+
+
+def test_callback_errors_do_not_count_against_the_endpoint():
+    from resilience import get_endpoint
+
+    def on_item(field, item):
+        raise RuntimeError("UI update failed")
+
+    with pytest.raises(RuntimeError):
+        run_structured("gpt-4o-callback-test", on_item=on_item)
+    endpoint = get_endpoint("openai:gpt-4o-callback-test:stream")
+    assert endpoint.calls == 1
+    assert endpoint.failures == 0
+
+
+class FakeLocalQueue:
+    """Stands in for ``local_models.LocalInferenceQueue``."""
+
+    def __init__(self, name):
+        self.name = name
+        self.prompts = []
+
+    async def submit(self, messages, max_tokens=1000, temperature=0.7):
+        self.prompts.append(messages[-1]["content"])
+        await asyncio.sleep(0.1)
+        return f"answer from {self.name}"
+
+
+def test_sessions_on_different_local_models_use_their_own_queue():
+    agents.set_provider("Local")
+    agents.set_shared_store(None)
+    queues = [FakeLocalQueue("Ollama:llama3"), FakeLocalQueue("Hugging Face:Qwen/Qwen2.5-0.5B-Instruct")]
+    results = [None, None]
+    threads = [
+        threading.Thread(target=run_in_thread,
+                         args=(lambda q=queue: Runner.run(make_agent(), "same input", local_queue=q), results, i))
+        for i, queue in enumerate(queues)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        agents.set_provider("OpenAI")
+
+    assert [r.final_output for r in results] == [f"answer from {q.name}" for q in queues]
+    assert [len(q.prompts) for q in queues] == [1, 1]
+    assert not any(r.shared for r in results)
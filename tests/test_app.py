@@ -0,0 +1,109 @@
+import json
+import os
+import types
+
+import pytest
+
+import agents
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "deep_research_openai.py")
+
+SOURCES = [
+    {"url": "https://journal.example.edu/solar-storage", "title": "Solar storage study",
+     "description": "Peer-reviewed study of solar storage costs"},
+    {"url": "http://www.journal.example.edu/solar-storage/", "title": "Solar storage study (mirror)",
+     "description": "Peer-reviewed study of solar storage costs"},
+    {"url": "https://blog.example.com/solar", "title": "Solar blog post", "description": "Opinions on solar"},
+]
+
+
+class FakeFirecrawlApp:
+    """Deep research endpoint that completes on the first status check."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def async_deep_research(self, **kwargs):
+        return {"id": "job-1"}
+
+    def check_deep_research_status(self, job_id):
+        return {"status": "completed", "activities": [{"type": "search", "message": "Searching"}],
+                "data": {"finalAnalysis": "Storage costs fell sharply.", "sources": [dict(s) for s in SOURCES]}}
+
+    def deep_research(self, on_activity=None, **kwargs):
+        return {"data": {"finalAnalysis": "Storage costs fell sharply.", "sources": [dict(s) for s in SOURCES]}}
+
+
+class RecordingCompletions:
+    def __init__(self):
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get("stream"):
+            text = json.dumps({"key_findings": [{"statement": "Costs fell"}], "citations": [], "trends": [],
+                               "recommendations": [], "report": "# Initial report"})
+            delta = types.SimpleNamespace(content=text, tool_calls=None)
+            return iter([types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)])
+        message = types.SimpleNamespace(content="# Enhanced report", tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def completions(monkeypatch, tmp_path):
+    st = pytest.importorskip("streamlit")
+    # Cached resources (shared store, Firecrawl app) must not leak between tests
+    st.cache_resource.clear()
+    # Run history, checkpoints and exports go to the default, cwd-relative data directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(__import__("sys").modules, "firecrawl", types.SimpleNamespace(FirecrawlApp=FakeFirecrawlApp))
+    fake = RecordingCompletions()
+    agents.set_openai_client(types.SimpleNamespace(chat=types.SimpleNamespace(completions=fake)), "sk-test")
+    agents.set_shared_store(None)
+    yield fake
+    agents.set_openai_client(None, None)
+
+
+def open_app(workspace=None, firecrawl=True):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_FILE, default_timeout=60)
+    app.session_state["openai_api_key"] = "sk-test"
+    if firecrawl:
+        app.session_state["firecrawl_api_key"] = "fc-test"
+    if workspace:
+        app.query_params["workspace"] = workspace
+    return app.run()
+
+
+def research(app, topic):
+    app.text_input(key="research_topic").input(topic).run()
+    app.button[[b.label for b in app.button].index("Start Research")].click().run()
+    assert not app.exception
+
+
+def test_ranked_firecrawl_sources_reach_both_prompts(completions):
+    app = open_app()
+    research(app, "solar storage costs")
+
+    research_prompt, elaboration_prompt = (request["messages"][-1]["content"] for request in completions.requests)
+    for prompt in (research_prompt, elaboration_prompt):
+        assert "TOP SOURCES" in prompt
+        assert "Solar storage study" in prompt
+        # The mirrored copy was removed before ranking
+        assert "(mirror)" not in prompt
+    assert "Storage costs fell sharply." in research_prompt
+    assert "Not available" not in elaboration_prompt
+
+
+def test_history_is_only_shared_within_an_explicit_workspace(completions, monkeypatch):
+    import shared_state
+
+    store = shared_state.MemoryStore()
+    monkeypatch.setattr(shared_state, "open_store", lambda: store)
+
+    research(open_app(firecrawl=False), "private topic")
+    research(open_app(workspace="team", firecrawl=False), "team topic")
+
+    assert [entry["topic"] for entry in open_app(workspace="team").session_state["research_history"]] == ["team topic"]
+    assert open_app().session_state["research_history"] == []
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import types
+
+from agents import Agent
+from batch import BatchRunner, LocalBatchBackend, OpenAIBatchBackend
+
+
+def make_agent():
+    return Agent(name="elaboration_agent", instructions="Expand the report.")
+
+
+def result_line(custom_id, content=None, error=None, status_code=200):
+    body = {"choices": [{"index": 0, "message": {"content": content}}]} if content is not None else {"error": error}
+    return {"custom_id": custom_id, "response": {"status_code": status_code, "body": body}, "error": None}
+
+
+class FakeOpenAI:
+    """Files and Batches API stub with separate output and error files."""
+
+    def __init__(self, output_lines, error_lines):
+        self.uploaded = []
+        self.deleted = []
+        self.file_contents = {
+            "file-out": "\n".join(json.dumps(line) for line in output_lines),
+            "file-err": "\n".join(json.dumps(line) for line in error_lines),
+        }
+        batch = types.SimpleNamespace(id="batch_1", status="completed", input_file_id="file-in",
+                                      output_file_id="file-out" if output_lines else None,
+                                      error_file_id="file-err" if error_lines else None)
+        self.files = types.SimpleNamespace(create=self._upload, content=self._content, delete=self.deleted.append)
+        self.batches = types.SimpleNamespace(create=lambda **kwargs: batch, retrieve=lambda batch_id: batch)
+
+    def _upload(self, file, purpose):
+        self.uploaded.append(file.read())
+        return types.SimpleNamespace(id="file-in")
+
+    def _content(self, file_id):
+        return types.SimpleNamespace(text=self.file_contents[file_id])
+
+
+def test_local_batch_maps_results_to_keys(tmp_path):
+    backend = LocalBatchBackend(output_dir=str(tmp_path))
+    runner = BatchRunner(backend, work_dir=str(tmp_path), poll_interval=0)
+    runner.add("solar", make_agent(), "solar report")
+    runner.add("wind", make_agent(), "wind report")
+    results = asyncio.run(runner.run())
+    assert results["solar"].final_output.endswith("solar report")
+    assert results["wind"].error is None
+    # Input and output files are removed once the results are collected
+    assert os.listdir(tmp_path) == []
+
+
+def test_input_file_is_deleted_after_upload(tmp_path):
+    runner = BatchRunner(LocalBatchBackend(output_dir=str(tmp_path / "out")), work_dir=str(tmp_path),
+                         poll_interval=0)
+    os.makedirs(tmp_path / "out")
+    runner.add("solar", make_agent(), "solar report")
+    asyncio.run(runner.run())
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".jsonl")]
+
+
+def test_error_file_and_missing_results_map_to_errors(tmp_path):
+    client = FakeOpenAI(
+        output_lines=[result_line("req-0", content="solar answer")],
+        error_lines=[result_line("req-1", error={"message": "context too long"}, status_code=400)],
+    )
+    runner = BatchRunner(OpenAIBatchBackend(client), work_dir=str(tmp_path), poll_interval=0)
+    for key in ("solar", "wind", "hydro"):
+        runner.add(key, make_agent(), f"{key} report")
+    results = asyncio.run(runner.run())
+
+    assert results["solar"].final_output == "solar answer"
+    assert results["wind"].error == "context too long"
+    assert "no result" in results["hydro"].error
+    assert len(client.uploaded) == 1
+    assert sorted(client.deleted) == ["file-err", "file-in", "file-out"]
+
+
+def test_only_error_file(tmp_path):
+    client = FakeOpenAI(output_lines=[], error_lines=[result_line("req-0", error={"message": "bad"})])
+    runner = BatchRunner(OpenAIBatchBackend(client), work_dir=str(tmp_path), poll_interval=0)
+    runner.add("solar", make_agent(), "solar report")
+    assert asyncio.run(runner.run())["solar"].error == "bad"
+
+
+def test_nightly_command_elaborates_reports(tmp_path):
+    reports = tmp_path / "reports.jsonl"
+    reports.write_text("\n".join(json.dumps({"topic": topic, "report": f"# {topic}"}) for topic in ("solar", "wind")))
+    output = tmp_path / "results.jsonl"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, os.path.join(root, "batch.py"), str(reports), str(output), "--provider", "local",
+                    "--poll-interval", "0"], check=True, capture_output=True, cwd=str(tmp_path))
+
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [line["topic"] for line in lines] == ["solar", "wind"]
+    assert all(line["error"] is None and "RESEARCH TOPIC: " in line["report"] for line in lines)
@@ -0,0 +1,63 @@
+import os
+import time
+
+import checkpoints
+from checkpoints import CheckpointStore, run_id_for
+
+PARAMS = {"template": "Custom", "max_depth": 3, "time_limit": 180, "max_urls": 10}
+
+
+def test_run_id_is_stable_and_scoped():
+    run_id = run_id_for("Solar power", PARAMS, "OpenAI", "workspace-a")
+    assert run_id == run_id_for("solar  power", dict(PARAMS), "OpenAI", "workspace-a")
+    assert run_id != run_id_for("Solar power", PARAMS, "OpenAI", "workspace-b")
+    assert run_id != run_id_for("Solar power", PARAMS, "Groq", "workspace-a")
+
+
+def test_saved_stages_resume_after_reopen(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    checkpoint = store.open("run")
+    checkpoint.save("initial_report", "# Report", 12.5)
+
+    resumed = store.open("run")
+    assert resumed.get("initial_report") == "# Report"
+    assert resumed.resumed == ["initial_report"]
+    assert resumed.time_saved() == 12.5
+    resumed.clear()
+    assert store.open("run").get("initial_report") is None
+
+
+def test_none_value_is_not_counted_as_resumed(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.open("run").save("findings", None, 0.0)
+
+    checkpoint = store.open("run")
+    assert checkpoint.get("findings") is None
+    assert checkpoint.resumed == []
+    assert checkpoint.time_saved() == 0
+
+
+def test_peek_does_not_count_as_resumed(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.open("run").save("firecrawl", {"sources": []}, 30.0)
+    checkpoint = store.open("run")
+    assert checkpoint.peek("firecrawl") == {"sources": []}
+    assert checkpoint.resumed == []
+
+
+def test_corrupt_checkpoint_starts_over(tmp_path):
+    (tmp_path / "run.json").write_text("{not json")
+    assert CheckpointStore(str(tmp_path)).open("run").stages == {}
+
+
+def test_prune_removes_expired_checkpoints(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.open("old").save("initial_report", "x", 1.0)
+    store.open("new").save("initial_report", "y", 1.0)
+    (tmp_path / "old.json.123.tmp").write_text("partial")
+    expired = time.time() - checkpoints.CHECKPOINT_TTL - 60
+    for name in ("old.json", "old.json.123.tmp"):
+        os.utime(tmp_path / name, (expired, expired))
+
+    assert store.prune() == 2
+    assert os.listdir(tmp_path) == ["new.json"]
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from citations import SourceIndex, cite_report
+
+SOURCES = [
+    {"url": "https://www.nature.com/articles/quantum-error-correction",
+     "title": "Quantum error correction below the surface code threshold",
+     "description": "Logical qubits with error rates below the threshold", "accessed": "2024-03-01"},
+    {"url": "https://example.org/solar-panel-efficiency", "title": "Solar panel efficiency records",
+     "description": "Perovskite tandem cells reach new efficiency records"},
+]
+
+
+def test_cites_matching_sentences_in_order_of_first_use():
+    report = ("# Findings\n\nPerovskite tandem solar cells reached new efficiency records this year. "
+              "Quantum error correction now works below the surface code threshold.")
+    cited = cite_report(report, SOURCES)
+    assert "efficiency records this year [1]." in cited.text
+    assert "surface code threshold [2]." in cited.text
+    assert [ref["url"] for ref in cited.references] == [SOURCES[1]["url"], SOURCES[0]["url"]]
+    assert cited.text.startswith("# Findings\n")
+
+
+def test_explicit_url_and_domain_mentions():
+    index = SourceIndex(SOURCES)
+    assert index.match("See https://nature.com/articles/quantum-error-correction for details.") == [0]
+    assert index.match("Researchers writing in nature.com reported a major result today.") == [0]
+
+
+def test_skips_code_tables_and_existing_markers():
+    report = ("```\nQuantum error correction below the surface code threshold.\n```\n"
+              "| Quantum error correction below the surface code threshold |\n"
+              "Quantum error correction below the surface code threshold [7].")
+    assert cite_report(report, SOURCES).text == report
+
+
+def test_malformed_sources_are_tolerated():
+    sources = [
+        {"url": "https://a.com/x", "title": None, "description": None},
+        {"url": None, "title": "No url"},
+        {"url": 42},
+        {"url": "http://[::1", "title": "Bad host"},
+        "not a dict",
+        {"url": "https://b.com/quantum-networks", "title": "Quantum networks", "description": None},
+    ]
+    cited = cite_report("Quantum networks connect distant quantum processors over fiber links.", sources)
+    assert [ref["url"] for ref in cited.references] == ["https://b.com/quantum-networks"]
+    assert cited.references[0]["title"] == "Quantum networks"
+
+
+def test_references_use_stored_access_date():
+    cited = cite_report("Quantum error correction works below the surface code threshold now. "
+                        "Perovskite tandem solar cells reach new efficiency records.", SOURCES)
+    lines = cited.references_markdown(accessed=datetime(2025, 1, 2)).splitlines()
+    assert lines[0].endswith("Accessed 2024-03-01.")
+    # Sources saved before access dates were recorded fall back to the given date
+    assert lines[1].endswith("Accessed 2025-01-02.")
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+
+import pytest
+
+from coalesce import SingleFlight, make_key, normalize_query
+
+
+def test_make_key_is_exact_but_ignores_dict_order():
+    assert make_key("solar", {"b": 1, "a": 2}) == make_key("solar", {"a": 2, "b": 1})
+    assert make_key("solar") != make_key("wind")
+    # Prompts differing only in case or whitespace (e.g. code blocks) are distinct requests
+    assert make_key("def f():\n    return X") != make_key("def f(): return x")
+
+
+def test_queries_are_normalized_explicitly():
+    assert make_key(normalize_query("Solar  Power ")) == make_key(normalize_query("solar power"))
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["result"] * 4
+    assert runs == [1]
+    assert flight.stats()["calls_saved"] == 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelling_a_follower_does_not_cancel_the_call():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        followers[0].cancel()
+        results = await asyncio.gather(leader, *followers, return_exceptions=True)
+        return results
+
+    leader, cancelled, *others = asyncio.run(main())
+    assert leader == "result"
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert others == ["result", "result"]
+    assert runs == [1]
+
+
+def test_followers_in_other_threads_survive_a_cancelled_follower():
+    # Streamlit sessions each run their own event loop in their own thread
+    flight = SingleFlight("test")
+    release = threading.Event()
+    started = threading.Event()
+    results = {}
+
+    async def work():
+        started.set()
+        await asyncio.to_thread(release.wait, 5)
+        return "result"
+
+    def session(name, cancel=False):
+        async def main():
+            task = asyncio.ensure_future(flight.do("k", work))
+            if cancel:
+                await asyncio.sleep(0.05)
+                task.cancel()
+            try:
+                results[name] = await task
+            except asyncio.CancelledError:
+                results[name] = "cancelled"
+        asyncio.run(main())
+
+    leader = threading.Thread(target=session, args=("leader",))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=session, args=(f"f{i}", i == 0)) for i in range(3)]
+    for thread in followers:
+        thread.start()
+    followers[0].join()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert results == {"leader": "result", "f0": "cancelled", "f1": "result", "f2": "result"}
+
+
+def test_follower_takes_over_when_leader_is_cancelled():
+    flight = SingleFlight("test")
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return len(runs)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_errors_reach_all_callers():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.02)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
@@ -0,0 +1,66 @@
+import pytest
+
+from dedup import canonical_domain, deduplicate_sources, normalize_url
+
+
+@pytest.mark.parametrize("a, b", [
+    ("https://www.example.com/post/1?utm_source=x", "http://example.com/post/1/"),
+    ("https://example.com/news/story/amp", "https://example.com/news/story"),
+    ("https://example.com/news/story/amp/", "https://example.com/news/story"),
+    ("https://m.example.com/a/index.html", "https://example.com/a"),
+    ("https://example.com/index.html", "https://example.com/"),
+    ("https://youtu.be/abc", "https://youtube.com/abc"),
+])
+def test_equivalent_urls_normalize_equal(a, b):
+    assert normalize_url(a) == normalize_url(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("https://example.com/amp", "https://example.com/"),
+    ("https://example.com/amp/", "https://example.com"),
+    ("https://example.com/ramp", "https://example.com/r"),
+    ("https://example.com/a?id=1", "https://example.com/a?id=2"),
+])
+def test_distinct_urls_stay_distinct(a, b):
+    assert normalize_url(a) != normalize_url(b)
+
+
+def test_canonical_domain_keeps_two_label_hosts():
+    assert canonical_domain("m.com") == "m.com"
+    assert canonical_domain("WWW.Example.com:443") == "example.com"
+
+
+def test_removes_exact_and_near_duplicates():
+    text = " ".join(f"word{i}" for i in range(60))
+    sources = [
+        {"url": "https://www.site.com/post/1?utm_source=x", "description": text},
+        {"url": "http://site.com/post/1/", "description": "other"},
+        {"url": "https://mirror.net/a", "description": "Syndicated: " + text},
+        {"url": "https://other.org/b", "description": " ".join(f"term{i}" for i in range(60))},
+    ]
+    result = deduplicate_sources(sources)
+    assert [s["url"] for s in result.sources] == ["https://www.site.com/post/1?utm_source=x", "https://other.org/b"]
+    assert (result.exact_duplicates, result.near_duplicates) == (1, 1)
+
+
+def test_sources_without_urls_are_kept():
+    result = deduplicate_sources([{"title": "a"}, {"url": None, "title": "b"}])
+    assert len(result.sources) == 2
+
+
+@pytest.mark.parametrize("url", [None, 42, ["https://a.com"], "http://[::1/a", "  "])
+def test_malformed_urls_do_not_raise(url):
+    assert isinstance(normalize_url(url), str)
+
+
+def test_malformed_sources_are_tolerated():
+    sources = [
+        {"url": "http://[::1/a", "title": "bad host"},
+        {"url": "http://[::1/a", "title": "bad host copy"},
+        {"url": 42, "title": "numeric"},
+        "not a source",
+        None,
+    ]
+    result = deduplicate_sources(sources)
+    assert [s["title"] for s in result.sources] == ["bad host", "numeric"]
+    assert result.exact_duplicates == 1
@@ -0,0 +1,63 @@
+import json
+import os
+import time
+
+from export import available_formats, export_report, parse_blocks, prune_exports, render_inline, report_hash
+
+REPORT = "# Title\n\nSome **bold** text.\n\n- one\n- two\n\n| a | b |\n|---|---|\n| 1 | 2 |\n"
+
+
+def test_cache_key_ignores_generated_time():
+    a = report_hash(REPORT, {"topic": "t", "generated": "2024-01-01 10:00:00"})
+    b = report_hash(REPORT, {"topic": "t", "generated": "2024-01-01 10:05:00"})
+    assert a == b
+    assert a != report_hash(REPORT, {"topic": "other", "generated": "2024-01-01 10:00:00"})
+
+
+def test_export_is_reused_across_renders(tmp_path):
+    first = export_report(REPORT, "JSON", {"topic": "t", "generated": "1"}, export_dir=str(tmp_path))
+    second = export_report(REPORT, "JSON", {"topic": "t", "generated": "2"}, export_dir=str(tmp_path))
+    assert first == second
+    assert os.listdir(tmp_path) == [os.path.basename(first)]
+    with open(first, encoding="utf-8") as f:
+        exported = json.load(f)
+    assert exported["topic"] == "t" and exported["report"] == REPORT
+
+
+def test_html_export_renders_blocks(tmp_path):
+    path = export_report(REPORT, "HTML", {"topic": "t"}, export_dir=str(tmp_path))
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    assert "<h1>Title</h1>" in html and "<strong>bold</strong>" in html and "<table>" in html
+    assert [kind for kind, _ in parse_blocks(REPORT)] == ["heading", "paragraph", "list", "table"]
+
+
+def test_prune_removes_stale_and_excess_exports(tmp_path):
+    now = time.time()
+    for i in range(5):
+        path = tmp_path / f"export{i}.html"
+        path.write_text("x")
+        os.utime(path, (now - i * 60, now - i * 60))
+    stale = tmp_path / "stale.pdf"
+    stale.write_text("x")
+    os.utime(stale, (now - 30 * 86400, now - 30 * 86400))
+    in_progress = tmp_path / "export9.html.123.tmp"
+    in_progress.write_text("x")
+
+    removed = prune_exports(str(tmp_path), max_age=86400, max_files=3)
+    assert removed == 3
+    assert sorted(os.listdir(tmp_path)) == ["export0.html", "export1.html", "export2.html", "export9.html.123.tmp"]
+
+
+def test_html_and_json_are_always_available():
+    assert {"HTML", "JSON"} <= set(available_formats())
+
+
+def test_link_urls_cannot_break_out_of_the_href():
+    rendered = render_inline('[source](https://evil.example/"onmouseover="alert`1`"<script>)')
+    assert '"onmouseover' not in rendered
+    assert "<script>" not in rendered
+    assert rendered == '<a href="https://evil.example/&quot;onmouseover=&quot;alert`1`&quot;&lt;script&gt;">source</a>'
+    # Underscores and backticks in URLs are not treated as Markdown
+    assert render_inline("[*a*](https://example.org/_x_/y)") == '<a href="https://example.org/_x_/y"><em>a</em></a>'
+    assert render_inline("[a](https://example.org/x?a=1&b=2)") == '<a href="https://example.org/x?a=1&amp;b=2">a</a>'
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from loadtest import find_saturation, percentile
+
+
+def stage(users, throughput, p95):
+    return {"users": users, "throughput_rps": throughput, "p95_s": p95}
+
+
+def test_percentile():
+    assert percentile([3.0, 1.0, 2.0, 4.0], 0.5) == 3.0
+    assert percentile([3.0, 1.0, 2.0, 4.0], 0.99) == 4.0
+    assert percentile([], 0.5) != percentile([], 0.5)
+
+
+def test_saturation_when_throughput_stops_increasing():
+    stages = [stage(1, 2.0, 0.5), stage(2, 4.0, 0.5), stage(4, 4.2, 0.6)]
+    assert find_saturation(stages, min_gain=0.1, max_slowdown=3.0) == {
+        "users": 4, "reason": "throughput stopped increasing", "max_useful_users": 2}
+
+
+def test_saturation_when_tail_latency_degrades():
+    stages = [stage(1, 2.0, 0.5), stage(2, 4.0, 0.8), stage(4, 8.0, 1.6)]
+    saturation = find_saturation(stages, min_gain=0.1, max_slowdown=3.0)
+    assert (saturation["users"], saturation["max_useful_users"]) == (4, 2)
+    assert saturation["reason"] == "p95 latency above 3x baseline"
+
+
+def test_no_saturation_while_scaling():
+    stages = [stage(1, 2.0, 0.5), stage(2, 4.0, 0.5)]
+    assert find_saturation(stages, min_gain=0.1, max_slowdown=3.0)["users"] is None
+
+
+def test_concurrent_sessions_complete_without_touching_the_working_directory(tmp_path):
+    pytest.importorskip("streamlit")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = tmp_path / "results.json"
+    subprocess.run([sys.executable, os.path.join(root, "loadtest.py"), "--users", "8", "--runs", "2",
+                    "--latency", "0.01", "--json", str(output)], check=True, capture_output=True, cwd=str(tmp_path))
+
+    (result,) = json.loads(output.read_text())["stages"]
+    assert (result["completed"], result["errors"]) == (16, 0), result["first_error"]
+    assert os.listdir(tmp_path) == ["results.json"]
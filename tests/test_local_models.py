@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import threading
+import types
+
+import pytest
+
+from local_models import LocalInferenceQueue, OllamaBackend
+
+
+class FakeBackend:
+    """Echo backend that records its batches; the first batch can be held."""
+
+    name = "Fake"
+
+    def __init__(self, max_batch_size=8, hold_first=False):
+        self.max_batch_size = max_batch_size
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold_first:
+            self.release.set()
+        self.fail_on = None
+        self.drop_last = False
+
+    def keep_warm(self):
+        pass
+
+    def generate_batch(self, prompts, max_tokens, temperature):
+        texts = [messages[-1]["content"] for messages in prompts]
+        self.batches.append(texts)
+        self.started.set()
+        self.release.wait(5)
+        if self.fail_on in texts:
+            raise RuntimeError("backend failed")
+        results = [(f"echo {text}", 2) for text in texts]
+        return results[:-1] if self.drop_last else results
+
+
+def prompt(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_batches_concurrent_requests():
+    backend = FakeBackend()
+    local_queue = LocalInferenceQueue(backend, batch_window=0.2)
+
+    async def main():
+        return await asyncio.gather(*(local_queue.submit(prompt(f"p{i}")) for i in range(3)))
+
+    assert asyncio.run(main()) == ["echo p0", "echo p1", "echo p2"]
+    assert backend.batches == [["p0", "p1", "p2"]]
+
+
+def test_deferred_requests_are_batched_together():
+    backend = FakeBackend(hold_first=True)
+    local_queue = LocalInferenceQueue(backend, batch_window=0.1)
+
+    async def main():
+        first = asyncio.ensure_future(local_queue.submit(prompt("x")))
+        await asyncio.to_thread(backend.started.wait, 5)
+        rest = [
+            asyncio.ensure_future(local_queue.submit(prompt(text), temperature=temperature))
+            for text, temperature in (("a", 0.2), ("b", 0.7), ("c", 0.2), ("d", 0.7))
+        ]
+        await asyncio.sleep(0.05)
+        backend.release.set()
+        return await asyncio.gather(first, *rest)
+
+    assert asyncio.run(main()) == ["echo x", "echo a", "echo b", "echo c", "echo d"]
+    assert backend.batches == [["x"], ["a", "c"], ["b", "d"]]
+
+
+def test_cancelled_request_is_not_generated():
+    backend = FakeBackend(hold_first=True)
+    local_queue = LocalInferenceQueue(backend, batch_window=0.01)
+
+    async def main():
+        first = asyncio.ensure_future(local_queue.submit(prompt("x")))
+        await asyncio.to_thread(backend.started.wait, 5)
+        abandoned = asyncio.ensure_future(local_queue.submit(prompt("abandoned")))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        backend.release.set()
+        await first
+        return await local_queue.submit(prompt("next"))
+
+    assert asyncio.run(main()) == "echo next"
+    assert ["abandoned"] not in backend.batches
+
+
+def test_worker_survives_failures():
+    backend = FakeBackend()
+    local_queue = LocalInferenceQueue(backend, batch_window=0.01)
+    backend.fail_on = "bad"
+    with pytest.raises(RuntimeError, match="backend failed"):
+        asyncio.run(local_queue.submit(prompt("bad")))
+
+    backend.fail_on = None
+    backend.drop_last = True
+
+    async def main():
+        return await asyncio.gather(local_queue.submit(prompt("a")), local_queue.submit(prompt("b")),
+                                    return_exceptions=True)
+
+    ok, missing = asyncio.run(main())
+    assert ok == "echo a"
+    assert isinstance(missing, RuntimeError)
+
+    backend.drop_last = False
+    assert asyncio.run(local_queue.submit(prompt("later"))) == "echo later"
+
+
+def test_ollama_preload_honors_cpu_only(monkeypatch):
+    calls = []
+
+    class FakeClient:
+        def generate(self, **kwargs):
+            calls.append(kwargs)
+
+    monkeypatch.setitem(sys.modules, "ollama", types.SimpleNamespace(Client=FakeClient))
+    backend = OllamaBackend(model="llama3", cpu_only=True)
+    OllamaBackend(cpu_only=False)
+    assert calls[0]["options"] == {"num_gpu": 0}
+    assert calls[1]["options"] == {}
+    assert LocalInferenceQueue(backend).name == "Ollama:llama3"
@@ -0,0 +1,69 @@
+from progress import ResearchProgress
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_progress(clock):
+    return ResearchProgress(max_depth=3, time_limit=60, max_urls=10, refresh_interval=0.5, clock=clock)
+
+
+def test_nothing_to_render_within_the_same_second():
+    clock = FakeClock()
+    progress = make_progress(clock)
+    clock.now = 0.9
+    assert not progress.should_render()
+
+
+def test_clock_ticks_without_activity():
+    clock = FakeClock()
+    progress = make_progress(clock)
+    clock.now = 1.2
+    assert progress.should_render()
+    assert "1s elapsed" in progress.status_line()
+    clock.now = 1.8
+    assert not progress.should_render()
+    clock.now = 2.1
+    assert progress.should_render()
+
+
+def test_throttles_renders_within_interval():
+    clock = FakeClock()
+    progress = make_progress(clock)
+    progress.record({"type": "search", "message": "first"})
+    assert progress.should_render()
+    clock.now = 0.1
+    progress.record({"type": "search", "message": "second"})
+    assert not progress.should_render()
+
+
+def test_pending_state_is_flushed_after_window_without_new_events():
+    clock = FakeClock()
+    progress = make_progress(clock)
+    progress.record({"type": "search", "message": "first"})
+    assert progress.should_render()
+    clock.now = 0.1
+    progress.record({"type": "extract", "message": "last", "url": "https://a.com"})
+    assert not progress.should_render()
+
+    clock.now = 0.7
+    assert progress.should_render()
+    assert progress.recent()[-1] == "[EXTRACT] last"
+    # Rendered once; nothing new since within the same second
+    clock.now = 0.9
+    assert not progress.should_render()
+
+
+def test_fraction_reaches_one_only_when_complete():
+    clock = FakeClock()
+    progress = make_progress(clock)
+    for i in range(20):
+        progress.record({"type": "extract", "url": f"https://a.com/{i}", "depth": 3})
+    assert progress.fraction() < 1.0
+    progress.record({"type": "complete", "message": "done"})
+    assert progress.fraction() == 1.0
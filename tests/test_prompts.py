@@ -0,0 +1,16 @@
+from prompts import TEMPLATE_INSTRUCTIONS, research_input, research_instructions
+
+PARAMS = {"max_depth": 3, "time_limit": 180, "max_urls": 10}
+
+
+def test_instructions_are_fixed_per_template():
+    assert research_instructions("Market Analysis") is research_instructions("Market Analysis")
+    assert research_instructions("Unknown").endswith(TEMPLATE_INSTRUCTIONS["Custom"])
+    # Run parameters never reach the cacheable system prompt
+    assert "180" not in research_instructions("Custom")
+
+
+def test_run_parameters_come_after_the_topic():
+    text = research_input("Solar power", PARAMS)
+    assert text.startswith("Solar power\n\n")
+    assert text.index("max_depth: 3") < text.index("time_limit: 180") < text.index("max_urls: 10")
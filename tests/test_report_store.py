@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+
+from report_store import ReportStore, compress, decompress, prune_spilled
+
+
+def test_round_trip_and_dedup(tmp_path):
+    store = ReportStore(spill_dir=str(tmp_path))
+    report_id = store.put("# Report\n\nBody")
+    assert store.put("# Report\n\nBody") == report_id
+    assert store.get(report_id) == "# Report\n\nBody"
+    assert store.stats()["in_memory"] == 1
+    assert store.get(None) is None
+    assert store.get_json("unknown", default=[]) == []
+    assert decompress(compress(b"data")) == b"data"
+
+
+def test_bodies_over_budget_spill_and_load_back(tmp_path):
+    store = ReportStore(budget=1, spill_dir=str(tmp_path))
+    first = store.put_json({"report": "first " * 100})
+    second = store.put("second " * 100)
+    # Only the most recently used body stays in memory
+    assert store.stats()["in_memory"] == 1
+    assert store.spills == 1
+    assert store.get_json(first) == {"report": "first " * 100}
+    assert store.loads == 1
+    assert store.get(second) == "second " * 100
+
+
+def test_prune_spilled_removes_old_bodies(tmp_path):
+    store = ReportStore(budget=1, spill_dir=str(tmp_path))
+    old = store.put("old " * 100)
+    store.put("new " * 100)
+    path = os.path.join(str(tmp_path), f"{old}.bin")
+    past = time.time() - 3600
+    os.utime(path, (past, past))
+
+    assert prune_spilled(str(tmp_path), max_age=60) == 1
+    assert not os.path.exists(path)
+    assert prune_spilled(str(tmp_path / "missing")) == 0
+
+
+def test_concurrent_puts_and_gets_keep_the_accounting_consistent(tmp_path):
+    # Downloads read bodies from other threads while the script stores new ones
+    store = ReportStore(budget=2000, spill_dir=str(tmp_path))
+    reports = [f"report {i} " * 200 for i in range(40)]
+    ids = [store.put(text) for text in reports]
+    failures = []
+
+    def reader(offset):
+        for i in range(200):
+            index = (i + offset) % len(ids)
+            if store.get(ids[index]) != reports[index]:
+                failures.append(index)
+
+    def writer(offset):
+        for i in range(50):
+            store.put(f"new report {offset}-{i} " * 200)
+
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(4) for target in (reader, writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert store.memory_bytes == sum(len(blob) for blob in store._bodies.values())
+    assert store.memory_bytes <= store.budget or store.stats()["in_memory"] == 1
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, Endpoint, HealthMonitor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ApiError(requests.exceptions.HTTPError):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def call(endpoint, error=None, duration=0.0):
+    with endpoint.guard():
+        endpoint.clock.now += duration
+        if error is not None:
+            raise error
+
+
+def fail(endpoint, error, duration=0.0):
+    with pytest.raises(type(error)):
+        call(endpoint, error, duration)
+
+
+def make_endpoint(**options):
+    return Endpoint("test", clock=FakeClock(), **options)
+
+
+def test_breaker_opens_on_provider_failures_and_recovers_after_a_trial():
+    endpoint = make_endpoint(failure_threshold=2, recovery_time=30)
+    fail(endpoint, ApiError(503))
+    fail(endpoint, requests.exceptions.ConnectionError("reset"))
+    assert endpoint.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        call(endpoint)
+
+    endpoint.clock.now += 31
+    call(endpoint, duration=1.0)
+    assert endpoint.state == CLOSED
+
+
+def test_client_errors_count_as_answers():
+    endpoint = make_endpoint(failure_threshold=1)
+    fail(endpoint, ApiError(400), duration=2.0)
+    assert endpoint.state == CLOSED
+    assert list(endpoint.latencies) == [2.0]
+
+
+@pytest.mark.parametrize("error", [ValueError("bad output"), KeyboardInterrupt(), SystemExit()])
+def test_our_own_errors_are_not_counted(error):
+    endpoint = make_endpoint(failure_threshold=1, recovery_time=30)
+    fail(endpoint, error)
+    assert endpoint.state == CLOSED
+    assert endpoint.failures == 0 and not endpoint.latencies
+
+
+def test_ignored_error_releases_the_half_open_trial():
+    endpoint = make_endpoint(failure_threshold=1, recovery_time=30)
+    fail(endpoint, TimeoutError())
+    endpoint.clock.now += 31
+    # e.g. a Streamlit rerun during the trial call
+    fail(endpoint, KeyboardInterrupt())
+    assert endpoint.state == HALF_OPEN
+    call(endpoint)
+    assert endpoint.state == CLOSED
+
+
+def test_timeouts_add_censored_samples_and_back_the_timeout_off():
+    endpoint = make_endpoint(initial_timeout=20, min_timeout=5, max_timeout=100, min_samples=3,
+                             failure_threshold=100)
+    for _ in range(3):
+        call(endpoint, duration=5.0)
+    assert endpoint.timeout() == 10.0
+
+    timeouts = []
+    for _ in range(3):
+        timeouts.append(endpoint.timeout())
+        fail(endpoint, requests.exceptions.ReadTimeout("timed out"), duration=1.0)
+    assert timeouts == [10.0, 20.0, 40.0]
+    assert endpoint.timeout() == 80.0
+
+
+def test_one_monitor_thread_checks_every_watched_key():
+    checked = []
+    done = threading.Event()
+
+    def check(key):
+        checked.append(key)
+        if len(checked) >= 2:
+            done.set()
+        return key == "good", key
+
+    before = threading.active_count()
+    monitor = HealthMonitor("test", check, interval=60, max_keys=2)
+    try:
+        monitor.watch("good").watch("bad").watch("good")
+        assert done.wait(5)
+        time.sleep(0.05)
+        assert sorted(checked) == ["bad", "good"]
+        assert monitor.status("good").healthy is True
+        assert monitor.status("bad").healthy is False
+        assert threading.active_count() == before + 1
+
+        monitor.watch("other")
+        # The least recently watched key is dropped
+        assert monitor.status("bad").healthy is None
+    finally:
+        monitor.stop()
@@ -0,0 +1,39 @@
+from routing import ModelProfile, ModelRouter, RoutingRule
+from structured import supports_structured_output
+
+
+def test_default_model_without_matching_rule():
+    decision = ModelRouter().route("research_agent", "gpt-4o-mini", "OpenAI", "short input", template="Custom")
+    assert (decision.model, decision.reason) == ("gpt-4o-mini", "default")
+
+
+def test_latency_rule_picks_fastest_model():
+    decision = ModelRouter().route("elaboration_agent", "gpt-4o-mini", "OpenAI", "input", template="News Summary")
+    assert decision.model == "gpt-3.5-turbo"
+
+
+def test_structured_output_excludes_models_without_support():
+    decision = ModelRouter().route("research_agent", "gpt-4o-mini", "OpenAI", "input",
+                                   template="News Summary", structured_output=True)
+    assert decision.model != "gpt-3.5-turbo"
+    assert supports_structured_output(decision.model)
+
+
+def test_structured_output_falls_back_when_no_model_supports_it():
+    models = {"OpenAI": [ModelProfile("old", 1.0, 1.0, 1.0, 0.5, 4096, supports_structured_output=False)]}
+    decision = ModelRouter(rules=[], models=models).route("a", "old", "OpenAI", "input", structured_output=True)
+    assert decision.model == "old"
+
+
+def test_large_input_moves_to_model_with_enough_context():
+    router = ModelRouter(rules=[RoutingRule(objective="latency")])
+    decision = router.route("research_agent", "gpt-3.5-turbo", "OpenAI", "x" * 4 * 20000)
+    assert decision.model in ("gpt-4o-mini", "gpt-4o")
+    assert router.summary()["-"]["runs"] == 1
+
+
+def test_supports_structured_output_by_model_family():
+    assert supports_structured_output("gpt-4o-mini")
+    assert supports_structured_output("gpt-4o-2024-08-06")
+    assert not supports_structured_output("gpt-3.5-turbo")
+    assert not supports_structured_output("gpt-4-turbo")
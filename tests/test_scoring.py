@@ -0,0 +1,63 @@
+import math
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from scoring import _parse_date, format_ranked_sources, rank_and_assess, score_sources
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def test_ranks_relevant_credible_recent_sources_first():
+    sources = [
+        {"url": "https://random-blog.com/post", "title": "Cooking pasta", "publishedDate": "2010-01-01"},
+        {"url": "https://www.nature.com/articles/1", "title": "Quantum error correction advances",
+         "publishedDate": "2024-12-01"},
+    ]
+    ranked, metrics = rank_and_assess(sources, "quantum error correction")
+    assert ranked[0]["url"] == "https://www.nature.com/articles/1"
+    assert ranked[0]["quality_score"] > ranked[1]["quality_score"]
+    assert metrics["sources"] == 2 and metrics["source_diversity"] == 1.0
+
+
+def test_malformed_sources_do_not_crash():
+    sources = [
+        {"url": None, "title": None, "description": None},
+        {"url": 12345, "title": 7, "publishedDate": 1700000000},
+        {"title": "No url", "date": datetime(2024, 6, 1)},
+        {"url": "https://example.com/a", "publishedDate": date(2024, 1, 1)},
+        {"url": "https://example.com/b", "publishedDate": "not a date"},
+        {"url": "http://[::1", "published_date": 1700000000000},
+        {"url": "https://example.com/c", "publishedDate": "2024-05-01T10:00:00Z"},
+        {},
+    ]
+    scores = score_sources(sources, "example topic", now=NOW)
+    assert scores.score.shape == (len(sources),)
+    assert not np.isnan(scores.score).any()
+
+    ranked, metrics = rank_and_assess(sources, "example topic")
+    assert len(ranked) == len(sources)
+    assert format_ranked_sources(ranked).count("\n") == len(sources) - 1
+    assert "None" not in format_ranked_sources(ranked)
+
+
+def test_parse_date_handles_mixed_types():
+    expected = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    assert _parse_date("2024-01-01") == expected
+    assert _parse_date("2024-01-01T00:00:00Z") == expected
+    assert _parse_date(date(2024, 1, 1)) == expected
+    assert _parse_date(datetime(2024, 1, 1)) == expected
+    assert _parse_date(expected) == expected
+    assert _parse_date(expected * 1000) == expected
+    for unknown in (None, "", "soon", True, "2024-13-45"):
+        assert math.isnan(_parse_date(unknown))
+
+
+def test_unknown_dates_get_neutral_recency():
+    scores = score_sources([{"url": "https://a.com"}, {"url": "https://b.com", "date": "garbage"}], "t", now=NOW)
+    assert list(scores.recency) == [0.5, 0.5]
+
+
+def test_empty_input():
+    ranked, metrics = rank_and_assess([], "topic")
+    assert ranked == [] and metrics["sources"] == 0
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from shared_state import JobQueue, SharedCache, SharedHistory, SQLiteStore, Store, open_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return open_store("memory://")
+    return SQLiteStore(str(tmp_path / "state.db"))
+
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        Store()
+
+
+def test_delete_if_and_refresh_if_only_match_the_current_value(store):
+    assert store.add("lease", {"token": "a"}, ttl=60)
+    assert not store.add("lease", {"token": "b"}, ttl=60)
+
+    assert not store.refresh_if("lease", {"token": "b"}, 60)
+    assert not store.delete_if("lease", {"token": "b"})
+    assert store.get("lease") == {"token": "a"}
+
+    assert store.refresh_if("lease", {"token": "a"}, 60)
+    assert store.delete_if("lease", {"token": "a"})
+    assert store.get("lease") is None
+
+
+def test_result_is_reused_without_running_again(store):
+    queue = JobQueue(store, poll_interval=0.01)
+    calls = []
+
+    async def job():
+        calls.append(1)
+        return {"report": "done"}
+
+    assert asyncio.run(queue.run("topic", job)) == {"report": "done"}
+    assert asyncio.run(queue.run("topic", job)) == {"report": "done"}
+    assert len(calls) == 1
+    assert (queue.executed, queue.reused) == (1, 1)
+
+
+def test_expired_lease_is_taken_over_and_not_released_by_the_stale_holder(store):
+    queue = JobQueue(store, poll_interval=0.01)
+    lease_key = queue._key("lease", "topic")
+    # A worker that claimed the job and then died
+    stale = {"worker": "dead", "token": "old"}
+    store.add(lease_key, stale, ttl=0.1)
+
+    async def job():
+        # The dead worker's cleanup must not free the lease this run now holds
+        assert not store.delete_if(lease_key, stale)
+        assert store.get(lease_key)["token"] != "old"
+        return "result"
+
+    assert asyncio.run(queue.run("topic", job)) == "result"
+    assert queue.executed == 1
+    assert store.get(lease_key) is None
+
+
+def test_lease_is_renewed_while_the_job_runs():
+    store = open_store("memory://")
+    leader, follower = JobQueue(store, poll_interval=0.01), JobQueue(store, poll_interval=0.01)
+    calls = []
+
+    async def job():
+        calls.append(1)
+        # Runs for several lease lengths
+        await asyncio.sleep(0.5)
+        return "result"
+
+    async def main():
+        first = asyncio.ensure_future(leader.run("topic", job, lease=0.15))
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(first, follower.run("topic", job, lease=0.15))
+
+    assert asyncio.run(main()) == ["result", "result"]
+    assert len(calls) == 1
+    assert follower.waited == 1
+
+
+def test_shared_cache_and_history(store):
+    cache = SharedCache(store, "findings", ttl=60)
+    assert cache.get("k") is None
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+    assert cache.stats() == {"name": "findings", "hits": 1, "misses": 1}
+
+    history = SharedHistory(store, "workspace", max_items=2)
+    for i in range(3):
+        history.append({"topic": f"t{i}", "timestamp": datetime(2026, 1, i + 1)})
+    entries = history.load()
+    assert [e["topic"] for e in entries] == ["t1", "t2"]
+    assert entries[0]["timestamp"] == datetime(2026, 1, 2)
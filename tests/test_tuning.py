@@ -0,0 +1,88 @@
+import json
+
+from tuning import ParameterTuner, RunHistory, RunRecord, SaturationMonitor
+
+
+def make_record(i, template="Custom", quality_length=6000):
+    return RunRecord(topic=f"topic {i}", template=template, max_depth=2, time_limit=120, max_urls=10,
+                     wall_time=30.0, sources_count=10, report_length=quality_length, timestamp=float(i + 1))
+
+
+def test_load_reuses_parse_until_file_changes(tmp_path, monkeypatch):
+    history = RunHistory(str(tmp_path / "runs.jsonl"))
+    history.record(make_record(0))
+    assert len(history.load()) == 1
+
+    parsed = []
+    original = RunRecord.__init__
+
+    def counting_init(self, *args, **kwargs):
+        parsed.append(1)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(RunRecord, "__init__", counting_init)
+    history.load()
+    assert parsed == []
+
+    history.record(make_record(1))
+    assert [r.topic for r in history.load()] == ["topic 0", "topic 1"]
+    assert parsed
+
+
+def test_history_is_capped_and_compacted(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    history = RunHistory(str(path), max_records=5)
+    for i in range(12):
+        history.record(make_record(i))
+
+    assert [r.topic for r in history.load()] == [f"topic {i}" for i in range(7, 12)]
+    assert len(path.read_text().splitlines()) <= 10
+
+
+def test_corrupt_lines_are_skipped(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    path.write_text("not json\n" + json.dumps({"topic": "x"}) + "\n")
+    assert RunHistory(str(path)).load() == []
+
+
+def test_recommends_cheapest_params_reaching_target(tmp_path):
+    history = RunHistory(str(tmp_path / "runs.jsonl"))
+    for i in range(2):
+        history.record(make_record(i))
+    recommendation = ParameterTuner(history).recommend("Custom", target_quality=0.7)
+    assert (recommendation.max_depth, recommendation.time_limit, recommendation.max_urls) == (2, 120, 10)
+    assert ParameterTuner(history).recommend("Market Analysis") is None
+
+
+def run_result(topic, max_depth, sources, report_length, research_time):
+    """Shaped like the result of ``run_research_process``."""
+    return {
+        "topic": topic,
+        "params": {"template": "Custom", "max_depth": max_depth, "time_limit": 120, "max_urls": 10},
+        "research_time": research_time,
+        "enhanced_report": "x" * report_length,
+        "sources": [{"url": f"https://example.org/{i}", "title": f"Source {i}"} for i in range(sources)],
+        "resumed_stages": [],
+    }
+
+
+def test_recorded_run_results_lead_to_a_recommendation(tmp_path):
+    history = RunHistory(str(tmp_path / "runs.jsonl"))
+    for topic in ("solar power", "wind power"):
+        history.record(RunRecord.from_result(run_result(topic, 3, sources=10, report_length=6500,
+                                                        research_time=90.0)))
+        history.record(RunRecord.from_result(run_result(topic, 2, sources=8, report_length=6000,
+                                                        research_time=50.0)))
+    assert {r.sources_count for r in history.load()} == {8, 10}
+
+    recommendation = ParameterTuner(history).recommend("Custom", target_quality=0.7)
+    assert recommendation.max_depth == 2
+    assert recommendation.expected_time == 50.0
+
+
+def test_saturation_after_stale_sources():
+    monitor = SaturationMonitor(min_sources=3, patience=2)
+    monitor.add_source({"url": "https://a.com/1", "content": "solar panels cost efficiency"})
+    for i in range(3):
+        monitor.add_source({"url": f"https://a.com/dup{i}", "content": "solar panels cost efficiency"})
+    assert monitor.saturated
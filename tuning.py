@@ -0,0 +1,246 @@
+"""
+Adaptive tuning of research parameters from historical runs.
+
+Every completed run is appended to a small JSON-lines history with its
+parameters, wall time, source count and report length. ``ParameterTuner``
+uses that history to recommend the cheapest ``max_depth`` / ``time_limit`` /
+``max_urls`` combination that has historically reached a target quality for a
+template (and, when enough data exists, for similar topics).
+
+``SaturationMonitor`` is used while a Firecrawl job is running to detect when
+newly discovered sources stop adding new content so the job can be stopped
+early.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+DATA_DIR = os.environ.get("RESEARCH_DATA_DIR", ".research_data")
+HISTORY_FILE = os.path.join(DATA_DIR, "run_history.jsonl")
+
+# Report length / source count at which a run is considered "complete"
+TARGET_REPORT_LENGTH = 6000
+TARGET_SOURCES = 10
+
+# Minimum runs for a parameter set before it is trusted
+MIN_SAMPLES = 2
+
+# Only the most recent runs are used; older lines are dropped when the file is compacted
+MAX_RECORDS = 2000
+
+# Minimum topic token overlap for a past run to count as a similar topic
+TOPIC_SIMILARITY = 0.3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> set:
+    return set(_TOKEN_RE.findall((text or "").lower()))
+
+
+@dataclass
+class RunRecord:
+    """A single completed research run."""
+    topic: str
+    template: str
+    max_depth: int
+    time_limit: int
+    max_urls: int
+    wall_time: float
+    sources_count: int
+    report_length: int
+    timestamp: float = 0.0
+
+    def quality(self) -> float:
+        """Quality proxy between 0 and 1 from report length and sources."""
+        length_score = min(self.report_length / TARGET_REPORT_LENGTH, 1.0)
+        source_score = min(self.sources_count / TARGET_SOURCES, 1.0)
+        return 0.6 * length_score + 0.4 * source_score
+
+    @property
+    def params(self) -> tuple:
+        return (self.max_depth, self.time_limit, self.max_urls)
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "RunRecord":
+        """Record for a result of ``run_research_process``.
+
+        Sources are the ones the run actually cited from (Firecrawl results or
+        the model's citations), so resumed runs are counted like fresh ones.
+        """
+        params = result["params"]
+        return cls(
+            topic=result["topic"],
+            template=params["template"],
+            max_depth=params["max_depth"],
+            time_limit=params["time_limit"],
+            max_urls=params["max_urls"],
+            wall_time=result["research_time"],
+            sources_count=len(result.get("sources") or []),
+            report_length=len(result.get("enhanced_report") or ""),
+        )
+
+
+# Parsed history per file, reused until the file's mtime or size changes:
+# path -> ((mtime_ns, size), records)
+_load_cache: Dict[str, tuple] = {}
+_load_lock = threading.Lock()
+
+
+class RunHistory:
+    """Append-only JSON-lines store of the last ``max_records`` completed runs."""
+
+    def __init__(self, path: str = HISTORY_FILE, max_records: int = MAX_RECORDS):
+        self.path = path
+        self.max_records = max_records
+
+    def record(self, record: RunRecord) -> None:
+        if not record.timestamp:
+            record.timestamp = time.time()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(record)) + "\n")
+        if len(self.load()) >= self.max_records and self._line_count() > 2 * self.max_records:
+            self.compact()
+
+    def load(self) -> List[RunRecord]:
+        """The most recent runs, oldest first; parsed once per change of the file."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        version = (stat.st_mtime_ns, stat.st_size)
+        with _load_lock:
+            cached = _load_cache.get(self.path)
+            if cached is not None and cached[0] == version:
+                return list(cached[1][-self.max_records:])
+
+        records: deque = deque(maxlen=self.max_records)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(RunRecord(**json.loads(line)))
+                except (ValueError, TypeError):
+                    # Skip corrupt or outdated lines rather than failing the app
+                    continue
+        records = list(records)
+        with _load_lock:
+            _load_cache[self.path] = (version, records)
+        return list(records)
+
+    def compact(self) -> None:
+        """Rewrite the file with only the most recent ``max_records`` runs."""
+        records = self.load()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(asdict(record)) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _line_count(self) -> int:
+        with open(self.path, "rb") as f:
+            return sum(1 for _ in f)
+
+
+@dataclass
+class Recommendation:
+    """Recommended parameters and the evidence behind them."""
+    max_depth: int
+    time_limit: int
+    max_urls: int
+    expected_quality: float
+    expected_time: float
+    samples: int
+
+
+class ParameterTuner:
+    """Picks the cheapest parameters that historically reached a target quality."""
+
+    def __init__(self, history: Optional[RunHistory] = None):
+        self.history = history or RunHistory()
+
+    def recommend(self, template: str, target_quality: float = 0.7,
+                  topic: Optional[str] = None) -> Optional[Recommendation]:
+        """Return a recommendation, or None if there is not enough history."""
+        records = [r for r in self.history.load() if r.template == template]
+        if topic:
+            topic_tokens = _tokens(topic)
+            similar = [r for r in records if self._similarity(topic_tokens, _tokens(r.topic)) >= TOPIC_SIMILARITY]
+            # Fall back to the whole template when there are too few similar topics
+            if len(similar) >= MIN_SAMPLES:
+                records = similar
+
+        groups: Dict[tuple, List[RunRecord]] = {}
+        for record in records:
+            groups.setdefault(record.params, []).append(record)
+
+        candidates = []
+        for params, runs in groups.items():
+            if len(runs) < MIN_SAMPLES:
+                continue
+            quality = sum(r.quality() for r in runs) / len(runs)
+            wall_time = sum(r.wall_time for r in runs) / len(runs)
+            if quality >= target_quality:
+                candidates.append((wall_time, -quality, params, quality, len(runs)))
+
+        if not candidates:
+            return None
+
+        wall_time, _, params, quality, samples = min(candidates)
+        max_depth, time_limit, max_urls = params
+        return Recommendation(max_depth, time_limit, max_urls, quality, wall_time, samples)
+
+    @staticmethod
+    def _similarity(a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+
+class SaturationMonitor:
+    """Detects when newly discovered sources stop adding new content.
+
+    Each source contributes its set of content tokens. When the last
+    ``patience`` sources each added less than ``min_novelty`` new tokens
+    (as a fraction of their own tokens), the search is considered saturated.
+    """
+
+    def __init__(self, min_sources: int = 5, patience: int = 3, min_novelty: float = 0.15):
+        self.min_sources = min_sources
+        self.patience = patience
+        self.min_novelty = min_novelty
+        self._seen_tokens = set()
+        self._seen_urls = set()
+        self._stale_streak = 0
+        self.sources_seen = 0
+
+    def add_source(self, source: Dict[str, Any]) -> None:
+        url = source.get('url')
+        if url in self._seen_urls:
+            return
+        self._seen_urls.add(url)
+        self.sources_seen += 1
+
+        text = " ".join(str(source.get(key, "")) for key in ('title', 'description', 'content'))
+        tokens = _tokens(text)
+        new_tokens = tokens - self._seen_tokens
+        self._seen_tokens |= tokens
+
+        novelty = len(new_tokens) / len(tokens) if tokens else 0.0
+        if novelty < self.min_novelty:
+            self._stale_streak += 1
+        else:
+            self._stale_streak = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.sources_seen >= self.min_sources and self._stale_streak >= self.patience